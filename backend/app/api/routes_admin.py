@@ -7,7 +7,8 @@ import secrets
 from ..models.schemas import (
     AdminLoginRequest, AdminLoginResponse,
     AdminPhotoResponse, AdminPhotoListResponse,
-    AdminUpdatePhotoRequest, AdminStatsResponse
+    AdminUpdatePhotoRequest, AdminStatsResponse,
+    AdminEventPreloadResponse
 )
 from ..services.admin_service import admin_service
 
@@ -58,8 +59,8 @@ async def get_photos(
 ):
     """Get all photos with pagination"""
     try:
-        photos = admin_service.get_all_photos(limit=limit, offset=offset)
-        stats = admin_service.get_stats()
+        photos = await admin_service.get_all_photos(limit=limit, offset=offset)
+        stats = await admin_service.get_stats()
         
         return AdminPhotoListResponse(
             photos=photos,
@@ -80,7 +81,7 @@ async def get_photo(
     admin: str = Depends(verify_admin)
 ):
     """Get single photo by ID"""
-    photo = admin_service.get_photo_by_id(photo_id)
+    photo = await admin_service.get_photo_by_id(photo_id)
     
     if not photo:
         raise HTTPException(
@@ -98,7 +99,7 @@ async def update_photo(
     admin: str = Depends(verify_admin)
 ):
     """Update photo event tag"""
-    success = admin_service.update_photo_tag(photo_id, request.event_tag)
+    success = await admin_service.update_photo_tag(photo_id, request.event_tag)
     
     if not success:
         raise HTTPException(
@@ -106,7 +107,7 @@ async def update_photo(
             detail=f"Photo {photo_id} not found"
         )
     
-    photo = admin_service.get_photo_by_id(photo_id)
+    photo = await admin_service.get_photo_by_id(photo_id)
     return photo
 
 
@@ -116,7 +117,7 @@ async def delete_photo(
     admin: str = Depends(verify_admin)
 ):
     """Delete photo and its faces"""
-    success = admin_service.delete_photo(photo_id)
+    success = await admin_service.delete_photo(photo_id)
     
     if not success:
         raise HTTPException(
@@ -131,7 +132,7 @@ async def delete_photo(
 async def get_stats(admin: str = Depends(verify_admin)):
     """Get database statistics"""
     try:
-        stats = admin_service.get_stats()
+        stats = await admin_service.get_stats()
         return stats
     except Exception as e:
         raise HTTPException(
@@ -140,6 +141,26 @@ async def get_stats(admin: str = Depends(verify_admin)):
         )
 
 
+@router.post("/events/{event_tag}/preload", response_model=AdminEventPreloadResponse)
+async def preload_event(
+    event_tag: str,
+    admin: str = Depends(verify_admin)
+):
+    """Load an event's faces into memory so its searches start hot"""
+    try:
+        return await admin_service.preload_event(event_tag)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to preload event: {str(e)}"
+        )
+
+
 @router.post("/upload")
 async def upload_image(
     file: UploadFile = File(...),
@@ -159,7 +180,7 @@ async def upload_image(
         content = await file.read()
         
         # Process upload
-        result = admin_service.upload_image(
+        result = await admin_service.upload_image(
             file_content=content,
             filename=file.filename,
             event_tag=event_tag
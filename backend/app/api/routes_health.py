@@ -1,11 +1,15 @@
 """Health check endpoint"""
-from fastapi import APIRouter
+from fastapi import APIRouter, Response, status
 from datetime import datetime
 import logging
 
-from ..models.schemas import HealthResponse, StatsResponse
+from ..models.schemas import HealthResponse, ReadinessResponse, StatsResponse
 from ..core.config import settings
-from ..core.db import get_db
+from ..core.db import get_db, get_async_db
+from ..services.inference_executor import inference_executor
+from ..services.inference_scheduler import inference_scheduler
+from ..services.model_warmup import model_warmup
+from ..services.search_service import search_service
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +22,9 @@ async def health_check():
     
     # Check database connection
     db_status = "disconnected"
+    db = get_async_db()
     try:
-        db = get_db()
-        result = db.execute_one("SELECT 1 as test")
+        result = await db.execute_one("SELECT 1 as test")
         if result:
             db_status = "connected"
     except Exception as e:
@@ -31,7 +35,46 @@ async def health_check():
         status="ok",
         timestamp=datetime.now(),
         database=db_status,
-        face_model=settings.embedding_model
+        face_model=settings.embedding_model,
+        database_pool={
+            "async": db.get_pool_stats(),
+            "sync": get_db().get_pool_stats()
+        },
+        inference={
+            "pending": inference_executor.pending,
+            "batching": inference_scheduler.get_stats()
+        },
+        search_backend=search_service.get_stats()
+    )
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(response: Response):
+    """
+    Readiness probe for load balancers
+    
+    Returns 503 until the face models are loaded and warmed up and the
+    database answers. Unlike /health this is meant to gate traffic.
+    """
+    db_status = "disconnected"
+    try:
+        result = await get_async_db().execute_one("SELECT 1 as test")
+        if result:
+            db_status = "connected"
+    except Exception as e:
+        logger.error(f"Database readiness check failed: {e}")
+        db_status = f"error: {str(e)}"
+    
+    ready = model_warmup.ready and db_status == "connected"
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    
+    return ReadinessResponse(
+        ready=ready,
+        models=model_warmup.status,
+        database=db_status,
+        warmup_time_ms=round(model_warmup.duration_ms, 2) if model_warmup.duration_ms else None,
+        error=model_warmup.error
     )
 
 
@@ -40,25 +83,25 @@ async def get_stats():
     """Get database statistics including photo and face counts"""
     
     try:
-        db = get_db()
+        db = get_async_db()
         
         # Count total photos
-        photo_result = db.execute_one("SELECT COUNT(*) as count FROM photos")
+        photo_result = await db.execute_one("SELECT COUNT(*) as count FROM photos")
         total_photos = photo_result['count'] if photo_result else 0
         
         # Count total faces
-        face_result = db.execute_one("SELECT COUNT(*) as count FROM faces")
+        face_result = await db.execute_one("SELECT COUNT(*) as count FROM faces")
         total_faces = face_result['count'] if face_result else 0
         
         # Count primary faces
-        primary_result = db.execute_one(
+        primary_result = await db.execute_one(
             "SELECT COUNT(*) as count FROM faces WHERE is_primary = true"
         )
         primary_faces = primary_result['count'] if primary_result else 0
         
         # Get distinct event tags
         event_tags = []
-        tag_results = db.execute(
+        tag_results = await db.execute(
             "SELECT DISTINCT event_tag FROM photos WHERE event_tag IS NOT NULL ORDER BY event_tag"
         )
         if tag_results:
@@ -67,7 +110,7 @@ async def get_stats():
         # Get database size (optional, may fail based on permissions)
         db_size_mb = None
         try:
-            size_result = db.execute_one(
+            size_result = await db.execute_one(
                 "SELECT pg_database_size(current_database()) / 1024.0 / 1024.0 as size_mb"
             )
             if size_result:
@@ -1,14 +1,25 @@
 """Search API endpoints"""
 from fastapi import APIRouter, UploadFile, File, Query, HTTPException
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from typing import Awaitable, List, Optional
+from uuid import UUID
+import asyncio
+import json
+import time
 import logging
 
-from ..models.schemas import SearchResponse, PhotoListResponse, PhotoItem
+from ..models.schemas import (
+    SearchResponse, SearchPageResponse, StoredFaceSearchResponse, PhotoListResponse, PhotoItem,
+    BatchSearchResponse, BatchSearchItem,
+    MultiFaceSearchResponse, QueryFaceResult
+)
 from ..services.search_service import search_service
-from ..services.face_detector import face_detector
+from ..services.search_sessions import InvalidPageToken, SearchSessionExpired
+from ..services.inference_executor import InferenceQueueFull
 from ..services.image_store import image_store
+from ..utils.image_io import read_zip_images
 from ..core.config import settings
-from ..core.db import get_db
+from ..core.db import get_async_db
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +44,27 @@ async def search_by_face(
     event_tag: Optional[str] = Query(
         default=None,
         description="Optional event tag filter"
+    ),
+    mode: str = Query(
+        default="ann",
+        pattern="^(ann|rerank)$",
+        description="ann: index order; rerank: oversampled index candidates re-ranked exactly"
+    ),
+    oversample: int = Query(
+        default=settings.rerank_oversample,
+        ge=1,
+        le=50,
+        description="Candidates fetched per result in rerank mode (pgvector re-ranks at most 1000)"
+    ),
+    ef_search: Optional[int] = Query(
+        default=None,
+        ge=1,
+        le=1000,
+        description="HNSW search breadth for this query"
+    ),
+    group_by_photo: bool = Query(
+        default=False,
+        description="Return only the best-matching face of each photo (top_k counts photos)"
     )
 ):
     """
@@ -42,37 +74,54 @@ async def search_by_face(
     - Returns similar faces from the database
     - Results are ranked by similarity score
     - Optionally filter by event tag
+    - Optionally re-rank an oversampled candidate set exactly (mode=rerank)
+    - Optionally return one result per photo (group_by_photo=true)
+    - A next_page_token is returned while more results may exist
     """
     try:
-        # Initialize face detector if not already done
-        face_detector.initialize()
-        
         # Read uploaded file
         image_data = await file.read()
         
         logger.info(
             f"Search request: filename={file.filename}, "
-            f"top_k={top_k}, threshold={threshold}, event_tag={event_tag}"
+            f"top_k={top_k}, threshold={threshold}, event_tag={event_tag}, mode={mode}, "
+            f"group_by_photo={group_by_photo}"
         )
         
         # Perform search
-        results, query_time, face_detected = search_service.search_by_image(
+        results, timings, face_detected, next_page_token = await search_service.search_by_image(
             image_data=image_data,
             top_k=top_k,
             threshold=threshold,
-            event_tag=event_tag
+            event_tag=event_tag,
+            mode=mode,
+            oversample=oversample,
+            ef_search=ef_search,
+            group_by_photo=group_by_photo
         )
         
+        query_time = timings['query_time_ms']
+        timing_fields = {
+            'query_time_ms': round(query_time, 2),
+            'queue_time_ms': round(timings['queue_time_ms'], 2),
+            'inference_time_ms': round(timings['inference_time_ms'], 2)
+        }
+        
         if not face_detected:
             logger.warning("No face detected in uploaded image")
             return SearchResponse(
                 results=[],
-                query_time_ms=round(query_time, 2),
                 face_detected=False,
+                **timing_fields,
                 message="No face detected in the uploaded image. Please upload an image containing a clear face."
             )
         
-        logger.info(f"Search completed in {query_time:.2f}ms, found {len(results)} results")
+        logger.info(
+            f"Search completed in {query_time:.2f}ms "
+            f"(queue={timings['queue_time_ms']:.2f}ms, "
+            f"inference={timings['inference_time_ms']:.2f}ms), "
+            f"found {len(results)} results"
+        )
         
         message = None
         if len(results) == 0:
@@ -80,16 +129,531 @@ async def search_by_face(
         
         return SearchResponse(
             results=results,
-            query_time_ms=round(query_time, 2),
             face_detected=True,
-            message=message
+            message=message,
+            next_page_token=next_page_token,
+            **timing_fields
         )
         
+    except InferenceQueueFull as e:
+        logger.warning(f"Search rejected: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Search is busy, please try again in a moment"
+        )
     except Exception as e:
         logger.error(f"Search failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def format_stream_event(stream_format: str, event: str, data: dict) -> str:
+    """One streamed message: an NDJSON line or a server-sent event"""
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({'type': event, **data}) + "\n"
+
+
+@router.post("/search/stream")
+async def search_by_face_stream(
+    file: UploadFile = File(..., description="Query image file"),
+    top_k: int = Query(
+        default=settings.default_top_k,
+        ge=1,
+        le=settings.search_max_results,
+        description="Maximum number of results"
+    ),
+    threshold: float = Query(
+        default=settings.default_similarity_threshold,
+        ge=0.0,
+        le=1.0,
+        description="Minimum similarity threshold"
+    ),
+    event_tag: Optional[str] = Query(
+        default=None,
+        description="Optional event tag filter"
+    ),
+    mode: str = Query(
+        default="ann",
+        pattern="^(ann|rerank)$",
+        description="ann: index order; rerank: oversampled index candidates re-ranked exactly"
+    ),
+    oversample: int = Query(
+        default=settings.rerank_oversample,
+        ge=1,
+        le=50,
+        description="Candidates fetched per result in rerank mode (pgvector re-ranks at most 1000)"
+    ),
+    ef_search: Optional[int] = Query(
+        default=None,
+        ge=1,
+        le=1000,
+        description="HNSW search breadth for this query"
+    ),
+    group_by_photo: bool = Query(
+        default=False,
+        description="Return only the best-matching face of each photo (top_k counts photos)"
+    ),
+    format: str = Query(
+        default="ndjson",
+        pattern="^(ndjson|sse)$",
+        description="ndjson: one JSON object per line; sse: server-sent events"
+    )
+):
+    """
+    Search for similar faces, streaming the response
+    
+    Same search as POST /search, sent as it is produced:
+    - detection: face_detected and inference timings, once the query is embedded
+    - results: a batch of results, best first (the first batch is small,
+      later ones double)
+    - done: total results and search time
+    - error: if the search fails after streaming started
+    
+    With format=ndjson each message is a JSON line with a "type" field.
+    """
+    try:
+        image_data = await file.read()
+        
+        logger.info(
+            f"Streaming search request: filename={file.filename}, "
+            f"top_k={top_k}, threshold={threshold}, event_tag={event_tag}, mode={mode}, "
+            f"group_by_photo={group_by_photo}"
+        )
+        
+        # Embed before streaming starts, so a busy or failed inference is
+        # still a proper HTTP error
+        embedding, timings = await search_service.embed_query_image(image_data)
+        
+    except InferenceQueueFull as e:
+        logger.warning(f"Streaming search rejected: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Search is busy, please try again in a moment"
+        )
+    except Exception as e:
+        logger.error(f"Streaming search failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def stream():
+        yield format_stream_event(format, "detection", {
+            'face_detected': embedding is not None,
+            'query_time_ms': round(timings['query_time_ms'], 2),
+            'queue_time_ms': round(timings['queue_time_ms'], 2),
+            'inference_time_ms': round(timings['inference_time_ms'], 2)
+        })
+        if embedding is None:
+            return
+        
+        started = time.perf_counter()
+        total = 0
+        try:
+            async for batch in search_service.iter_similar_faces(
+                embedding,
+                top_k=top_k,
+                first_batch=settings.stream_first_batch,
+                threshold=threshold,
+                event_tag=event_tag,
+                mode=mode,
+                oversample=oversample,
+                ef_search=ef_search,
+                group_by_photo=group_by_photo
+            ):
+                total += len(batch)
+                yield format_stream_event(format, "results", {
+                    'results': [result.model_dump(mode="json") for result in batch]
+                })
+        except Exception as e:
+            logger.error(f"Streaming search failed: {e}")
+            yield format_stream_event(format, "error", {'detail': str(e)})
+            return
+        
+        search_time = (time.perf_counter() - started) * 1000
+        logger.info(f"Streaming search completed in {search_time:.2f}ms, sent {total} results")
+        yield format_stream_event(format, "done", {
+            'total': total,
+            'search_time_ms': round(search_time, 2)
+        })
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        # Keep proxies from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@router.get("/search/next", response_model=SearchPageResponse)
+async def search_next_page(
+    token: str = Query(..., description="next_page_token from the previous page"),
+    page_size: Optional[int] = Query(
+        default=None,
+        ge=1,
+        le=100,
+        description="Results per page (defaults to the first search's top_k)"
+    )
+):
+    """
+    Get the next page of a search
+    
+    - Uses the query embedding stored with the first page, so no re-upload
+      and no inference
+    - Returns the results after the previous page, and a token for the next
+    """
+    try:
+        started = time.perf_counter()
+        results, next_page_token = await search_service.search_next_page(token, page_size)
+        search_time = (time.perf_counter() - started) * 1000
+        
+        logger.info(f"Search page completed in {search_time:.2f}ms, found {len(results)} results")
+        
+        return SearchPageResponse(
+            results=results,
+            search_time_ms=round(search_time, 2),
+            next_page_token=next_page_token
+        )
+        
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SearchSessionExpired as e:
+        logger.info(f"Search page rejected: {e}")
+        raise HTTPException(
+            status_code=410,
+            detail="Search session expired, please search again"
+        )
+    except Exception as e:
+        logger.error(f"Search page failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(
+    files: Optional[List[UploadFile]] = File(default=None, description="Query image files"),
+    archive: Optional[UploadFile] = File(default=None, description="Zip archive of query images"),
+    top_k: int = Query(
+        default=settings.default_top_k,
+        ge=1,
+        le=100,
+        description="Maximum number of results per image"
+    ),
+    threshold: float = Query(
+        default=settings.default_similarity_threshold,
+        ge=0.0,
+        le=1.0,
+        description="Minimum similarity threshold"
+    ),
+    event_tag: Optional[str] = Query(
+        default=None,
+        description="Optional event tag filter"
+    )
+):
+    """
+    Search with many query images in one request
+    
+    - Upload images as repeated `files` fields and/or one zip `archive`
+    - Faces are detected and embedded in batches, then all lookups run as
+      one batch (one matrix product or one SQL statement)
+    - Returns one item per image, in upload order
+    """
+    try:
+        images = [(upload.filename, await upload.read()) for upload in files or []]
+        if archive is not None:
+            try:
+                images.extend(await asyncio.to_thread(
+                    read_zip_images,
+                    await archive.read(),
+                    settings.batch_search_max_images,
+                    settings.batch_search_max_image_mb * 1024 * 1024,
+                    settings.batch_search_max_archive_mb * 1024 * 1024
+                ))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        if not images:
+            raise HTTPException(status_code=400, detail="No query images uploaded")
+        if len(images) > settings.batch_search_max_images:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many images ({len(images)}), the limit is {settings.batch_search_max_images}"
+            )
+        
+        logger.info(
+            f"Batch search request: {len(images)} images, "
+            f"top_k={top_k}, threshold={threshold}, event_tag={event_tag}"
+        )
+        
+        results, timings = await search_service.search_by_images(
+            [data for _, data in images],
+            top_k=top_k,
+            threshold=threshold,
+            event_tag=event_tag
+        )
+        
+        items = []
+        for idx, ((filename, _), result) in enumerate(zip(images, results)):
+            if isinstance(result, Exception):
+                items.append(BatchSearchItem(
+                    index=idx, filename=filename, face_detected=False, error=str(result)
+                ))
+            elif result is None:
+                items.append(BatchSearchItem(index=idx, filename=filename, face_detected=False))
+            else:
+                items.append(BatchSearchItem(index=idx, filename=filename, results=result))
+        
+        logger.info(
+            f"Batch search completed: inference={timings['inference_time_ms']:.2f}ms, "
+            f"search={timings['search_time_ms']:.2f}ms"
+        )
+        
+        return BatchSearchResponse(
+            items=items,
+            query_time_ms=round(timings['query_time_ms'], 2),
+            queue_time_ms=round(timings['queue_time_ms'], 2),
+            inference_time_ms=round(timings['inference_time_ms'], 2),
+            search_time_ms=round(timings['search_time_ms'], 2)
+        )
+        
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        logger.warning(f"Batch search rejected: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Search is busy, please try again in a moment"
+        )
+    except Exception as e:
+        logger.error(f"Batch search failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/search/faces", response_model=MultiFaceSearchResponse)
+async def search_by_all_faces(
+    file: UploadFile = File(..., description="Query image file"),
+    max_faces: int = Query(
+        default=settings.multi_face_max_faces,
+        ge=1,
+        le=50,
+        description="Maximum number of query faces (largest first)"
+    ),
+    top_k: int = Query(
+        default=settings.default_top_k,
+        ge=1,
+        le=100,
+        description="Maximum number of results per face"
+    ),
+    threshold: float = Query(
+        default=settings.default_similarity_threshold,
+        ge=0.0,
+        le=1.0,
+        description="Minimum similarity threshold"
+    ),
+    event_tag: Optional[str] = Query(
+        default=None,
+        description="Optional event tag filter"
+    )
+):
+    """
+    Search for every face in a query image
+    
+    - Upload a group photo
+    - Each detected face (up to max_faces) is searched in one batch
+    - Results are grouped per query face, with its bounding box
+    """
+    try:
+        image_data = await file.read()
+        
+        logger.info(
+            f"Multi-face search request: filename={file.filename}, max_faces={max_faces}, "
+            f"top_k={top_k}, threshold={threshold}, event_tag={event_tag}"
+        )
+        
+        groups, timings = await search_service.search_by_image_faces(
+            image_data=image_data,
+            max_faces=max_faces,
+            top_k=top_k,
+            threshold=threshold,
+            event_tag=event_tag
+        )
+        
+        timing_fields = {
+            'query_time_ms': round(timings['query_time_ms'], 2),
+            'queue_time_ms': round(timings['queue_time_ms'], 2),
+            'inference_time_ms': round(timings['inference_time_ms'], 2),
+            'search_time_ms': round(timings['search_time_ms'], 2)
+        }
+        
+        if not groups:
+            return MultiFaceSearchResponse(
+                faces=[],
+                face_detected=False,
+                **timing_fields,
+                message="No face detected in the uploaded image. Please upload an image containing a clear face."
+            )
+        
+        logger.info(
+            f"Multi-face search completed: {len(groups)} faces, "
+            f"{sum(len(group['results']) for group in groups)} results"
+        )
+        
+        return MultiFaceSearchResponse(
+            faces=[
+                QueryFaceResult(face_index=idx, **group)
+                for idx, group in enumerate(groups)
+            ],
+            **timing_fields
+        )
+        
+    except InferenceQueueFull as e:
+        logger.warning(f"Multi-face search rejected: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Search is busy, please try again in a moment"
+        )
+    except Exception as e:
+        logger.error(f"Multi-face search failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def stored_face_search_response(
+    lookup: Awaitable,
+    not_found: str
+) -> StoredFaceSearchResponse:
+    """Run a search by stored face and build its response"""
+    try:
+        started = time.perf_counter()
+        found = await lookup
+        search_time = (time.perf_counter() - started) * 1000
+    except Exception as e:
+        logger.error(f"Stored face search failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if found is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    
+    query, results = found
+    logger.info(
+        f"Stored face search for face {query['face_id']} completed in {search_time:.2f}ms, "
+        f"found {len(results)} results"
+    )
+    
+    message = None
+    if len(results) == 0:
+        message = "No other matching faces found. Try adjusting the similarity threshold."
+    
+    return StoredFaceSearchResponse(
+        query_face_id=query['face_id'],
+        query_photo_id=query['photo_id'],
+        results=results,
+        search_time_ms=round(search_time, 2),
+        message=message
+    )
+
+
+@router.get("/search/by-face/{face_id}", response_model=StoredFaceSearchResponse)
+async def search_by_face_id(
+    face_id: UUID,
+    top_k: int = Query(
+        default=settings.default_top_k,
+        ge=1,
+        le=100,
+        description="Maximum number of results"
+    ),
+    threshold: float = Query(
+        default=settings.default_similarity_threshold,
+        ge=0.0,
+        le=1.0,
+        description="Minimum similarity threshold"
+    ),
+    event_tag: Optional[str] = Query(
+        default=None,
+        description="Optional event tag filter"
+    ),
+    mode: str = Query(
+        default="ann",
+        pattern="^(ann|rerank)$",
+        description="ann: index order; rerank: oversampled index candidates re-ranked exactly"
+    ),
+    group_by_photo: bool = Query(
+        default=False,
+        description="Return only the best-matching face of each photo (top_k counts photos)"
+    ),
+    exclude_source: bool = Query(
+        default=True,
+        description="Leave out results from the query face's own photo"
+    )
+):
+    """
+    Search for similar faces using an indexed face as the query
+    
+    - Uses the face's stored embedding: no upload and no inference
+    - For "more photos of this runner" from a search result's face_id
+    """
+    return await stored_face_search_response(
+        search_service.search_by_face_id(
+            str(face_id),
+            top_k=top_k,
+            threshold=threshold,
+            event_tag=event_tag,
+            mode=mode,
+            group_by_photo=group_by_photo,
+            exclude_source=exclude_source
+        ),
+        not_found=f"Face {face_id} not found"
+    )
+
+
+@router.get("/search/by-photo/{photo_id}", response_model=StoredFaceSearchResponse)
+async def search_by_photo_id(
+    photo_id: UUID,
+    top_k: int = Query(
+        default=settings.default_top_k,
+        ge=1,
+        le=100,
+        description="Maximum number of results"
+    ),
+    threshold: float = Query(
+        default=settings.default_similarity_threshold,
+        ge=0.0,
+        le=1.0,
+        description="Minimum similarity threshold"
+    ),
+    event_tag: Optional[str] = Query(
+        default=None,
+        description="Optional event tag filter"
+    ),
+    mode: str = Query(
+        default="ann",
+        pattern="^(ann|rerank)$",
+        description="ann: index order; rerank: oversampled index candidates re-ranked exactly"
+    ),
+    group_by_photo: bool = Query(
+        default=False,
+        description="Return only the best-matching face of each photo (top_k counts photos)"
+    ),
+    exclude_source: bool = Query(
+        default=True,
+        description="Leave out results from the query photo itself"
+    )
+):
+    """
+    Search for similar faces using an indexed photo's primary face
+    
+    - Uses the face's stored embedding: no upload and no inference
+    - The primary (largest) face of the photo is the query
+    """
+    return await stored_face_search_response(
+        search_service.search_by_photo_id(
+            str(photo_id),
+            top_k=top_k,
+            threshold=threshold,
+            event_tag=event_tag,
+            mode=mode,
+            group_by_photo=group_by_photo,
+            exclude_source=exclude_source
+        ),
+        not_found=f"Photo {photo_id} not found or has no faces"
+    )
+
+
 @router.get("/photos", response_model=PhotoListResponse)
 async def list_photos(
     page: int = Query(default=1, ge=1, description="Page number"),
@@ -104,7 +668,7 @@ async def list_photos(
     - Optionally filter by event tag
     """
     try:
-        db = get_db()
+        db = get_async_db()
         offset = (page - 1) * page_size
         
         # Build query
@@ -126,16 +690,16 @@ async def list_photos(
         
         # Get total count
         if params:
-            total_result = db.execute_one(count_query, tuple(params))
+            total_result = await db.execute_one(count_query, tuple(params))
         else:
-            total_result = db.execute_one(count_query)
+            total_result = await db.execute_one(count_query)
         total = total_result['count'] if total_result else 0
         
         # Get photos
         list_query += " ORDER BY p.created_at DESC LIMIT %s OFFSET %s"
         params.extend([page_size, offset])
         
-        results = db.execute(list_query, tuple(params))
+        results = await db.execute(list_query, tuple(params))
         
         photos = []
         if results:
@@ -1,60 +1,169 @@
-import psycopg
 from psycopg.rows import dict_row
-from contextlib import contextmanager
-from typing import Generator
+from pgvector.psycopg import HalfVector, register_vector, register_vector_async
+from psycopg_pool import ConnectionPool, AsyncConnectionPool, PoolTimeout
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncGenerator, Generator, Optional
+import asyncio
+import threading
 import logging
+import time
+
+import numpy as np
 
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
 
-class Database:
+class _PooledDatabase:
+    """Shared pool bookkeeping for the sync and async database wrappers"""
+
     def __init__(self, connection_string: str):
         self.connection_string = connection_string
-        self._connection = None
-    
+        self._pool = None
+
+        # Checkout metrics (pool wait time is measured per get_cursor call),
+        # updated from many threads
+        self._metrics_lock = threading.Lock()
+        self._checkouts = 0
+        self._checkout_wait_ms_total = 0.0
+        self._checkout_wait_ms_max = 0.0
+        self._checkout_timeouts = 0
+
+    def _pool_kwargs(self) -> dict:
+        """Pool settings shared by the sync and async pools"""
+        return {
+            "min_size": settings.db_pool_min_size,
+            "max_size": settings.db_pool_max_size,
+            "max_idle": settings.db_pool_max_idle,
+            "max_lifetime": settings.db_pool_max_lifetime,
+            "timeout": settings.db_pool_timeout,
+            "kwargs": {"row_factory": dict_row},
+            "open": False,
+        }
+
+    def _record_checkout(self, wait_ms: float):
+        """Record how long a caller waited for a pooled connection"""
+        with self._metrics_lock:
+            self._checkouts += 1
+            self._checkout_wait_ms_total += wait_ms
+            if wait_ms > self._checkout_wait_ms_max:
+                self._checkout_wait_ms_max = wait_ms
+
+    def _record_timeout(self):
+        """Record a checkout that gave up waiting for a connection"""
+        with self._metrics_lock:
+            self._checkout_timeouts += 1
+        logger.error(
+            f"Timed out waiting {settings.db_pool_timeout}s for a database connection"
+        )
+
+    def get_pool_stats(self) -> dict:
+        """
+        Get connection pool statistics
+
+        Returns:
+            Dictionary with pool size, in-use/idle counts and wait times
+        """
+        if self._pool is None:
+            return {"status": "closed"}
+
+        pool_stats = self._pool.get_stats()
+        pool_size = pool_stats.get("pool_size", 0)
+        pool_available = pool_stats.get("pool_available", 0)
+        with self._metrics_lock:
+            checkouts = self._checkouts
+            checkout_timeouts = self._checkout_timeouts
+            wait_ms_total = self._checkout_wait_ms_total
+            wait_ms_max = self._checkout_wait_ms_max
+        avg_wait_ms = wait_ms_total / checkouts if checkouts else 0.0
+
+        return {
+            "status": "open",
+            "min_size": self._pool.min_size,
+            "max_size": self._pool.max_size,
+            "size": pool_size,
+            "in_use": pool_size - pool_available,
+            "idle": pool_available,
+            "waiting": pool_stats.get("requests_waiting", 0),
+            "checkouts": checkouts,
+            "checkout_timeouts": checkout_timeouts,
+            "avg_wait_ms": round(avg_wait_ms, 3),
+            "max_wait_ms": round(wait_ms_max, 3),
+            "connections_lost": pool_stats.get("connections_lost", 0),
+        }
+
+
+class Database(_PooledDatabase):
+    def __init__(self, connection_string: str):
+        super().__init__(connection_string)
+        self._pool: Optional[ConnectionPool] = None
+        self._lock = threading.Lock()
+
     def connect(self):
-        """Establish database connection"""
-        try:
-            self._connection = psycopg.connect(
-                self.connection_string,
-                row_factory=dict_row
-            )
-            logger.info("Database connection established")
-        except Exception as e:
-            logger.error(f"Failed to connect to database: {e}")
-            raise
-    
+        """Open the connection pool"""
+        with self._lock:
+            if self._pool is not None:
+                return
+
+            try:
+                self._pool = ConnectionPool(
+                    self.connection_string,
+                    check=ConnectionPool.check_connection,
+                    configure=register_vector,
+                    name="photomatch",
+                    **self._pool_kwargs()
+                )
+                self._pool.open(wait=True, timeout=settings.db_pool_timeout)
+                logger.info(
+                    f"Database pool opened (min={settings.db_pool_min_size}, "
+                    f"max={settings.db_pool_max_size})"
+                )
+            except Exception as e:
+                self._pool = None
+                logger.error(f"Failed to connect to database: {e}")
+                raise
+
     def close(self):
-        """Close database connection"""
-        if self._connection:
-            self._connection.close()
-            logger.info("Database connection closed")
-    
+        """Close the connection pool"""
+        with self._lock:
+            if self._pool:
+                self._pool.close()
+                self._pool = None
+                logger.info("Database pool closed")
+
     @contextmanager
     def get_cursor(self) -> Generator:
-        """Get a database cursor"""
-        if not self._connection:
+        """
+        Check out a pooled connection and get a cursor on it
+
+        The connection is committed on success, rolled back on error and
+        returned to the pool when the block exits.
+        """
+        if self._pool is None:
             self.connect()
-        
-        cursor = self._connection.cursor()
+
+        start_time = time.perf_counter()
         try:
-            yield cursor
-            self._connection.commit()
-        except Exception as e:
-            self._connection.rollback()
-            logger.error(f"Database error: {e}")
+            with self._pool.connection() as conn:
+                self._record_checkout((time.perf_counter() - start_time) * 1000)
+                with conn.cursor() as cursor:
+                    try:
+                        yield cursor
+                    except Exception as e:
+                        # The pool rolls back the transaction on error
+                        logger.error(f"Database error: {e}")
+                        raise
+        except PoolTimeout:
+            self._record_timeout()
             raise
-        finally:
-            cursor.close()
-    
+
     def execute(self, query: str, params: tuple = None):
         """Execute a query"""
         with self.get_cursor() as cursor:
             cursor.execute(query, params)
             return cursor.fetchall() if cursor.description else None
-    
+
     def execute_one(self, query: str, params: tuple = None):
         """Execute a query and return one result"""
         with self.get_cursor() as cursor:
@@ -62,10 +171,117 @@ class Database:
             return cursor.fetchone() if cursor.description else None
 
 
-# Global database instance
+class AsyncDatabase(_PooledDatabase):
+    """Async counterpart of Database for use inside request handlers"""
+
+    def __init__(self, connection_string: str):
+        super().__init__(connection_string)
+        self._pool: Optional[AsyncConnectionPool] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def connect(self):
+        """Open the async connection pool"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._pool is not None:
+                return
+
+            try:
+                pool = AsyncConnectionPool(
+                    self.connection_string,
+                    check=AsyncConnectionPool.check_connection,
+                    configure=register_vector_async,
+                    name="photomatch-async",
+                    **self._pool_kwargs()
+                )
+                await pool.open(wait=True, timeout=settings.db_pool_timeout)
+                self._pool = pool
+                logger.info(
+                    f"Async database pool opened (min={settings.db_pool_min_size}, "
+                    f"max={settings.db_pool_max_size})"
+                )
+            except Exception as e:
+                logger.error(f"Failed to connect to database: {e}")
+                raise
+
+    async def close(self):
+        """Close the async connection pool"""
+        if self._pool:
+            await self._pool.close()
+            self._pool = None
+            logger.info("Async database pool closed")
+
+    @asynccontextmanager
+    async def get_cursor(self) -> AsyncGenerator:
+        """
+        Check out a pooled async connection and get a cursor on it
+
+        The connection is committed on success, rolled back on error and
+        returned to the pool when the block exits.
+        """
+        if self._pool is None:
+            await self.connect()
+
+        start_time = time.perf_counter()
+        try:
+            async with self._pool.connection() as conn:
+                self._record_checkout((time.perf_counter() - start_time) * 1000)
+                async with conn.cursor() as cursor:
+                    try:
+                        yield cursor
+                    except Exception as e:
+                        # The pool rolls back the transaction on error
+                        logger.error(f"Database error: {e}")
+                        raise
+        except PoolTimeout:
+            self._record_timeout()
+            raise
+
+    async def execute(self, query: str, params: tuple = None):
+        """Execute a query"""
+        async with self.get_cursor() as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall() if cursor.description else None
+
+    async def execute_one(self, query: str, params: tuple = None):
+        """Execute a query and return one result"""
+        async with self.get_cursor() as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchone() if cursor.description else None
+
+
+def to_db_embedding(embedding):
+    """
+    Adapt an embedding for faces.embedding parameters
+    
+    Returns a HalfVector when embeddings are stored as halfvec
+    (EMBEDDING_STORAGE=float16), otherwise a float32 array sent as vector.
+    """
+    embedding = np.asarray(embedding, dtype=np.float32)
+    if settings.embedding_storage == "float16":
+        return HalfVector(embedding)
+    return embedding
+
+
+def from_db_embedding(value) -> np.ndarray:
+    """Convert a loaded vector or halfvec value to a float32 array"""
+    if isinstance(value, HalfVector):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+# Global database instances
 db = Database(settings.database_url)
+async_db = AsyncDatabase(settings.database_url)
 
 
 def get_db() -> Database:
     """Dependency for getting database instance"""
     return db
+
+
+def get_async_db() -> AsyncDatabase:
+    """Dependency for getting async database instance"""
+    return async_db
@@ -7,7 +7,11 @@ from pathlib import Path
 import logging
 
 from .core.config import settings
-from .core.db import db
+from .core.db import db, async_db
+from .services.inference_executor import inference_executor
+from .services.inference_scheduler import inference_scheduler
+from .services.model_warmup import model_warmup
+from .services.search_service import search_service
 from .api import routes_health, routes_ingest, routes_search, routes_admin
 
 # Configure logging
@@ -77,19 +81,35 @@ async def startup_event():
     """Initialize services on startup"""
     logger.info("Starting PhotoMatch API")
     
-    # Connect to database
+    # Open database connection pools (async for request handlers,
+    # sync for ingest and scripts)
     try:
+        await async_db.connect()
         db.connect()
-        logger.info("Database connection established")
+        logger.info(f"Database pools ready: {async_db.get_pool_stats()}")
     except Exception as e:
         logger.error(f"Failed to connect to database: {e}")
         raise
+    
+    # Load the in-process search index (no-op for pgvector)
+    await search_service.load_backend()
+    
+    # Start inference workers and the query batcher
+    inference_executor.start()
+    inference_scheduler.start()
+    
+    # Load and warm up the face models; /api/ready reports 503 until done
+    model_warmup.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down PhotoMatch API")
+    await inference_scheduler.stop()
+    inference_executor.shutdown()
+    await search_service.save_backend()
+    await async_db.close()
     db.close()
 
 
@@ -19,6 +19,7 @@ class IngestFolderResponse(BaseModel):
 
 class SearchResult(BaseModel):
     photo_id: str
+    face_id: Optional[str] = None  # Matched face
     image_url: str
     similarity: float
     event_tag: Optional[str] = None
@@ -30,7 +31,57 @@ class SearchResult(BaseModel):
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
-    query_time_ms: float
+    query_time_ms: float  # queue_time_ms + inference_time_ms
+    queue_time_ms: Optional[float] = None  # Time waiting for an inference worker
+    inference_time_ms: Optional[float] = None  # Decode + detection + embedding
+    face_detected: bool = True
+    message: Optional[str] = None
+    next_page_token: Optional[str] = None  # Pass to /api/search/next for more results
+
+
+class SearchPageResponse(BaseModel):
+    results: List[SearchResult]
+    search_time_ms: float
+    next_page_token: Optional[str] = None
+
+
+class StoredFaceSearchResponse(BaseModel):
+    query_face_id: str  # Face whose stored embedding was searched
+    query_photo_id: str
+    results: List[SearchResult]
+    search_time_ms: float
+    message: Optional[str] = None
+
+
+class BatchSearchItem(BaseModel):
+    index: int  # Position of the image in the request
+    filename: Optional[str] = None
+    results: List[SearchResult] = []
+    face_detected: bool = True
+    error: Optional[str] = None  # Set when the image could not be read
+
+
+class BatchSearchResponse(BaseModel):
+    items: List[BatchSearchItem]
+    query_time_ms: float  # Embedding time for the whole batch (queue + inference)
+    queue_time_ms: Optional[float] = None
+    inference_time_ms: Optional[float] = None
+    search_time_ms: Optional[float] = None  # Batch vector lookup + row fetch
+
+
+class QueryFaceResult(BaseModel):
+    face_index: int  # 0 is the largest face in the query image
+    bbox: dict  # Query face bounding box: {x1, y1, x2, y2}
+    det_score: float
+    results: List[SearchResult]
+
+
+class MultiFaceSearchResponse(BaseModel):
+    faces: List[QueryFaceResult]
+    query_time_ms: float  # queue_time_ms + inference_time_ms
+    queue_time_ms: Optional[float] = None
+    inference_time_ms: Optional[float] = None
+    search_time_ms: Optional[float] = None  # Batch vector lookup + row fetch
     face_detected: bool = True
     message: Optional[str] = None
 
@@ -40,6 +91,17 @@ class HealthResponse(BaseModel):
     timestamp: datetime
     database: str
     face_model: str
+    database_pool: Optional[dict] = None
+    inference: Optional[dict] = None
+    search_backend: Optional[dict] = None
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    models: str  # pending, warming, ready, failed or skipped
+    database: str
+    warmup_time_ms: Optional[float] = None
+    error: Optional[str] = None
 
 
 class StatsResponse(BaseModel):
@@ -105,3 +167,9 @@ class AdminStatsResponse(BaseModel):
     total_photos: int
     total_faces: int
     event_tags: List[str]
+
+
+class AdminEventPreloadResponse(BaseModel):
+    event_tag: str
+    faces: int
+    load_time_ms: float
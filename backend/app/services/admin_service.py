@@ -2,12 +2,14 @@
 import logging
 from typing import List, Optional, Dict
 from pathlib import Path
+import asyncio
 import uuid
 from datetime import datetime
 
-from ..core.db import db
+from ..core.db import async_db
 from .image_store import image_store
 from .ingest_service import IngestService
+from .search_service import search_service
 
 logger = logging.getLogger(__name__)
 
@@ -25,10 +27,10 @@ class AdminService:
         """
         return username == "admin" and password == "admin"
     
-    def get_all_photos(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+    async def get_all_photos(self, limit: int = 100, offset: int = 0) -> List[Dict]:
         """Get all photos from database"""
-        with db.get_cursor() as cur:
-            cur.execute("""
+        async with async_db.get_cursor() as cur:
+            await cur.execute("""
                 SELECT 
                     p.id,
                     p.path,
@@ -44,7 +46,7 @@ class AdminService:
                 LIMIT %s OFFSET %s
             """, (limit, offset))
             
-            photos = cur.fetchall()
+            photos = await cur.fetchall()
             
             # Convert to list of dicts and add image URLs
             result = []
@@ -57,10 +59,10 @@ class AdminService:
             
             return result
     
-    def get_photo_by_id(self, photo_id: str) -> Optional[Dict]:
+    async def get_photo_by_id(self, photo_id: str) -> Optional[Dict]:
         """Get single photo by ID"""
-        with db.get_cursor() as cur:
-            cur.execute("""
+        async with async_db.get_cursor() as cur:
+            await cur.execute("""
                 SELECT 
                     p.id,
                     p.path,
@@ -72,7 +74,7 @@ class AdminService:
                 WHERE p.id = %s
             """, (photo_id,))
             
-            photo = cur.fetchone()
+            photo = await cur.fetchone()
             if photo:
                 photo_dict = dict(photo)
                 # Convert UUID to string
@@ -82,47 +84,59 @@ class AdminService:
             return None
             return None
     
-    def delete_photo(self, photo_id: str) -> bool:
+    async def delete_photo(self, photo_id: str) -> bool:
         """Delete photo and its faces from database"""
-        with db.get_cursor() as cur:
+        async with async_db.get_cursor() as cur:
             # First delete associated faces
-            cur.execute("DELETE FROM faces WHERE photo_id = %s", (photo_id,))
+            await cur.execute("DELETE FROM faces WHERE photo_id = %s", (photo_id,))
             
             # Then delete photo
-            cur.execute("DELETE FROM photos WHERE id = %s", (photo_id,))
-            
-            return cur.rowcount > 0
+            await cur.execute("DELETE FROM photos WHERE id = %s RETURNING event_tag", (photo_id,))
+            row = await cur.fetchone()
+        
+        if row is not None:
+            search_service.on_photo_deleted(photo_id, row['event_tag'])
+        return row is not None
     
-    def update_photo_tag(self, photo_id: str, event_tag: Optional[str]) -> bool:
+    async def update_photo_tag(self, photo_id: str, event_tag: Optional[str]) -> bool:
         """Update photo event tag"""
-        with db.get_cursor() as cur:
-            cur.execute("""
-                UPDATE photos 
+        async with async_db.get_cursor() as cur:
+            await cur.execute("""
+                UPDATE photos p
                 SET event_tag = %s 
-                WHERE id = %s
+                FROM (SELECT id, event_tag FROM photos WHERE id = %s FOR UPDATE) old
+                WHERE p.id = old.id
+                RETURNING old.event_tag as old_event_tag
             """, (event_tag, photo_id))
-            
-            return cur.rowcount > 0
+            row = await cur.fetchone()
+        
+        if row is not None:
+            search_service.on_event_tag_changed(photo_id, event_tag, row['old_event_tag'])
+        return row is not None
+    
+    async def preload_event(self, event_tag: str) -> Dict:
+        """Load an event's faces into the in-memory search shards"""
+        return await search_service.preload_event(event_tag)
     
-    def get_stats(self) -> Dict:
+    async def get_stats(self) -> Dict:
         """Get database statistics"""
-        with db.get_cursor() as cur:
+        async with async_db.get_cursor() as cur:
             # Total photos
-            cur.execute("SELECT COUNT(*) as count FROM photos")
-            total_photos = cur.fetchone()['count']
+            await cur.execute("SELECT COUNT(*) as count FROM photos")
+            total_photos = (await cur.fetchone())['count']
             
             # Total faces
-            cur.execute("SELECT COUNT(*) as count FROM faces")
-            total_faces = cur.fetchone()['count']
+            await cur.execute("SELECT COUNT(*) as count FROM faces")
+            total_faces = (await cur.fetchone())['count']
             
             # Event tags
-            cur.execute("""
+            await cur.execute("""
                 SELECT DISTINCT event_tag 
                 FROM photos 
                 WHERE event_tag IS NOT NULL
                 ORDER BY event_tag
             """)
-            event_tags = [row['event_tag'] for row in cur.fetchall()]
+            event_tags = [row['event_tag'] for row in await cur.fetchall()]
             
             return {
                 'total_photos': total_photos,
@@ -130,7 +144,7 @@ class AdminService:
                 'event_tags': event_tags
             }
     
-    def upload_image(
+    async def upload_image(
         self,
         file_content: bytes,
         filename: str,
@@ -157,11 +171,12 @@ class AdminService:
             dest_path.parent.mkdir(parents=True, exist_ok=True)
             
             # Write file directly to permanent storage
-            with open(dest_path, 'wb') as f:
-                f.write(file_content)
+            await asyncio.to_thread(dest_path.write_bytes, file_content)
             
-            # Process with ingest service (using permanent path)
-            success, message = self.ingest_service.ingest_image(
+            # Process with ingest service (using permanent path); ingest is
+            # blocking inference + sync DB work, so keep it off the event loop
+            success, message = await asyncio.to_thread(
+                self.ingest_service.ingest_image,
                 str(dest_path),
                 event_tag=event_tag
             )
@@ -0,0 +1,122 @@
+"""In-process binary (sign-bit) index with a Hamming prefilter"""
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.db import from_db_embedding
+from .vector_index import VectorIndex, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+# Number of set bits in every byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def binary_codes(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Pack the sign bits of embeddings into bytes
+
+    Args:
+        embeddings: (n, dim) or (dim,) embeddings
+
+    Returns:
+        (n, dim / 8) or (dim / 8,) uint8 codes, 64 bytes for 512 dims
+    """
+    return np.packbits(np.asarray(embeddings) > 0, axis=-1)
+
+
+def stores_embedding_codes() -> bool:
+    """
+    Whether ingest writes faces.embedding_code
+
+    Only the binary backend reads the codes, and the column only exists
+    once scripts/add_embedding_codes.py has run, so other backends leave
+    it alone (faces without a code fall back to their embedding).
+    """
+    return settings.search_backend == "binary"
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Hamming distance from every packed code to the query code"""
+    return POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1, dtype=np.uint16)
+
+
+class BinaryIndex(VectorIndex):
+    """
+    First-stage search over packed sign-bit codes
+
+    Each face is one bit per dimension (32x smaller than float32), so the
+    whole archive stays cache-friendly and a scan is an XOR plus a byte
+    popcount lookup. The Hamming distance h estimates the angle between
+    vectors (cos ~ cos(pi * h / dim)); these scores only pick a shortlist,
+    which SearchService re-scores against the float embeddings.
+
+    Codes are built from faces.embedding_code (written at ingest, see
+    scripts/add_embedding_codes.py) and from the embedding for faces that
+    predate the column.
+    """
+
+    kind = "binary"
+    exact = False
+    db_columns = "f.embedding_code, CASE WHEN f.embedding_code IS NULL THEN f.embedding END as embedding"
+
+    def __init__(self, directory: str, dim: int):
+        super().__init__(directory, dim)
+        if dim % 8:
+            raise ValueError(f"dim {dim} is not a multiple of 8")
+        self.code_size = dim // 8
+        self._codes = np.zeros((0, self.code_size), dtype=np.uint8)
+
+    @property
+    def codes_path(self) -> Path:
+        return self.directory / f"{self.kind}_codes.npy"
+
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        return binary_codes(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+
+    def vectors_from_rows(self, rows: List[dict]) -> np.ndarray:
+        codes = np.empty((len(rows), self.code_size), dtype=np.uint8)
+        for i, row in enumerate(rows):
+            code = row.get('embedding_code')
+            if code is not None:
+                codes[i] = np.frombuffer(bytes(code), dtype=np.uint8)
+            else:
+                codes[i] = binary_codes(from_db_embedding(row['embedding']))
+        return codes
+
+    def _grow_vectors(self, capacity: int):
+        grown = np.zeros((capacity, self.code_size), dtype=np.uint8)
+        grown[:self._count] = self._codes[:self._count]
+        self._codes = grown
+
+    def _add_vectors(self, start: int, vectors: np.ndarray):
+        self._codes[start:start + len(vectors)] = vectors
+
+    def _search(
+        self, query: np.ndarray, k: int, event_tag: Optional[str], **options
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        query_code = binary_codes(query)
+        if event_tag is None:
+            rows = np.nonzero(self._alive[:self._count])[0]
+            distances = hamming_distances(self._codes[:self._count], query_code)[rows]
+        else:
+            rows = np.nonzero(self.filter_mask(event_tag))[0]
+            distances = hamming_distances(self._codes[rows], query_code)
+
+        rows, neg_distances = top_k_rows(-distances.astype(np.int32), rows, k)
+        similarities = np.cos(np.pi * -neg_distances / self.dim).astype(np.float32)
+        return rows, similarities
+
+    def _save_vectors(self):
+        tmp_path = self.codes_path.with_suffix('.tmp.npy')
+        np.save(tmp_path, self._codes[:self._count])
+        os.replace(tmp_path, self.codes_path)
+
+    def _load_vectors(self, meta: dict):
+        self._codes = np.load(self.codes_path)
+        if self._codes.shape[1] != self.code_size:
+            raise ValueError(f"Snapshot code size {self._codes.shape[1]} != {self.code_size}")
@@ -0,0 +1,500 @@
+"""Per-event in-memory embedding shards for event-filtered searches"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.db import get_async_db, get_db, from_db_embedding
+from .vector_index import best_per_photo, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+
+class EventFaceCounts:
+    """
+    Faces per event, cached for ttl seconds
+
+    Used to estimate how selective an event_tag filter is before choosing
+    a search strategy; counts a few seconds stale are good enough for that.
+    Events touched by deletes and retags are recounted on their next use.
+    Ingest threads update the counts, so they are only touched under a
+    threading lock (never held across a query).
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self.db = get_async_db()
+        self._counts: Dict[Optional[str], int] = {}
+        self._total = 0
+        self._loaded_at = 0.0
+        self._stale = set()
+        self._refresh_lock = asyncio.Lock()
+        self._lock = threading.Lock()
+
+    async def get(self, event_tag: str) -> Tuple[int, int]:
+        """Returns (faces in the event, faces in total)"""
+        if time.monotonic() - self._loaded_at > self.ttl:
+            async with self._refresh_lock:
+                if time.monotonic() - self._loaded_at > self.ttl:
+                    await self._refresh()
+        elif self._stale:
+            async with self._refresh_lock:
+                if self._stale:
+                    await self._refresh_events()
+        with self._lock:
+            return self._counts.get(event_tag, 0), self._total
+
+    async def _refresh(self):
+        rows = await self.db.execute(
+            """
+            SELECT p.event_tag, COUNT(*) as faces
+            FROM faces f
+            JOIN photos p ON f.photo_id = p.id
+            GROUP BY p.event_tag
+            """
+        )
+        counts = {row['event_tag']: row['faces'] for row in rows or []}
+        with self._lock:
+            self._counts = counts
+            self._total = sum(counts.values())
+            self._loaded_at = time.monotonic()
+            self._stale.clear()
+
+    async def _refresh_events(self):
+        """Recount only the invalidated events"""
+        with self._lock:
+            event_tags = set(self._stale)
+        tagged = [event_tag for event_tag in event_tags if event_tag is not None]
+        rows = await self.db.execute(
+            """
+            SELECT p.event_tag, COUNT(*) as faces
+            FROM faces f
+            JOIN photos p ON f.photo_id = p.id
+            WHERE p.event_tag = ANY(%s) OR (%s AND p.event_tag IS NULL)
+            GROUP BY p.event_tag
+            """,
+            (tagged, None in event_tags)
+        )
+        counts = {row['event_tag']: row['faces'] for row in rows or []}
+        with self._lock:
+            for event_tag in event_tags:
+                self._total += counts.get(event_tag, 0) - self._counts.get(event_tag, 0)
+                self._counts[event_tag] = counts.get(event_tag, 0)
+            self._stale.difference_update(event_tags)
+
+    def add_faces(self, faces: List[dict]):
+        """Count ingested faces until the next refresh"""
+        with self._lock:
+            for face in faces:
+                self._counts[face['event_tag']] = self._counts.get(face['event_tag'], 0) + 1
+                self._total += 1
+
+    def invalidate(self, event_tags: Iterable[Optional[str]]):
+        """Recount these events (e.g. after a delete or retag) on their next use"""
+        with self._lock:
+            self._stale.update(event_tags)
+
+
+class EventShard:
+    """
+    Embeddings of one event's faces, searched exactly with one product
+
+    Rows live in preallocated arrays that double when full, so appends are
+    amortized O(1). Appends write past the row count before publishing it
+    and growth swaps in new arrays, so a search that takes (count, arrays)
+    together under the lock sees a consistent prefix while faces are added.
+    With dtype=np.float16 the embeddings take half the memory and are
+    upcast to float32 per search.
+    """
+
+    def __init__(self, event_tag: str, dim: int, dtype=np.float32):
+        self.event_tag = event_tag
+        self.dtype = np.dtype(dtype)
+        self.face_ids: List[str] = []
+        self.photo_ids: List[str] = []
+        self._count = 0
+        self._embeddings = np.zeros((0, dim), dtype=self.dtype)
+        self._alive = np.zeros(0, dtype=bool)
+        self._photo_codes = np.zeros(0, dtype=np.int64)
+        self._photo_code_of: Dict[str, int] = {}
+        self._known = set()
+        self._lock = threading.Lock()
+        # Newest face created_at seen in Postgres, and when that was checked
+        self.synced_at: Optional[datetime] = None
+        self.checked_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return int(self.alive.sum())
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Live flag of every row, including tombstoned ones"""
+        return self._alive[:self._count]
+
+    @property
+    def nbytes(self) -> int:
+        return self._embeddings.nbytes
+
+    def _ensure_capacity(self, needed: int):
+        capacity = len(self._alive)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+
+        def grow(arr: np.ndarray) -> np.ndarray:
+            grown = np.zeros((new_capacity,) + arr.shape[1:], dtype=arr.dtype)
+            grown[:self._count] = arr[:self._count]
+            return grown
+
+        self._embeddings = grow(self._embeddings)
+        self._alive = grow(self._alive)
+        self._photo_codes = grow(self._photo_codes)
+
+    def add(self, face_ids: List[str], photo_ids: List[str], embeddings: np.ndarray):
+        """Append faces, skipping ones already in the shard"""
+        with self._lock:
+            new = [i for i, face_id in enumerate(face_ids) if face_id not in self._known]
+            if not new:
+                return
+            start = self._count
+            end = start + len(new)
+            self._ensure_capacity(end)
+            self._embeddings[start:end] = np.asarray(embeddings)[new]
+            self._alive[start:end] = True
+            self._photo_codes[start:end] = [
+                self._photo_code_of.setdefault(photo_ids[i], len(self._photo_code_of)) for i in new
+            ]
+            self.face_ids.extend(face_ids[i] for i in new)
+            self.photo_ids.extend(photo_ids[i] for i in new)
+            self._known.update(face_ids[i] for i in new)
+            self._count = end
+
+    def remove_photo(self, photo_id: str) -> int:
+        with self._lock:
+            code = self._photo_code_of.get(photo_id)
+            if code is None:
+                return 0
+            rows = np.nonzero((self._photo_codes[:self._count] == code) & self.alive)[0]
+            self._alive[rows] = False
+            return len(rows)
+
+    def _snapshot(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(live rows, their embeddings as float32, photo codes) at one row count"""
+        with self._lock:
+            count = self._count
+            embeddings, photo_codes = self._embeddings, self._photo_codes
+            rows = np.nonzero(self._alive[:count])[0]
+        return rows, np.asarray(embeddings[rows], dtype=np.float32), photo_codes
+
+    def _top_k(
+        self,
+        similarities: np.ndarray,
+        rows: np.ndarray,
+        photo_codes: np.ndarray,
+        k: int,
+        group_by_photo: bool
+    ) -> Tuple[List[str], np.ndarray]:
+        if group_by_photo:
+            rows, similarities = best_per_photo(similarities, rows, photo_codes[rows], k)
+        else:
+            rows, similarities = top_k_rows(similarities, rows, k)
+        return [self.face_ids[row] for row in rows], similarities
+
+    def search(
+        self, query: np.ndarray, k: int, group_by_photo: bool = False
+    ) -> Tuple[List[str], np.ndarray]:
+        """Exact top-k faces (or photos, by their best face)"""
+        rows, embeddings, photo_codes = self._snapshot()
+        return self._top_k(embeddings @ query, rows, photo_codes, k, group_by_photo)
+
+    def search_batch(
+        self, queries: np.ndarray, k: int, group_by_photo: bool = False
+    ) -> List[Tuple[List[str], np.ndarray]]:
+        """Exact top-k for several queries with one matrix product"""
+        rows, embeddings, photo_codes = self._snapshot()
+        similarities = embeddings @ queries.T
+        return [
+            self._top_k(similarities[:, i], rows, photo_codes, k, group_by_photo)
+            for i in range(len(queries))
+        ]
+
+
+class EventShardCache:
+    """
+    LRU of per-event shards
+
+    An exact-strategy search with an event tag is answered from that
+    event's shard, so it only touches the event's faces instead of
+    filtering the whole archive.
+    Shards load from Postgres on first use (or via preload), the least
+    recently used ones are evicted beyond max_events or max_faces, and
+    ingest/delete/retag hooks keep loaded shards current. Faces ingested
+    by other processes (ingest scripts, other workers) are picked up by
+    re-syncing a shard from its created_at high-water mark once it is
+    more than sync_interval seconds old, like InProcessBackend.sync_from_db.
+    An event with more than max_faces faces is never cached.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        max_events: int = 8,
+        max_faces: int = 200000,
+        sync_interval: float = 5.0,
+        dtype=np.float32
+    ):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.max_events = max_events
+        self.max_faces = max_faces
+        self.sync_interval = sync_interval
+        self._shards: "OrderedDict[str, EventShard]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Mutations that arrive while an event loads, replayed on the new shard
+        self._pending: Dict[str, List[Callable[[EventShard], None]]] = {}
+        # Events retagged into while loading; their shard may miss those faces
+        self._stale = set()
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_events > 0
+
+    def fits(self, event_faces: int) -> bool:
+        """Whether an event of event_faces faces can be cached as a shard"""
+        return self.enabled and event_faces <= self.max_faces
+
+    def _is_fresh(self, shard: EventShard) -> bool:
+        return time.monotonic() - shard.checked_at <= self.sync_interval
+
+    async def get(self, event_tag: str) -> EventShard:
+        """Get an event's shard, loading it on a miss and re-syncing it when old"""
+        with self._lock:
+            shard = self._shards.get(event_tag)
+            if shard is not None and self._is_fresh(shard):
+                self._shards.move_to_end(event_tag)
+                self.hits += 1
+                return shard
+
+        load_lock = self._load_locks.setdefault(event_tag, asyncio.Lock())
+        async with load_lock:
+            with self._lock:
+                shard = self._shards.get(event_tag)
+                if shard is not None:
+                    self._shards.move_to_end(event_tag)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    self._pending[event_tag] = []
+            if shard is not None:
+                if not self._is_fresh(shard):
+                    await self._sync_shard(shard)
+                return shard
+
+            try:
+                shard = await asyncio.to_thread(self._load_shard, event_tag)
+            except Exception:
+                with self._lock:
+                    self._pending.pop(event_tag, None)
+                raise
+
+            with self._lock:
+                for apply in self._pending.pop(event_tag, []):
+                    apply(shard)
+                if event_tag in self._stale:
+                    # Serve this search, reload on the next one
+                    self._stale.discard(event_tag)
+                elif len(shard.alive) > self.max_faces:
+                    # Caching it would evict every other shard and still
+                    # exceed max_faces; serve this search only
+                    logger.warning(
+                        f"Event '{event_tag}' has {len(shard.alive)} faces, "
+                        f"more than event_shard_max_faces ({self.max_faces}); not cached"
+                    )
+                else:
+                    self._shards[event_tag] = shard
+                    self._evict(keep=event_tag)
+            return shard
+
+    def _fetch_faces(
+        self, event_tag: str, since: Optional[datetime] = None
+    ) -> Tuple[List[str], List[str], Optional[np.ndarray], Optional[datetime]]:
+        """
+        Read an event's faces (only those created since the given time)
+
+        Returns:
+            Tuple of (face ids, photo ids, embeddings, newest created_at)
+        """
+        query = """
+            SELECT f.id as face_id, f.photo_id, f.embedding, f.created_at
+            FROM faces f
+            JOIN photos p ON f.photo_id = p.id
+            WHERE p.event_tag = %s
+        """
+        params: tuple = (event_tag,)
+        if since is not None:
+            # Overlap a little: rows committed late can carry an earlier
+            # created_at; faces already in the shard are skipped by add
+            query += " AND f.created_at >= %s - interval '1 minute'"
+            params = (event_tag, since)
+
+        face_ids, photo_ids, embeddings = [], [], []
+        synced_at = since
+        with get_db().get_cursor() as cur:
+            for row in cur.stream(query, params):
+                face_ids.append(str(row['face_id']))
+                photo_ids.append(str(row['photo_id']))
+                embeddings.append(from_db_embedding(row['embedding']))
+                if synced_at is None or row['created_at'] > synced_at:
+                    synced_at = row['created_at']
+        return face_ids, photo_ids, np.stack(embeddings) if embeddings else None, synced_at
+
+    def _load_shard(self, event_tag: str) -> EventShard:
+        start = time.perf_counter()
+        shard = EventShard(event_tag, self.dim, dtype=self.dtype)
+        face_ids, photo_ids, embeddings, shard.synced_at = self._fetch_faces(event_tag)
+        if face_ids:
+            shard.add(face_ids, photo_ids, embeddings)
+
+        logger.info(
+            f"Loaded event shard '{event_tag}': {len(shard)} faces "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return shard
+
+    async def _sync_shard(self, shard: EventShard):
+        """Add faces written to Postgres since the shard's high-water mark"""
+        checked_at = time.monotonic()
+        face_ids, photo_ids, embeddings, synced_at = await asyncio.to_thread(
+            self._fetch_faces, shard.event_tag, shard.synced_at
+        )
+        with self._lock:
+            before = len(shard.alive)
+            if face_ids:
+                shard.add(face_ids, photo_ids, embeddings)
+            shard.synced_at = synced_at
+            shard.checked_at = checked_at
+            added = len(shard.alive) - before
+            if added:
+                self._evict(keep=shard.event_tag)
+        if added:
+            logger.info(f"Synced event shard '{shard.event_tag}': {added} new faces")
+
+    def _evict(self, keep: str):
+        """Evict least recently used shards other than keep; keep goes if it alone is too big"""
+        if keep in self._shards and len(self._shards[keep].alive) > self.max_faces:
+            shard = self._shards.pop(keep)
+            logger.info(f"Evicted event shard '{keep}' ({len(shard)} faces, over max_faces)")
+        total = sum(len(shard.alive) for shard in self._shards.values())
+        while len(self._shards) > 1 and (len(self._shards) > self.max_events or total > self.max_faces):
+            event_tag = next(iter(self._shards))
+            if event_tag == keep:
+                self._shards.move_to_end(event_tag)
+                continue
+            shard = self._shards.pop(event_tag)
+            total -= len(shard.alive)
+            logger.info(f"Evicted event shard '{event_tag}' ({len(shard)} faces)")
+
+    async def preload(self, event_tag: str) -> dict:
+        """
+        Load (or refresh the LRU position of) an event's shard
+
+        Raises:
+            ValueError: If the event has more than max_faces faces
+        """
+        start = time.perf_counter()
+        shard = await self.get(event_tag)
+        if len(shard.alive) > self.max_faces:
+            raise ValueError(
+                f"Event '{event_tag}' has {len(shard.alive)} faces, "
+                f"more than event_shard_max_faces ({self.max_faces})"
+            )
+        return {
+            'event_tag': event_tag,
+            'faces': len(shard),
+            'load_time_ms': (time.perf_counter() - start) * 1000
+        }
+
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int,
+        event_tag: str,
+        group_by_photo: bool = False
+    ) -> Tuple[List[str], np.ndarray]:
+        """Exact top-k within one event; returns (face ids, similarities)"""
+        shard = await self.get(event_tag)
+        return await asyncio.to_thread(shard.search, query_embedding, k, group_by_photo)
+
+    async def search_batch(
+        self,
+        queries: np.ndarray,
+        k: int,
+        event_tag: str
+    ) -> List[Tuple[List[str], np.ndarray]]:
+        """Exact top-k within one event for each query"""
+        shard = await self.get(event_tag)
+        return await asyncio.to_thread(shard.search_batch, queries, k)
+
+    def _apply(self, event_tag: Optional[str], apply: Callable[[EventShard], None]):
+        """Apply a mutation to loaded shards (all if event_tag is None)"""
+        with self._lock:
+            for tag, shard in self._shards.items():
+                if event_tag is None or tag == event_tag:
+                    apply(shard)
+            for tag, pending in self._pending.items():
+                if event_tag is None or tag == event_tag:
+                    pending.append(apply)
+
+    def add_faces(self, faces: List[dict]):
+        """Add ingested faces (dicts with face_id, photo_id, event_tag, embedding)"""
+        by_event: Dict[str, List[dict]] = {}
+        for face in faces:
+            if face['event_tag'] is not None:
+                by_event.setdefault(face['event_tag'], []).append(face)
+
+        for event_tag, event_faces in by_event.items():
+            face_ids = [str(face['face_id']) for face in event_faces]
+            photo_ids = [str(face['photo_id']) for face in event_faces]
+            embeddings = np.stack([from_db_embedding(face['embedding']) for face in event_faces])
+            self._apply(
+                event_tag,
+                functools.partial(
+                    EventShard.add, face_ids=face_ids, photo_ids=photo_ids, embeddings=embeddings
+                )
+            )
+
+    def remove_photo(self, photo_id: str):
+        photo_id = str(photo_id)
+        self._apply(None, lambda shard: shard.remove_photo(photo_id))
+
+    def move_photo(self, photo_id: str, event_tag: Optional[str]):
+        """
+        Handle an event tag change
+
+        The photo's faces leave their old shard; the new event's shard is
+        dropped (if loaded) and reloads with them on next use.
+        """
+        self.remove_photo(photo_id)
+        if event_tag is not None:
+            with self._lock:
+                self._shards.pop(event_tag, None)
+                if event_tag in self._pending:
+                    self._stale.add(event_tag)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'events': {tag: len(shard) for tag, shard in self._shards.items()},
+                'memory_mb': sum(shard.nbytes for shard in self._shards.values()) / 1024 / 1024,
+                'hits': self.hits,
+                'misses': self.misses
+            }
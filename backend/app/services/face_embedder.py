@@ -1,10 +1,12 @@
 """Face embedding service"""
 import logging
-from typing import Optional
+from typing import List, Optional, Union
 import numpy as np
 
 from .face_detector import face_detector
 from ..core.config import settings
+from ..utils.bbox import normalize_bbox, select_largest_face, select_top_n_faces
+from ..utils.image_io import load_image_from_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -41,20 +43,76 @@ class FaceEmbedder:
         Returns:
             Normalized embedding vector, or None if no face detected
         """
-        # Detect largest face (this also computes embedding)
-        face = face_detector.detect_largest_face(image)
+        # Detect boxes only, then run recognition on the chosen face alone
+        face = face_detector.detect_largest_face_box(image)
         
         if face is None:
             return None
         
-        # Extract and normalize embedding
-        raw_embedding = face['embedding']
+        # Embed and normalize
+        raw_embedding = face_detector.embed_faces([(image, face)])[0]
         normalized = self.normalize_embedding(raw_embedding)
         
         logger.debug(f"Generated embedding with dim={len(normalized)}")
         
         return normalized
     
+    def get_embeddings_batch(self, images: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """
+        Get normalized embeddings for the largest face in each of several images
+        
+        Only the chosen face of each image goes through recognition, and all
+        of them go through it as one batch.
+        
+        Args:
+            images: List of RGB images as numpy arrays
+            
+        Returns:
+            One normalized embedding (or None if no face detected) per image
+        """
+        crops = []
+        positions = []
+        for idx, image in enumerate(images):
+            face = select_largest_face(face_detector.detect_boxes(image))
+            if face is not None:
+                crops.append((image, face))
+                positions.append(idx)
+        
+        embeddings: List[Optional[np.ndarray]] = [None] * len(images)
+        if crops:
+            raw_embeddings = face_detector.embed_faces(crops)
+            for idx, raw_embedding in zip(positions, raw_embeddings):
+                embeddings[idx] = self.normalize_embedding(raw_embedding)
+        
+        return embeddings
+    
+    def get_face_embeddings(self, image: np.ndarray, max_faces: int) -> List[dict]:
+        """
+        Get normalized embeddings for the largest faces in an image
+        
+        Args:
+            image: RGB image as numpy array
+            max_faces: Maximum number of faces to embed (largest first)
+            
+        Returns:
+            List of dicts with bbox {x1, y1, x2, y2}, det_score and
+            embedding, largest face first
+        """
+        faces = select_top_n_faces(face_detector.detect_boxes(image), max_faces)
+        if not faces:
+            return []
+        
+        raw_embeddings = face_detector.embed_faces([(image, face) for face in faces])
+        results = []
+        for face, raw_embedding in zip(faces, raw_embeddings):
+            x1, y1, x2, y2 = normalize_bbox(face['bbox'])
+            results.append({
+                'bbox': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2},
+                'det_score': face['det_score'],
+                'embedding': self.normalize_embedding(raw_embedding)
+            })
+        return results
+    
     def compute_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """
         Compute cosine similarity between two embeddings
@@ -78,3 +136,71 @@ class FaceEmbedder:
 
 # Global instance
 face_embedder = FaceEmbedder()
+
+
+def embed_image_bytes(image_data: bytes) -> Optional[np.ndarray]:
+    """
+    Decode an image and embed its largest face
+    
+    Module-level so it can run in the inference executor (process pools
+    pickle it by name).
+    
+    Args:
+        image_data: Raw image bytes
+        
+    Returns:
+        Normalized embedding vector, or None if no face detected
+    """
+    image, _, _ = load_image_from_bytes(image_data)
+    return face_embedder.get_embedding(image)
+
+
+def embed_image_bytes_batch(
+    images_data: List[bytes]
+) -> List[Union[np.ndarray, None, Exception]]:
+    """
+    Decode several images and embed the largest face of each in one batch
+    
+    An image that fails to decode yields its exception in place of a result
+    so it does not fail the rest of the batch.
+    
+    Args:
+        images_data: List of raw image bytes
+        
+    Returns:
+        Per image: normalized embedding, None if no face, or the decode error
+    """
+    results: List[Union[np.ndarray, None, Exception]] = [None] * len(images_data)
+    images = []
+    positions = []
+    for idx, image_data in enumerate(images_data):
+        try:
+            image, _, _ = load_image_from_bytes(image_data)
+        except Exception as e:
+            results[idx] = e
+            continue
+        images.append(image)
+        positions.append(idx)
+    
+    if images:
+        for idx, embedding in zip(positions, face_embedder.get_embeddings_batch(images)):
+            results[idx] = embedding
+    
+    return results
+
+
+def embed_image_faces(image_data: bytes, max_faces: int) -> List[dict]:
+    """
+    Decode an image and embed up to max_faces of its faces in one batch
+    
+    Module-level so it can run in the inference executor.
+    
+    Args:
+        image_data: Raw image bytes
+        max_faces: Maximum number of faces (largest first)
+        
+    Returns:
+        See FaceEmbedder.get_face_embeddings
+    """
+    image, _, _ = load_image_from_bytes(image_data)
+    return face_embedder.get_face_embeddings(image, max_faces)
@@ -0,0 +1,132 @@
+"""In-process HNSW graph index for face embeddings"""
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .vector_index import VectorIndex, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+
+class HnswIndex(VectorIndex):
+    """
+    Approximate nearest neighbour search with an HNSW graph (hnswlib)
+
+    Graph labels are the metadata row numbers, so ids, events and
+    tombstones are shared with the other in-process indexes. Deleted faces
+    are marked deleted in the graph (soft delete) and skipped by searches.
+    The graph is snapshotted next to the metadata so a restart loads it
+    instead of rebuilding from Postgres.
+    """
+
+    kind = "hnsw"
+    exact = True  # Returned similarities are exact; only recall is approximate
+
+    def __init__(
+        self,
+        directory: str,
+        dim: int,
+        m: int = 16,
+        ef_construction: int = 64,
+        ef_search: int = 40
+    ):
+        super().__init__(directory, dim)
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._graph = None
+
+    @property
+    def graph_path(self) -> Path:
+        return self.directory / f"{self.kind}_graph.bin"
+
+    def _new_graph(self):
+        # Import hnswlib only when this backend is selected
+        import hnswlib
+        return hnswlib.Index(space='ip', dim=self.dim)
+
+    def _grow_vectors(self, capacity: int):
+        if self._graph is None:
+            self._graph = self._new_graph()
+            self._graph.init_index(
+                max_elements=capacity,
+                ef_construction=self.ef_construction,
+                M=self.m
+            )
+        else:
+            self._graph.resize_index(capacity)
+
+    def _add_vectors(self, start: int, embeddings: np.ndarray):
+        labels = np.arange(start, start + len(embeddings))
+        self._graph.add_items(embeddings, labels)
+
+    def _remove_rows(self, rows: np.ndarray):
+        for row in rows:
+            self._graph.mark_deleted(int(row))
+
+    def vectors_for_rows(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self._graph.get_items(rows.tolist()), dtype=np.float32)
+
+    def _search(
+        self,
+        query: np.ndarray,
+        k: int,
+        event_tag: Optional[str],
+        ef_search: Optional[int] = None,
+        filter_strategy: Optional[str] = None,
+        **options
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if event_tag is not None and filter_strategy == "exact":
+            # Small event: brute force its vectors instead of walking the graph
+            rows = np.nonzero(self.filter_mask(event_tag))[0]
+            if len(rows) == 0:
+                return rows, np.zeros(0, dtype=np.float32)
+            similarities = self.vectors_for_rows(rows) @ query
+            return top_k_rows(similarities, rows, k)
+
+        if event_tag is None:
+            available = len(self)
+            label_filter = None
+        else:
+            mask = self.filter_mask(event_tag)
+            available = int(mask.sum())
+            label_filter = lambda label: bool(mask[label])
+
+        k = min(k, available)
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        self._graph.set_ef(max(ef_search or self.ef_search, k))
+        try:
+            labels, distances = self._graph.knn_query(query, k=k, filter=label_filter)
+        except RuntimeError:
+            # Too few reachable matches for this ef (sparse filter or many
+            # tombstones); widen the search to every candidate
+            logger.warning(f"HNSW search found fewer than {k} results, widening ef")
+            self._graph.set_ef(max(available, k))
+            labels, distances = self._graph.knn_query(query, k=k, filter=label_filter)
+
+        # 'ip' space distance is 1 - inner product
+        return labels[0].astype(np.int64), (1 - distances[0]).astype(np.float32)
+
+    def _save_vectors(self):
+        if self._graph is None:
+            return
+        tmp_path = self.graph_path.with_suffix('.tmp')
+        self._graph.save_index(str(tmp_path))
+        os.replace(tmp_path, self.graph_path)
+
+    def _load_vectors(self, meta: dict):
+        if not self.graph_path.exists():
+            raise FileNotFoundError(self.graph_path)
+        graph = self._new_graph()
+        # Deleted marks are stored in the graph file along with the links
+        graph.load_index(str(self.graph_path), max_elements=max(self._count, 1024))
+        graph.set_ef(self.ef_search)
+        self._graph = graph
+
+    def _extra_meta(self) -> dict:
+        return {'m': self.m, 'ef_construction': self.ef_construction}
@@ -0,0 +1,151 @@
+"""Executor for running face inference off the event loop"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue is at its configured depth"""
+
+
+# Set in each worker process by _init_worker
+_worker_barrier = None
+
+
+def _init_worker(barrier, warmup_iterations: int):
+    """Load (and warm, if configured) the face models once in each worker process"""
+    global _worker_barrier
+    from .face_detector import face_detector
+    if warmup_iterations:
+        face_detector.warmup(warmup_iterations)
+    else:
+        face_detector.initialize()
+    _worker_barrier = barrier
+
+
+def wait_for_workers(timeout: float) -> int:
+    """
+    Block until every worker process is running this function
+
+    A process takes one job at a time, so max_workers of these jobs land
+    on max_workers distinct processes, each past its initializer.
+
+    Returns:
+        The worker's process id
+    """
+    _worker_barrier.wait(timeout)
+    return os.getpid()
+
+
+def _timed_call(fn: Callable, *args) -> Tuple[Any, float, float]:
+    """
+    Run fn inside the worker and report when it started and finished
+
+    Wall-clock timestamps are used so they stay comparable across processes.
+    """
+    started_at = time.time()
+    result = fn(*args)
+    return result, started_at, time.time()
+
+
+class InferenceExecutor:
+    """
+    Runs blocking inference calls in a bounded thread or process pool
+
+    Jobs beyond the worker count wait in the pool queue; once
+    ``inference_max_queue`` jobs are already waiting, new jobs are rejected
+    with InferenceQueueFull instead of piling up.
+    """
+
+    def __init__(self):
+        self.kind = settings.inference_executor
+        self.max_workers = settings.inference_workers
+        self.max_queue = settings.inference_max_queue
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    def start(self):
+        """Create the worker pool"""
+        if self._executor is not None:
+            return
+
+        if self.kind == "process":
+            # Workers load and warm their models as they start
+            warmup_iterations = settings.warmup_iterations if settings.warmup_on_startup else 0
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(multiprocessing.Barrier(self.max_workers), warmup_iterations)
+            )
+        elif self.kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference"
+            )
+        else:
+            raise ValueError(f"Unknown inference executor: {self.kind}")
+
+        logger.info(
+            f"Inference executor started: kind={self.kind}, "
+            f"workers={self.max_workers}, max_queue={self.max_queue}"
+        )
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("Inference executor stopped")
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs running or waiting in the pool"""
+        return self._pending
+
+    async def run(self, fn: Callable, *args) -> Tuple[Any, float, float]:
+        """
+        Run a blocking inference function in the pool
+
+        Args:
+            fn: Module-level callable (must be picklable for process pools)
+            *args: Positional arguments for fn
+
+        Returns:
+            Tuple of (result, queue wait in ms, inference time in ms)
+
+        Raises:
+            InferenceQueueFull: If the queue is already at max depth
+        """
+        if self._executor is None:
+            self.start()
+
+        if self._pending >= self.max_workers + self.max_queue:
+            raise InferenceQueueFull(
+                f"Inference queue is full ({self._pending} jobs pending)"
+            )
+
+        self._pending += 1
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started_at, finished_at = await loop.run_in_executor(
+                self._executor, _timed_call, fn, *args
+            )
+        finally:
+            self._pending -= 1
+
+        queue_ms = max(0.0, started_at - submitted_at) * 1000
+        inference_ms = (finished_at - started_at) * 1000
+        return result, queue_ms, inference_ms
+
+
+# Global instance
+inference_executor = InferenceExecutor()
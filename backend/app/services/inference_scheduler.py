@@ -0,0 +1,239 @@
+"""Micro-batching scheduler for query image inference"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from ..core.config import settings
+from .face_embedder import embed_image_bytes, embed_image_bytes_batch
+from .inference_executor import inference_executor, InferenceQueueFull
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingQuery:
+    image_data: bytes
+    future: asyncio.Future
+    submitted_at: float
+
+
+class InferenceScheduler:
+    """
+    Collects concurrent query images into batches for the face models
+
+    The first query of a batch waits at most ``inference_batch_max_wait_ms``
+    for others to join; a batch is dispatched as soon as it reaches
+    ``inference_batch_max_size``. Each caller gets back only its own
+    embedding. A max batch size of 1 disables batching.
+
+    Queries in flight (queued, collecting or running, from submit and
+    submit_many alike) are capped at what the executor's bounded queue
+    holds in full batches ((workers + max_queue) * max_batch_size). A
+    submit over the cap is rejected up front with InferenceQueueFull,
+    all of a submit_many at once rather than chunk by chunk.
+    """
+
+    def __init__(self):
+        self.max_batch_size = settings.inference_batch_max_size
+        self.max_wait_ms = settings.inference_batch_max_wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._dispatches: set = set()
+        self.max_in_flight = (
+            inference_executor.max_workers + inference_executor.max_queue
+        ) * max(self.max_batch_size, 1)
+        self._in_flight = 0
+
+        # Batch metrics
+        self._batches = 0
+        self._batched_queries = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    def start(self):
+        """Start the batch collector on the running event loop"""
+        if not self.enabled or self._collector is not None:
+            return
+
+        # Bounded by the in-flight cap checked in submit
+        self._queue = asyncio.Queue()
+        self._collector = asyncio.create_task(self._collect())
+        logger.info(
+            f"Inference scheduler started: max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait_ms}"
+        )
+
+    async def stop(self):
+        """Stop collecting and wait for in-flight batches to finish"""
+        if self._collector is None:
+            return
+
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        self._collector = None
+
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+        # Fail anything still queued so callers do not hang
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Inference scheduler stopped"))
+        logger.info("Inference scheduler stopped")
+
+    def get_stats(self) -> dict:
+        """Get batching statistics"""
+        return {
+            "enabled": self.enabled,
+            "batches": self._batches,
+            "queries": self._batched_queries,
+            "avg_batch_size": round(
+                self._batched_queries / self._batches, 2
+            ) if self._batches else 0.0,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+        }
+
+    def _reserve(self, queries: int):
+        """Count queries as in flight, or reject them if over the cap"""
+        if self._in_flight + queries > self.max_in_flight:
+            raise InferenceQueueFull(
+                f"Inference queue is full ({self._in_flight} queries in flight, "
+                f"{queries} more submitted, limit {self.max_in_flight})"
+            )
+        self._in_flight += queries
+
+    async def submit(self, image_data: bytes) -> Tuple[Optional[np.ndarray], float, float]:
+        """
+        Embed the largest face of a query image
+
+        Args:
+            image_data: Raw image bytes
+
+        Returns:
+            Tuple of (normalized embedding or None, queue wait in ms,
+            inference time in ms)
+
+        Raises:
+            InferenceQueueFull: If the in-flight cap is reached
+        """
+        if not self.enabled:
+            return await inference_executor.run(embed_image_bytes, image_data)
+
+        if self._collector is None:
+            self.start()
+
+        self._reserve(1)
+        try:
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait(_PendingQuery(image_data, future, time.time()))
+            return await future
+        finally:
+            self._in_flight -= 1
+
+    async def submit_many(
+        self,
+        images_data: List[bytes]
+    ) -> Tuple[List[Union[np.ndarray, None, Exception]], float, float]:
+        """
+        Embed the largest face of many query images (one request's batch)
+
+        The images are split into chunks of the batch size and the chunks run
+        concurrently across the inference workers, bypassing the collector.
+        All images count against the in-flight cap up front; a chunk that
+        still fails (e.g. the executor is busy with other work) fails only
+        its own images.
+
+        Args:
+            images_data: List of raw image bytes
+
+        Returns:
+            Tuple of (per image: embedding, None if no face, or the decode
+            error; longest queue wait in ms; total inference time in ms)
+
+        Raises:
+            InferenceQueueFull: If the images would exceed the in-flight cap
+        """
+        self._reserve(len(images_data))
+        try:
+            chunk_size = max(self.max_batch_size, 1)
+            chunks = [images_data[i:i + chunk_size] for i in range(0, len(images_data), chunk_size)]
+            outputs = await asyncio.gather(*(
+                inference_executor.run(embed_image_bytes_batch, chunk) for chunk in chunks
+            ), return_exceptions=True)
+        finally:
+            self._in_flight -= len(images_data)
+
+        results: List[Union[np.ndarray, None, Exception]] = []
+        queue_ms, inference_ms = 0.0, 0.0
+        for chunk, output in zip(chunks, outputs):
+            if isinstance(output, BaseException):
+                results.extend([output] * len(chunk))
+                continue
+            chunk_results, chunk_queue_ms, chunk_inference_ms = output
+            results.extend(chunk_results)
+            queue_ms = max(queue_ms, chunk_queue_ms)
+            inference_ms += chunk_inference_ms
+        return results, queue_ms, inference_ms
+
+    async def _collect(self):
+        """Group queued queries into batches and dispatch them"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Keep collecting while this batch runs
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[_PendingQuery]):
+        """Run one batch through the models and resolve each caller"""
+        dispatched_at = time.time()
+        try:
+            results, queue_ms, inference_ms = await inference_executor.run(
+                embed_image_bytes_batch, [item.image_data for item in batch]
+            )
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        self._batches += 1
+        self._batched_queries += len(batch)
+        logger.debug(f"Ran inference batch of {len(batch)} in {inference_ms:.2f}ms")
+
+        for item, result in zip(batch, results):
+            if item.future.done():
+                continue
+            if isinstance(result, Exception):
+                item.future.set_exception(result)
+                continue
+            # Time spent collecting the batch counts as queue wait
+            item_queue_ms = (dispatched_at - item.submitted_at) * 1000 + queue_ms
+            item.future.set_result((result, item_queue_ms, inference_ms))
+
+
+# Global instance
+inference_scheduler = InferenceScheduler()
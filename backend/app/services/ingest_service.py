@@ -4,12 +4,14 @@ from typing import Optional, Tuple
 from pathlib import Path
 import uuid
 
-from ..core.db import get_db
+from ..core.db import get_db, to_db_embedding
 from ..utils.image_io import load_image, compute_sha1, get_supported_images
 from ..utils.bbox import normalize_bbox, select_top_n_faces
 from .face_embedder import face_embedder
 from .face_detector import face_detector
 from .image_store import image_store
+from .search_service import search_service
+from .binary_index import binary_codes, stores_embedding_codes
 
 logger = logging.getLogger(__name__)
 
@@ -88,6 +90,7 @@ class IngestService:
             )
             
             # Insert face records (mark first/largest as primary)
+            indexed_faces = []
             for idx, face in enumerate(top_faces):
                 # Get normalized embedding
                 embedding = face_embedder.normalize_embedding(face['embedding'])
@@ -97,18 +100,38 @@ class IngestService:
                 
                 # Insert face record with embedding
                 face_id = str(uuid.uuid4())
-                # Convert embedding to list for pgvector
-                embedding_list = embedding.tolist()
+                # Adapt embedding to the faces.embedding type (vector or halfvec)
+                db_embedding = to_db_embedding(embedding)
                 
                 is_primary = (idx == 0)  # First face is primary (largest)
                 
-                self.db.execute(
-                    """
-                    INSERT INTO faces (id, photo_id, x1, y1, x2, y2, embedding, is_primary)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (face_id, photo_id, x1, y1, x2, y2, embedding_list, is_primary)
-                )
+                if stores_embedding_codes():
+                    # Packed sign bits for the binary search backend
+                    self.db.execute(
+                        """
+                        INSERT INTO faces (id, photo_id, x1, y1, x2, y2, embedding, embedding_code, is_primary)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        (face_id, photo_id, x1, y1, x2, y2, db_embedding,
+                         binary_codes(embedding).tobytes(), is_primary)
+                    )
+                else:
+                    self.db.execute(
+                        """
+                        INSERT INTO faces (id, photo_id, x1, y1, x2, y2, embedding, is_primary)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        (face_id, photo_id, x1, y1, x2, y2, db_embedding, is_primary)
+                    )
+                indexed_faces.append({
+                    'face_id': face_id,
+                    'photo_id': photo_id,
+                    'event_tag': event_tag,
+                    'embedding': embedding
+                })
+            
+            # Keep in-process search indexes in sync
+            search_service.on_faces_added(indexed_faces)
             
             logger.info(f"Successfully ingested: {file_path} (photo_id={photo_id})")
             return True, "success"
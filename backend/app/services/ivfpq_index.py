@@ -0,0 +1,267 @@
+"""In-process IVF-PQ compressed index for face embeddings"""
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .vector_index import VectorIndex, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+
+def kmeans(
+    data: np.ndarray,
+    k: int,
+    iterations: int = 20,
+    seed: int = 0,
+    chunk_size: int = 8192
+) -> np.ndarray:
+    """
+    Lloyd's k-means with squared L2 distance
+
+    Args:
+        data: (n, d) training vectors
+        k: Number of centroids
+        iterations: Lloyd iterations
+        seed: Random seed for initialization
+        chunk_size: Rows assigned per step (bounds the distance matrix size)
+
+    Returns:
+        (k, d) float32 centroids
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    n = len(data)
+    if n < k:
+        raise ValueError(f"Need at least {k} training vectors, got {n}")
+
+    centroids = data[rng.choice(n, k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_nearest(data, centroids, chunk_size)
+        counts = np.bincount(assignments, minlength=k)
+        # Per-dimension weighted bincount: buffered, unlike np.add.at
+        sums = np.stack(
+            [np.bincount(assignments, weights=data[:, j], minlength=k) for j in range(data.shape[1])],
+            axis=1
+        ).astype(np.float32)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters from random points
+        if empty.any():
+            centroids[empty] = data[rng.choice(n, int(empty.sum()), replace=False)]
+
+    return centroids
+
+
+def assign_nearest(data: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for each row"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2; |x|^2 does not change the argmin
+        distances = centroid_norms[None, :] - 2 * chunk @ centroids.T
+        assignments[start:start + chunk_size] = distances.argmin(axis=1)
+    return assignments
+
+
+class IvfPqIndex(VectorIndex):
+    """
+    Inverted file with product-quantized residuals
+
+    Each face is assigned to its nearest coarse centroid and the residual is
+    encoded as ``n_subvectors`` one-byte PQ codes (64 bytes per face with the
+    defaults, instead of 2 KB of float32). A search probes the ``nprobe``
+    closest lists and scores their faces by asymmetric distance computation:
+    for cosine/inner product, q.(c + r) = q.c + sum_m q_m.codebook_m[code_m],
+    so one lookup table per query serves every probed list. Scores are
+    approximate, so SearchService re-ranks the shortlist against the exact
+    embeddings.
+    """
+
+    kind = "ivfpq"
+    exact = False
+
+    def __init__(
+        self,
+        directory: str,
+        dim: int,
+        n_lists: int = 1024,
+        n_subvectors: int = 64,
+        nprobe: int = 16
+    ):
+        super().__init__(directory, dim)
+        if dim % n_subvectors:
+            raise ValueError(f"dim {dim} is not divisible by {n_subvectors} subvectors")
+        self.n_lists = n_lists
+        self.n_subvectors = n_subvectors
+        self.sub_dim = dim // n_subvectors
+        self.nprobe = nprobe
+
+        self.centroids: Optional[np.ndarray] = None  # (n_lists, dim)
+        self._centroid_sq_norms: Optional[np.ndarray] = None  # (n_lists,)
+        self.codebooks: Optional[np.ndarray] = None  # (n_subvectors, 256, sub_dim)
+        self._codes = np.zeros((0, n_subvectors), dtype=np.uint8)
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._list_rows: List[np.ndarray] = []
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None and self.codebooks is not None
+
+    @property
+    def min_train_size(self) -> int:
+        """Fewest training vectors k-means needs (lists and PQ centroids)"""
+        return max(self.n_lists, 256)
+
+    @property
+    def codes_path(self) -> Path:
+        return self.directory / f"{self.kind}_codes.npz"
+
+    def train(self, sample: np.ndarray, iterations: int = 20):
+        """
+        Train coarse centroids and PQ codebooks
+
+        Codes depend on the codebooks, so training is only allowed while the
+        index is empty; retraining means rebuilding the index.
+
+        Args:
+            sample: (n, dim) normalized embeddings, n >= n_lists and >= 256
+            iterations: k-means iterations
+        """
+        if self._count:
+            raise RuntimeError("IVF-PQ index can only be trained while empty")
+        sample = np.asarray(sample, dtype=np.float32)
+        if len(sample) < self.min_train_size:
+            raise ValueError(
+                f"IVF-PQ with {self.n_lists} lists needs at least {self.min_train_size} "
+                f"training vectors, got {len(sample)}"
+            )
+        logger.info(f"Training IVF-PQ on {len(sample)} vectors: lists={self.n_lists}, subvectors={self.n_subvectors}")
+
+        centroids = kmeans(sample, self.n_lists, iterations)
+        residuals = sample - centroids[assign_nearest(sample, centroids)]
+
+        codebooks = np.empty((self.n_subvectors, 256, self.sub_dim), dtype=np.float32)
+        for m in range(self.n_subvectors):
+            sub = residuals[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            codebooks[m] = kmeans(sub, 256, iterations, seed=m)
+
+        with self._lock:
+            self.centroids = centroids
+            self._centroid_sq_norms = (centroids ** 2).sum(axis=1)
+            self.codebooks = codebooks
+            self._list_rows = [np.zeros(0, dtype=np.int64) for _ in range(self.n_lists)]
+        logger.info("IVF-PQ training complete")
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(residuals), self.n_subvectors), dtype=np.uint8)
+        for m in range(self.n_subvectors):
+            sub = residuals[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            codes[:, m] = assign_nearest(sub, self.codebooks[m])
+        return codes
+
+    def _grow_vectors(self, capacity: int):
+        grown_codes = np.zeros((capacity, self.n_subvectors), dtype=np.uint8)
+        grown_codes[:self._count] = self._codes[:self._count]
+        grown_lists = np.zeros(capacity, dtype=np.int32)
+        grown_lists[:self._count] = self._lists[:self._count]
+        self._codes = grown_codes
+        self._lists = grown_lists
+
+    def _add_vectors(self, start: int, embeddings: np.ndarray):
+        if not self.trained:
+            raise RuntimeError("IVF-PQ index must be trained before adding faces")
+
+        lists = assign_nearest(embeddings, self.centroids)
+        end = start + len(embeddings)
+        self._lists[start:end] = lists
+        self._codes[start:end] = self._encode(embeddings - self.centroids[lists])
+
+        rows = np.arange(start, end)
+        for list_id in np.unique(lists):
+            self._list_rows[list_id] = np.concatenate(
+                [self._list_rows[list_id], rows[lists == list_id]]
+            )
+
+    def _search(
+        self,
+        query: np.ndarray,
+        k: int,
+        event_tag: Optional[str],
+        nprobe: Optional[int] = None,
+        filter_strategy: Optional[str] = None,
+        **options
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.trained or self._count == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        coarse = self.centroids @ query
+        if event_tag is not None and filter_strategy == "exact":
+            # Small event: score all of its rows, whichever lists they are in
+            rows = np.nonzero(self.filter_mask(event_tag))[0]
+        else:
+            rows = self._probe(coarse, min(nprobe or self.nprobe, self.n_lists), k, event_tag)
+        if len(rows) == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+
+        # Lookup table: inner product of each query subvector with each code
+        query_subs = query.reshape(self.n_subvectors, self.sub_dim)
+        lut = np.einsum('md,mjd->mj', query_subs, self.codebooks)
+        codes = self._codes[rows]
+        scores = coarse[self._lists[rows]] + lut[np.arange(self.n_subvectors), codes].sum(axis=1)
+
+        return top_k_rows(scores.astype(np.float32), rows, k)
+
+    def _probe(self, coarse: np.ndarray, nprobe: int, k: int, event_tag: Optional[str]) -> np.ndarray:
+        """
+        Live rows in the nprobe lists closest to the query
+
+        Lists are ranked by L2 distance to their centroid, matching how
+        faces were assigned: |q - c|^2 = |q|^2 - 2 q.c + |c|^2, so the
+        closest lists have the largest q.c - |c|^2 / 2. With an event filter
+        the probe doubles until the event contributes k candidates (or every
+        list is probed).
+        """
+        order = np.argsort(-(coarse - 0.5 * self._centroid_sq_norms))
+        mask = self.filter_mask(event_tag)
+        while True:
+            rows = np.concatenate([self._list_rows[list_id] for list_id in order[:nprobe]])
+            rows = rows[mask[rows]]
+            if event_tag is None or len(rows) >= k or nprobe >= self.n_lists:
+                return rows
+            nprobe = min(nprobe * 2, self.n_lists)
+
+    def _save_vectors(self):
+        if not self.trained:
+            return
+        tmp_path = self.codes_path.with_suffix('.tmp.npz')
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            codes=self._codes[:self._count],
+            lists=self._lists[:self._count]
+        )
+        os.replace(tmp_path, self.codes_path)
+
+    def _load_vectors(self, meta: dict):
+        if meta.get('n_lists') != self.n_lists or meta.get('n_subvectors') != self.n_subvectors:
+            raise ValueError("Snapshot was trained with different IVF-PQ settings")
+        arrays = np.load(self.codes_path)
+        self.centroids = arrays['centroids']
+        self._centroid_sq_norms = (self.centroids ** 2).sum(axis=1)
+        self.codebooks = arrays['codebooks']
+        self._codes = arrays['codes']
+        self._lists = arrays['lists']
+
+        # Rebuild the inverted lists from the stored assignments
+        order = np.argsort(self._lists[:self._count], kind='stable')
+        bounds = np.searchsorted(self._lists[:self._count][order], np.arange(self.n_lists + 1))
+        self._list_rows = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(self.n_lists)]
+
+    def _extra_meta(self) -> dict:
+        return {'n_lists': self.n_lists, 'n_subvectors': self.n_subvectors}
@@ -0,0 +1,69 @@
+"""Startup model loading and warm-up with readiness tracking"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from ..core.config import settings
+from .face_detector import warmup_face_models
+from .inference_executor import inference_executor, wait_for_workers
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for every inference process to load and warm its models
+WORKER_START_TIMEOUT = 600.0
+
+
+class ModelWarmup:
+    """
+    Loads and warms the face models in every inference worker
+
+    Worker processes warm up in the pool initializer, and readiness waits
+    until all of them have started. Worker threads share one detector, so
+    a single warm-up job covers them all.
+    """
+
+    def __init__(self):
+        self.status = "pending"  # pending -> warming -> ready | failed, or skipped
+        self.error: Optional[str] = None
+        self.duration_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("ready", "skipped")
+
+    def start(self):
+        """Start warming up in the background so liveness checks still answer"""
+        if not settings.warmup_on_startup:
+            # Models load lazily on the first query instead
+            self.status = "skipped"
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        """Load the models and run warm-up inferences in each worker"""
+        self.status = "warming"
+        start_time = time.perf_counter()
+        try:
+            if inference_executor.kind == "process":
+                await asyncio.gather(*[
+                    inference_executor.run(wait_for_workers, WORKER_START_TIMEOUT)
+                    for _ in range(inference_executor.max_workers)
+                ])
+            else:
+                await inference_executor.run(warmup_face_models, settings.warmup_iterations)
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.error(f"Model warm-up failed: {e}")
+            return
+
+        self.duration_ms = (time.perf_counter() - start_time) * 1000
+        self.status = "ready"
+        logger.info(f"Models ready after {self.duration_ms:.0f}ms")
+
+
+# Global instance
+model_warmup = ModelWarmup()
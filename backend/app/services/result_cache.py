@@ -0,0 +1,158 @@
+"""Search result cache invalidated by data generations"""
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.db import get_async_db
+from ..models.schemas import SearchResult
+from ..utils.lru_cache import LRUCache
+from ..utils.single_flight import SingleFlight
+
+# Returned by get on a miss
+_NOT_CACHED = object()
+
+
+class SearchResultCache:
+    """
+    LRU of search results keyed by a quantized query embedding
+
+    Every entry records the data generation it was computed at: the
+    event's generation for event-filtered searches, the global one for
+    unfiltered searches. A generation pairs a version read from Postgres
+    (re-read at most every check_interval seconds) with an in-process
+    counter. For an event the version is its face count and newest face
+    created_at; globally it is the faces and photos row change counters
+    from pg_stat_user_tables, which cost nothing to read where a COUNT(*)
+    would scan every face. Postgres catches writes by ingest scripts,
+    other workers and direct edits; the counter makes this worker's own
+    ingests, deletes and retags visible at once. Only entries that could
+    have changed stop matching; stale entries age out of the LRU.
+
+    Embeddings are rounded to multiples of quantum before hashing, so
+    re-embeddings of the same query image with tiny float differences
+    (e.g. on another worker) usually share a key.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl: float,
+        quantum: float = 0.01,
+        check_interval: float = 5.0
+    ):
+        self.quantum = quantum
+        self.db = get_async_db()
+        self._cache = LRUCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl=ttl,
+            sizeof=lambda entry: 512 * len(entry[1]) + 64
+        )
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._event_generations: Dict[str, int] = {}
+        # Event tag -> (face count, newest created_at); None -> table change counters
+        self._db_versions = LRUCache(
+            max_entries=4096,
+            max_bytes=4096 * 256,
+            ttl=check_interval,
+            sizeof=lambda version: 256
+        )
+        self._version_flights = SingleFlight()
+        self.stale = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    def key(self, query_embedding: np.ndarray, event_tag: Optional[str], **params) -> Tuple:
+        """Cache key for a query embedding, event tag and search parameters"""
+        quantized = np.round(np.asarray(query_embedding, dtype=np.float32) / self.quantum).astype(np.int16)
+        return (
+            hashlib.sha1(quantized.tobytes()).hexdigest(),
+            event_tag,
+            tuple(sorted(params.items()))
+        )
+
+    async def generation(self, event_tag: Optional[str]) -> Optional[Tuple]:
+        """Current generation of the data a search with event_tag reads (None if disabled)"""
+        if not self.enabled:
+            return None
+        version = self._db_versions.get(event_tag)
+        if version is None:
+            version = await self._version_flights.do(event_tag, lambda: self._read_version(event_tag))
+        with self._lock:
+            if event_tag is None:
+                return version, self._generation
+            return version, self._event_generations.get(event_tag, 0)
+
+    async def _read_version(self, event_tag: Optional[str]) -> Tuple:
+        if event_tag is None:
+            # Cumulative inserts/updates/deletes. Other sessions publish
+            # theirs up to ~10s after commit (when they go idle); a stats
+            # reset or a rolled-back write only causes misses.
+            rows = await self.db.execute(
+                """
+                SELECT relname, n_tup_ins, n_tup_upd, n_tup_del
+                FROM pg_stat_user_tables
+                WHERE relid IN ('faces'::regclass, 'photos'::regclass)
+                ORDER BY relname
+                """
+            )
+            version = tuple(
+                (row['relname'], row['n_tup_ins'], row['n_tup_upd'], row['n_tup_del'])
+                for row in rows or []
+            )
+        else:
+            row = await self.db.execute_one(
+                """
+                SELECT COUNT(*) as faces, MAX(f.created_at) as newest
+                FROM faces f
+                JOIN photos p ON f.photo_id = p.id
+                WHERE p.event_tag = %s
+                """,
+                (event_tag,)
+            )
+            version = (row['faces'], row['newest'])
+        self._db_versions.put(event_tag, version)
+        return version
+
+    def get(self, key: Tuple, generation: Optional[Tuple]) -> Optional[List[SearchResult]]:
+        """Cached results for key, or None on a miss or an entry from another generation"""
+        entry = self._cache.get(key, _NOT_CACHED)
+        if entry is _NOT_CACHED:
+            return None
+        entry_generation, results = entry
+        if entry_generation != generation:
+            self.stale += 1
+            return None
+        return list(results)
+
+    def put(self, key: Tuple, generation: Optional[Tuple], results: List[SearchResult]):
+        """
+        Store results computed at generation
+
+        Take generation before running the search, so results that raced
+        with an ingest are stored already stale.
+        """
+        self._cache.put(key, (generation, list(results)))
+
+    def invalidate(self, event_tags: Iterable[Optional[str]]):
+        """Bump the global generation and those of the given events"""
+        with self._lock:
+            self._generation += 1
+            for event_tag in set(event_tags):
+                if event_tag is not None:
+                    self._event_generations[event_tag] = self._event_generations.get(event_tag, 0) + 1
+
+    def get_stats(self) -> dict:
+        stats = self._cache.get_stats()
+        # The LRU counts a stale entry as a hit; report it as a miss here
+        stats['hits'] -= self.stale
+        stats['misses'] += self.stale
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return {**stats, 'stale': self.stale, 'generation': self._generation}
@@ -1,152 +1,1702 @@
 """Search service for finding similar faces"""
+import asyncio
+import hashlib
 import logging
-from typing import List, Optional
 import time
+from typing import AsyncIterator, List, Optional, Tuple, Union
 
-from ..core.db import get_db
+import numpy as np
+
+from ..core.db import get_async_db, get_db, to_db_embedding, from_db_embedding
 from ..core.config import settings
-from ..services.face_embedder import face_embedder
-from ..services.face_detector import face_detector
+from ..services.face_embedder import face_embedder, embed_image_faces
 from ..services.image_store import image_store
+from ..services.inference_executor import inference_executor
+from ..services.inference_scheduler import inference_scheduler
+from ..services.vector_index import VectorIndex, FlatIndex
+from ..services.hnsw_index import HnswIndex
+from ..services.ivfpq_index import IvfPqIndex
+from ..services.binary_index import BinaryIndex
+from ..services.event_shards import EventFaceCounts, EventShardCache
+from ..services.result_cache import SearchResultCache
+from ..services.search_sessions import SearchSessions
 from ..models.schemas import SearchResult
+from ..utils.lru_cache import LRUCache
+from ..utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Largest hnsw.ef_search pgvector accepts
+PGVECTOR_MAX_EF_SEARCH = 1000
+
+# Returned by the embedding cache on a miss (None is a cached "no face")
+_NOT_CACHED = object()
+
+
+def cached_faces_nbytes(value) -> int:
+    """Approximate memory of an embedding cache entry"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 128
+    if isinstance(value, list):
+        return sum(face['embedding'].nbytes + 256 for face in value) + 64
+    return 64
+
+
+def rerank_rows(
+    rows: List[dict],
+    query_embedding: np.ndarray,
+    top_k: int,
+    threshold: float
+) -> List[dict]:
+    """
+    Exactly re-rank candidate rows by cosine similarity
+    
+    Args:
+        rows: Candidate rows including their 'embedding'
+        query_embedding: Normalized query embedding
+        top_k: Number of rows to keep
+        threshold: Minimum similarity
+        
+    Returns:
+        Up to top_k rows above threshold, best first, with 'distance'
+        replaced by the exact distance
+    """
+    if not rows:
+        return []
+    
+    embeddings = np.stack([from_db_embedding(row['embedding']) for row in rows])
+    similarities = embeddings @ query_embedding
+    
+    if len(rows) > top_k:
+        candidates = np.argpartition(-similarities, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(rows))
+    order = candidates[np.argsort(-similarities[candidates])]
+    
+    reranked = []
+    for idx in order:
+        if similarities[idx] < threshold:
+            break
+        row = rows[idx]
+        row['distance'] = 1 - float(similarities[idx])
+        reranked.append(row)
+    return reranked
+
+
+def is_after(similarity: float, face_id: str, after: Tuple[float, str]) -> bool:
+    """
+    Whether a hit comes after a keyset cursor
+    
+    Results are ordered by similarity (descending), then face id; the
+    cursor is the (similarity, face id) of the last result served.
+    """
+    after_similarity, after_face_id = after
+    return similarity < after_similarity or (similarity == after_similarity and face_id > after_face_id)
+
+
+def row_similarity(row: dict) -> float:
+    """Similarity of a search row, as reported in SearchResult"""
+    return 1 - float(row['distance'])
+
+
+def rows_after(rows: List[dict], after: Tuple[float, str]) -> List[dict]:
+    """Rows (best first) after a keyset cursor, ties ordered by face id"""
+    rows = sorted(rows, key=lambda row: (-row_similarity(row), str(row['face_id'])))
+    return [row for row in rows if is_after(row_similarity(row), str(row['face_id']), after)]
+
+
+def hits_after(
+    face_ids: List[str],
+    similarities: np.ndarray,
+    after: Tuple[float, str]
+) -> Tuple[List[str], np.ndarray]:
+    """Index hits after a keyset cursor, ties ordered by face id"""
+    # Same float path as distance -> SearchResult.similarity
+    scores = [1 - (1 - float(similarity)) for similarity in similarities]
+    order = sorted(range(len(face_ids)), key=lambda i: (-scores[i], face_ids[i]))
+    keep = [i for i in order if is_after(scores[i], face_ids[i], after)]
+    return [face_ids[i] for i in keep], similarities[keep]
+
+
+def best_row_per_photo(rows: List[dict], top_k: int) -> List[dict]:
+    """Keep the first (best) row of each photo from rows sorted best first"""
+    seen = set()
+    best = []
+    for row in rows:
+        if row['photo_id'] in seen:
+            continue
+        seen.add(row['photo_id'])
+        best.append(row)
+        if len(best) == top_k:
+            break
+    return best
+
+
+async def fetch_face_rows_by_id(
+    db,
+    face_ids: List[str],
+    with_embeddings: bool = False
+) -> dict:
+    """
+    Fetch photo + face columns for in-process index hits
+    
+    Fetching by primary key also drops faces deleted by other processes
+    since the index was loaded.
+    
+    Returns:
+        Dict of face id (str) to row
+    """
+    if not face_ids:
+        return {}
+    
+    embedding_column = ", f.embedding" if with_embeddings else ""
+    rows = await db.execute(
+        f"""
+        SELECT 
+            f.id as face_id,
+            p.id as photo_id,
+            p.path,
+            p.width,
+            p.height,
+            p.event_tag,
+            f.x1,
+            f.y1,
+            f.x2,
+            f.y2,
+            f.is_primary
+            {embedding_column}
+        FROM faces f
+        JOIN photos p ON f.photo_id = p.id
+        WHERE f.id = ANY(%s::uuid[])
+        """,
+        (face_ids,)
+    )
+    return {str(row['face_id']): row for row in rows or []}
+
+
+def order_hits(rows_by_id: dict, face_ids: List[str], similarities: np.ndarray) -> List[dict]:
+    """Rows for index hits in hit order, each with its own 'distance'"""
+    ordered = []
+    for face_id, similarity in zip(face_ids, similarities):
+        row = rows_by_id.get(face_id)
+        if row is not None:
+            ordered.append({**row, 'distance': 1 - float(similarity)})
+    return ordered
+
+
+async def fetch_face_rows(
+    db,
+    face_ids: List[str],
+    similarities: np.ndarray,
+    with_embeddings: bool = False
+) -> List[dict]:
+    """
+    Fetch rows for index hits, keeping index order
+    
+    Returns:
+        Rows in the order of face_ids, with 'distance' from the similarities
+    """
+    rows_by_id = await fetch_face_rows_by_id(db, face_ids, with_embeddings)
+    return order_hits(rows_by_id, face_ids, similarities)
+
+
+def threshold_hits(
+    face_ids: List[str],
+    similarities: np.ndarray,
+    threshold: float
+) -> Tuple[List[str], np.ndarray]:
+    """Drop index hits below the similarity threshold"""
+    keep = similarities >= threshold
+    return [face_id for face_id, ok in zip(face_ids, keep) if ok], similarities[keep]
+
+
+class PgVectorBackend:
+    """Search backend running the similarity query in Postgres (pgvector)"""
+    
+    name = "pgvector"
+    
+    def __init__(self):
+        self.db = get_async_db()
+        # Re-ranked searches whose candidate pool exceeded what HNSW returns
+        self.rerank_pools_clamped = 0
+    
+    async def load(self):
+        """Nothing to load, the index lives in Postgres"""
+    
+    async def save(self):
+        """Nothing to save, the index lives in Postgres"""
+    
+    def add_faces(self, faces: List[dict]):
+        """Faces are already in Postgres once ingested"""
+    
+    def remove_photo(self, photo_id: str):
+        """Deletes are already in Postgres"""
+    
+    def set_event_tag(self, photo_id: str, event_tag: Optional[str]):
+        """Tag changes are already in Postgres"""
+    
+    def get_stats(self) -> dict:
+        return {"backend": self.name, "rerank_pools_clamped": self.rerank_pools_clamped}
+    
+    def build_search_query(
+        self,
+        event_tag: Optional[str] = None,
+        with_embeddings: bool = False,
+        group_by_photo: bool = False,
+        after: bool = False
+    ) -> str:
+        """
+        Build the ANN-first similarity query
+        
+        The inner query is a plain ``ORDER BY distance LIMIT n`` so pgvector's
+        HNSW index can serve it; the threshold is applied to those candidates
+        in the outer query rather than in the inner WHERE, where it would stop
+        the index from being used. The distance is computed once per row and
+        the query vector is a single named (binary) parameter.
+        
+        With group_by_photo, DISTINCT ON keeps each photo's closest candidate
+        face and only the best photos are returned.
+        
+        With after, only rows past a keyset cursor (the similarity and face
+        id of the last result served) are returned, for the next page of a
+        paginated search; for grouped searches the cursor applies to each
+        photo's best face.
+        
+        Args:
+            event_tag: Whether to add the event tag filter
+            with_embeddings: Also return each candidate's stored embedding
+            group_by_photo: Return the best face per photo
+            after: Add the keyset cursor filter
+            
+        Returns:
+            SQL using named parameters embedding, limit, max_distance,
+            (if grouped) photos, (if after) after_similarity and
+            after_face_id, and (if filtered) event_tag
+        """
+        event_filter = "WHERE p.event_tag = %(event_tag)s" if event_tag else ""
+        embedding_column = "f.embedding," if with_embeddings else ""
+        # 1 - distance is computed like SearchResult.similarity, so the
+        # cursor compares equal to the row it came from
+        cursor_filter = """(
+            1 - distance < %(after_similarity)s
+            OR (1 - distance = %(after_similarity)s AND face_id > %(after_face_id)s::uuid)
+        )""" if after else ""
+        
+        # Search across ALL faces in database, not just primary faces
+        candidates = f"""
+            SELECT *
+            FROM (
+                SELECT 
+                    f.id as face_id,
+                    p.id as photo_id,
+                    p.path,
+                    p.width,
+                    p.height,
+                    p.event_tag,
+                    f.x1,
+                    f.y1,
+                    f.x2,
+                    f.y2,
+                    f.is_primary,
+                    {embedding_column}
+                    f.embedding <=> %(embedding)b as distance
+                FROM faces f
+                JOIN photos p ON f.photo_id = p.id
+                {event_filter}
+                ORDER BY distance
+                LIMIT %(limit)s
+            ) candidates
+            WHERE distance <= %(max_distance)s
+        """
+        if not group_by_photo:
+            return candidates + (f"AND {cursor_filter}" if after else "") + """
+            ORDER BY distance, face_id
+        """
+        
+        return f"""
+            SELECT *
+            FROM (
+                SELECT DISTINCT ON (photo_id) *
+                FROM ({candidates}) matches
+                ORDER BY photo_id, distance, face_id
+            ) best
+            {"WHERE " + cursor_filter if after else ""}
+            ORDER BY distance, face_id
+            LIMIT %(photos)s
+        """
+    
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        threshold: float,
+        event_tag: Optional[str] = None,
+        mode: str = "ann",
+        oversample: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filter_plan: Optional[dict] = None,
+        group_by_photo: bool = False,
+        after: Optional[Tuple[float, str]] = None,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Run the similarity query
+        
+        Filtered searches follow filter_plan (see SearchService): "exact"
+        scans the event's faces without the HNSW index; "ann" widens
+        ef_search until the filter leaves enough candidates, falling back to
+        the exact scan at pgvector's ef_search limit.
+        
+        With group_by_photo the query keeps the best face per photo (see
+        build_search_query) from depth * photo_group_oversample candidates,
+        exact scans included, so grouping never sorts every face (depth is
+        bounded by search_max_results). Re-ranked
+        searches group after re-scoring instead. HNSW returns at most
+        PGVECTOR_MAX_EF_SEARCH candidates, so index searches whose pool may
+        run short (grouped, or deeper than that) check for it and fall back
+        to the exact scan (see _pooled_search and _expanding_search); an
+        unfiltered rerank pool above it is clamped with a warning and
+        counted in get_stats.
+        
+        Pages after the first pass the keyset cursor (after) and the number
+        of results already served (offset): the candidate pool grows to
+        cover offset + top_k results and only the rows past the cursor
+        are returned.
+        
+        Returns:
+            Photo + face rows with 'distance', best first
+        """
+        rerank = mode == "rerank"
+        depth = offset + top_k
+        if rerank:
+            limit = depth * (oversample or settings.rerank_oversample)
+        elif group_by_photo:
+            limit = depth * settings.photo_group_oversample
+        else:
+            limit = depth
+        photos = top_k if group_by_photo and not rerank else None
+        # Re-ranked scores differ from the SQL distances, so their cursor is
+        # applied after re-ranking
+        sql_after = None if rerank else after
+        ef_search = ef_search or settings.hnsw_ef_search
+        # Re-ranking applies the threshold itself
+        max_distance = 2.0 if rerank else 1 - threshold
+        
+        if (event_tag is None or filter_plan is None) and (
+            photos or (not rerank and limit > PGVECTOR_MAX_EF_SEARCH)
+        ):
+            rows = await self._pooled_search(
+                query_embedding, event_tag, limit, ef_search, max_distance,
+                photos or top_k, photos=photos, after=sql_after
+            )
+        elif event_tag is None or filter_plan is None:
+            if rerank and limit > PGVECTOR_MAX_EF_SEARCH:
+                # HNSW cannot return more candidates; say so rather than
+                # re-ranking a smaller pool than requested without notice
+                logger.warning(
+                    f"Rerank pool of {limit} candidates (depth {depth} x oversample "
+                    f"{limit // depth}) clamped to {PGVECTOR_MAX_EF_SEARCH}, "
+                    f"effective oversample {PGVECTOR_MAX_EF_SEARCH / depth:.1f}"
+                )
+                self.rerank_pools_clamped += 1
+                limit = PGVECTOR_MAX_EF_SEARCH
+            rows = await self._run_query(
+                query_embedding, event_tag, limit, ef_search, rerank, max_distance,
+                photos=photos, after=sql_after
+            )
+        elif filter_plan['strategy'] == "exact":
+            rows = await self._run_query(
+                query_embedding, event_tag, limit, ef_search, rerank, max_distance,
+                use_index=False, photos=photos, after=sql_after
+            )
+        else:
+            event_faces = filter_plan['event_faces'] - (offset if sql_after else 0)
+            wanted = min(photos or (top_k if sql_after else limit), max(event_faces, 1))
+            rows = await self._expanding_search(
+                query_embedding, event_tag, limit, ef_search, rerank, max_distance, filter_plan,
+                wanted, photos=photos, after=sql_after
+            )
+        
+        if rerank:
+            paged = group_by_photo or after is not None
+            rows = rerank_rows(rows, query_embedding, len(rows) if paged else top_k, threshold)
+            if group_by_photo:
+                rows = best_row_per_photo(rows, len(rows))
+            if after is not None:
+                rows = rows_after(rows, after)
+        return rows[:top_k]
+    
+    async def _pooled_search(
+        self,
+        query_embedding: np.ndarray,
+        event_tag: Optional[str],
+        limit: int,
+        ef_search: int,
+        max_distance: float,
+        wanted: int,
+        photos: Optional[int] = None,
+        after: Optional[Tuple[float, str]] = None
+    ) -> List[dict]:
+        """
+        ANN whose candidate pool may hold fewer than wanted results
+        
+        The index yields at most PGVECTOR_MAX_EF_SEARCH candidates, and
+        grouping leaves one row per photo of them. With the threshold
+        applied afterwards, a short result means the pool ran out unless
+        its last row is already past the threshold (anything missing is
+        further away still); then the exact scan answers instead.
+        """
+        pool = min(limit, PGVECTOR_MAX_EF_SEARCH)
+        rows = await self._run_query(
+            query_embedding, event_tag, pool, ef_search, False, 2.0, photos=photos, after=after
+        )
+        if len(rows) < wanted and (not rows or rows[-1]['distance'] <= max_distance):
+            logger.info(
+                f"ANN pool of {pool} candidates gave {len(rows)}/{wanted} results, "
+                f"falling back to exact scan"
+            )
+            return await self._run_query(
+                query_embedding, event_tag, limit, ef_search, False, max_distance,
+                use_index=False, photos=photos, after=after
+            )
+        return [row for row in rows if row['distance'] <= max_distance]
+    
+    async def _expanding_search(
+        self,
+        query_embedding: np.ndarray,
+        event_tag: str,
+        limit: int,
+        ef_search: int,
+        rerank: bool,
+        max_distance: float,
+        filter_plan: dict,
+        wanted: int,
+        photos: Optional[int] = None,
+        after: Optional[Tuple[float, str]] = None
+    ) -> List[dict]:
+        """
+        Filtered ANN with a growing ef_search
+        
+        The HNSW scan yields ef_search candidates before the event filter,
+        so about limit / selectivity are needed; start there and grow 4x
+        while the filter leaves fewer than wanted rows.
+        """
+        ef = max(ef_search, int(limit / max(filter_plan['selectivity'], 1e-6) * 1.5))
+        while True:
+            ef = min(ef, PGVECTOR_MAX_EF_SEARCH)
+            # Threshold applied afterwards so short results mean "filtered out"
+            rows = await self._run_query(
+                query_embedding, event_tag, limit, ef, rerank, 2.0, photos=photos, after=after
+            )
+            if len(rows) >= wanted:
+                break
+            if ef >= PGVECTOR_MAX_EF_SEARCH:
+                logger.info(
+                    f"Filtered ANN for event_tag={event_tag} found {len(rows)}/{wanted} "
+                    f"at ef_search={ef}, falling back to exact scan"
+                )
+                return await self._run_query(
+                    query_embedding, event_tag, limit, ef, rerank, max_distance,
+                    use_index=False, photos=photos, after=after
+                )
+            ef *= 4
+        
+        return [row for row in rows if row['distance'] <= max_distance]
+    
+    async def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        threshold: float,
+        event_tag: Optional[str] = None,
+        oversample: Optional[int] = None,
+        filter_plan: Optional[dict] = None
+    ) -> List[List[dict]]:
+        """
+        Search several queries with one SQL statement
+        
+        The query vectors are a VALUES list joined LATERAL to the ANN
+        subquery, so each runs its own index scan inside a single round
+        trip. Filtered batches use the filter plan's strategy without the
+        per-query widening of search().
+        
+        Returns:
+            Per query, photo + face rows with 'distance', best first
+        """
+        if len(query_embeddings) == 0:
+            return []
+        
+        ef_search = settings.hnsw_ef_search
+        use_index = True
+        if event_tag is not None and filter_plan is not None:
+            if filter_plan['strategy'] == "exact":
+                use_index = False
+            else:
+                ef_search = int(top_k / max(filter_plan['selectivity'], 1e-6) * 1.5)
+        
+        event_filter = "WHERE p.event_tag = %(event_tag)s" if event_tag else ""
+        values = ", ".join(f"(%(idx{i})s, %(q{i})b)" for i in range(len(query_embeddings)))
+        params = {'limit': top_k, 'max_distance': 1 - threshold, 'event_tag': event_tag}
+        for i, query_embedding in enumerate(query_embeddings):
+            params[f'idx{i}'] = i
+            params[f'q{i}'] = to_db_embedding(query_embedding)
+        
+        query = f"""
+            SELECT q.idx, c.*
+            FROM (VALUES {values}) AS q(idx, embedding)
+            CROSS JOIN LATERAL (
+                SELECT 
+                    f.id as face_id,
+                    p.id as photo_id,
+                    p.path,
+                    p.width,
+                    p.height,
+                    p.event_tag,
+                    f.x1,
+                    f.y1,
+                    f.x2,
+                    f.y2,
+                    f.is_primary,
+                    f.embedding <=> q.embedding as distance
+                FROM faces f
+                JOIN photos p ON f.photo_id = p.id
+                {event_filter}
+                ORDER BY distance
+                LIMIT %(limit)s
+            ) c
+            WHERE c.distance <= %(max_distance)s
+            ORDER BY q.idx, c.distance
+        """
+        
+        async with self.db.get_cursor() as cur:
+            if use_index:
+                await cur.execute(
+                    "SELECT set_config('hnsw.ef_search', %s, true)",
+                    (str(min(max(ef_search, top_k), PGVECTOR_MAX_EF_SEARCH)),)
+                )
+            else:
+                await cur.execute("SET LOCAL enable_indexscan = off")
+            await cur.execute(query, params)
+            rows = await cur.fetchall()
+        
+        results: List[List[dict]] = [[] for _ in query_embeddings]
+        for row in rows:
+            results[row.pop('idx')].append(row)
+        return results
+    
+    async def _run_query(
+        self,
+        query_embedding: np.ndarray,
+        event_tag: Optional[str],
+        limit: int,
+        ef_search: int,
+        with_embeddings: bool,
+        max_distance: float,
+        use_index: bool = True,
+        photos: Optional[int] = None,
+        after: Optional[Tuple[float, str]] = None
+    ) -> List[dict]:
+        """Run one similarity query"""
+        query = self.build_search_query(
+            event_tag,
+            with_embeddings=with_embeddings,
+            group_by_photo=photos is not None,
+            after=after is not None
+        )
+        params = {
+            'embedding': to_db_embedding(query_embedding),
+            'limit': limit,
+            'max_distance': max_distance,
+            'event_tag': event_tag,
+            'photos': photos,
+            'after_similarity': after[0] if after else None,
+            'after_face_id': after[1] if after else None
+        }
+        
+        async with self.db.get_cursor() as cur:
+            if use_index:
+                # The index can only return ef_search candidates per scan
+                await cur.execute(
+                    "SELECT set_config('hnsw.ef_search', %s, true)",
+                    (str(min(max(ef_search, limit), PGVECTOR_MAX_EF_SEARCH)),)
+                )
+            else:
+                # Exact scan of the filtered rows: no (HNSW) index scans;
+                # bitmap scans on an event_tag index stay available
+                await cur.execute("SET LOCAL enable_indexscan = off")
+            await cur.execute(query, params)
+            return await cur.fetchall()
+
+
+class InProcessBackend:
+    """
+    Search backend answering from an in-process VectorIndex
+    
+    The index returns face ids and scores; photo and bbox columns are then
+    fetched from Postgres by primary key, which also drops faces deleted by
+    other processes since the index was synced. Approximate indexes (and
+    mode=rerank) fetch an oversampled candidate set and re-rank it exactly
+    against the stored embeddings.
+    """
+
+    compact_dead_fraction = 0.1  # Tombstoned share of rows that triggers compaction on save
+
+    def __init__(self, index: VectorIndex):
+        self.index = index
+        self.name = index.kind
+        self.db = get_async_db()
+        # Only the process that loaded the index maintains it; other users of
+        # the services (e.g. scripts) must not write over its snapshot
+        self.loaded = False
+    
+    async def load(self):
+        """Load the snapshot (or build from Postgres) and catch up on new faces"""
+        await asyncio.to_thread(self._load)
+    
+    def _load(self):
+        if not self.index.load():
+            logger.info(f"No {self.name} index snapshot, building from Postgres")
+        if not self.index.trained:
+            # Training on a large sample takes minutes; never block startup on it
+            logger.error(
+                f"No trained {self.name} index snapshot; falling back to the exact numpy "
+                f"index until scripts/train_ivfpq.py has been run with the server stopped"
+            )
+            dtype = np.float16 if settings.embedding_storage == "float16" else np.float32
+            self.index = FlatIndex(self.index.directory, self.index.dim, dtype=dtype)
+            self.name = self.index.kind
+            self.index.load()
+        self.sync_from_db()
+        self.index.save()
+        self.loaded = True
+    
+    def train_from_db(self, sample_size: int) -> bool:
+        """
+        Train the index on a random sample of stored embeddings
+        
+        Only done offline (scripts/train_ivfpq.py); a server starting without
+        a trained snapshot serves from FlatIndex instead of training here.
+        
+        Returns:
+            False (after logging why) if there are too few faces to train on
+        """
+        with get_db().get_cursor() as cur:
+            cur.execute(
+                "SELECT embedding FROM faces ORDER BY random() LIMIT %s",
+                (sample_size,)
+            )
+            rows = cur.fetchall()
+        
+        min_size = getattr(self.index, 'min_train_size', 1)
+        if len(rows) < min_size:
+            logger.error(
+                f"Cannot train the {self.name} index: {len(rows)} faces in the database, "
+                f"at least {min_size} needed (lower IVFPQ_LISTS or ingest more photos)"
+            )
+            return False
+        sample = np.stack([from_db_embedding(row['embedding']) for row in rows])
+        self.index.train(sample)
+        return True
+    
+    def sync_from_db(self, batch_size: int = 10000):
+        """
+        Add faces created since the last sync (all faces on first build)
+        
+        Uses the sync Database because it streams rows in bulk from a worker
+        thread. A one-minute overlap covers transactions that committed after
+        newer ones; faces already indexed are skipped.
+        """
+        query = f"""
+            SELECT f.id as face_id, f.photo_id, p.event_tag, {self.index.db_columns}, f.created_at
+            FROM faces f
+            JOIN photos p ON f.photo_id = p.id
+        """
+        params = None
+        if self.index.synced_at is not None:
+            query += " WHERE f.created_at >= %s - interval '1 minute'"
+            params = (self.index.synced_at,)
+        
+        added = 0
+        batch = []
+        with get_db().get_cursor() as cur:
+            for row in cur.stream(query, params):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    added += self._add_rows(batch)
+                    batch = []
+        if batch:
+            added += self._add_rows(batch)
+        
+        logger.info(f"Synced {self.name} index from Postgres: {added} faces added, {len(self.index)} total")
+    
+    def _add_rows(self, rows: List[dict]) -> int:
+        face_ids = [row['face_id'] for row in rows]
+        new = ~self.index.contains_faces(face_ids)
+        rows = [row for row, is_new in zip(rows, new) if is_new]
+        if rows:
+            self._index_faces(rows)
+        newest = max(row['created_at'] for row in rows) if rows else None
+        if newest and (self.index.synced_at is None or newest > self.index.synced_at):
+            self.index.synced_at = newest
+        return len(rows)
+    
+    async def save(self):
+        if self.loaded:
+            await asyncio.to_thread(self._save)
+    
+    def _save(self):
+        compact = getattr(self.index, 'compact', None)
+        if compact is not None:
+            # Rewriting the matrix is O(n); only worth it once deletes pile up
+            compact(min_dead_fraction=self.compact_dead_fraction)
+        self.index.save()
+    
+    def _index_faces(self, faces: List[dict]):
+        self.index.add_encoded(
+            [face['face_id'] for face in faces],
+            [face['photo_id'] for face in faces],
+            [face['event_tag'] for face in faces],
+            self.index.vectors_from_rows(faces)
+        )
+    
+    def add_faces(self, faces: List[dict]):
+        """Index faces given as dicts with face_id, photo_id, event_tag, embedding"""
+        if self.loaded:
+            self._index_faces(faces)
+    
+    def remove_photo(self, photo_id: str):
+        if self.loaded:
+            self.index.remove_photo(photo_id)
+    
+    def set_event_tag(self, photo_id: str, event_tag: Optional[str]):
+        if self.loaded:
+            self.index.set_event_tag(photo_id, event_tag)
+    
+    def get_stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "faces": len(self.index),
+            "synced_at": self.index.synced_at.isoformat() if self.index.synced_at else None
+        }
+    
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        threshold: float,
+        event_tag: Optional[str] = None,
+        mode: str = "ann",
+        oversample: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filter_plan: Optional[dict] = None,
+        group_by_photo: bool = False,
+        after: Optional[Tuple[float, str]] = None,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Search the in-process index
+        
+        The filter plan's strategy is passed to the index, which scans the
+        event's rows directly for "exact" and widens its ANN search for "ann".
+        
+        With group_by_photo, exact indexes keep the best face per photo among
+        top_k * photo_group_oversample neighbours; approximate ones group
+        their candidates after re-ranking.
+        
+        Pages after the first search offset + top_k results deep and keep
+        the hits past the keyset cursor (after); only those rows are fetched.
+        
+        Returns:
+            Photo + face rows with 'distance', best first
+        """
+        exact = self.index.exact and mode != "rerank"
+        depth = offset + top_k
+        if not exact:
+            k = depth * (oversample or settings.rerank_oversample)
+        elif group_by_photo:
+            k = depth * settings.photo_group_oversample
+        else:
+            k = depth
+        
+        face_ids, similarities = await asyncio.to_thread(
+            self.index.search, query_embedding, k, event_tag,
+            photos=depth if exact and group_by_photo else None,
+            ef_search=ef_search,
+            filter_strategy=filter_plan['strategy'] if filter_plan else None
+        )
+        
+        if exact:
+            face_ids, similarities = threshold_hits(face_ids, similarities, threshold)
+            if after is not None:
+                face_ids, similarities = hits_after(face_ids, similarities, after)
+            face_ids, similarities = face_ids[:top_k], similarities[:top_k]
+        
+        rows = await fetch_face_rows(self.db, face_ids, similarities, with_embeddings=not exact)
+        if not exact:
+            paged = group_by_photo or after is not None
+            rows = rerank_rows(rows, query_embedding, len(rows) if paged else top_k, threshold)
+            if group_by_photo:
+                rows = best_row_per_photo(rows, len(rows))
+            if after is not None:
+                rows = rows_after(rows, after)
+        return rows[:top_k]
+    
+    async def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        threshold: float,
+        event_tag: Optional[str] = None,
+        oversample: Optional[int] = None,
+        filter_plan: Optional[dict] = None
+    ) -> List[List[dict]]:
+        """
+        Search several queries in one index pass and one row fetch
+        
+        Returns:
+            Per query, photo + face rows with 'distance', best first
+        """
+        exact = self.index.exact
+        k = top_k if exact else top_k * (oversample or settings.rerank_oversample)
+        
+        hits = await asyncio.to_thread(
+            self.index.search_batch, query_embeddings, k, event_tag,
+            filter_strategy=filter_plan['strategy'] if filter_plan else None
+        )
+        if exact:
+            hits = [threshold_hits(face_ids, sims, threshold) for face_ids, sims in hits]
+        
+        all_ids = list({face_id for face_ids, _ in hits for face_id in face_ids})
+        rows_by_id = await fetch_face_rows_by_id(self.db, all_ids, with_embeddings=not exact)
+        
+        results = []
+        for query_embedding, (face_ids, similarities) in zip(query_embeddings, hits):
+            rows = order_hits(rows_by_id, face_ids, similarities)
+            if not exact:
+                rows = rerank_rows(rows, query_embedding, top_k, threshold)
+            results.append(rows)
+        return results
+
+
+def create_backend(name: str):
+    """Create the search backend selected in settings"""
+    if name == "pgvector":
+        return PgVectorBackend()
+    if name == "numpy":
+        dtype = np.float16 if settings.embedding_storage == "float16" else np.float32
+        return InProcessBackend(FlatIndex(settings.vector_index_dir, settings.embedding_dim, dtype=dtype))
+    if name == "hnsw":
+        return InProcessBackend(HnswIndex(
+            settings.vector_index_dir,
+            settings.embedding_dim,
+            m=settings.hnsw_m,
+            ef_construction=settings.hnsw_ef_construction,
+            ef_search=settings.hnsw_ef_search
+        ))
+    if name == "ivfpq":
+        return InProcessBackend(IvfPqIndex(
+            settings.vector_index_dir,
+            settings.embedding_dim,
+            n_lists=settings.ivfpq_lists,
+            n_subvectors=settings.ivfpq_subvectors,
+            nprobe=settings.ivfpq_nprobe
+        ))
+    if name == "binary":
+        return InProcessBackend(BinaryIndex(settings.vector_index_dir, settings.embedding_dim))
+    raise ValueError(f"Unknown search backend: {name}")
+
 
 class SearchService:
     """Service for searching similar faces using vector similarity"""
     
     def __init__(self):
-        self.db = get_db()
+        self.db = get_async_db()
+        self.backend = create_backend(settings.search_backend)
+        self.event_shards = EventShardCache(
+            settings.embedding_dim,
+            max_events=settings.event_shard_max_events,
+            max_faces=settings.event_shard_max_faces,
+            sync_interval=settings.event_shard_sync_interval,
+            dtype=np.float16 if settings.embedding_storage == "float16" else np.float32
+        )
+        self.event_counts = EventFaceCounts(ttl=settings.filter_stats_ttl)
+        self.embedding_cache = LRUCache(
+            max_entries=settings.embedding_cache_max_entries,
+            max_bytes=settings.embedding_cache_max_mb * 1024 * 1024,
+            ttl=settings.embedding_cache_ttl,
+            sizeof=cached_faces_nbytes
+        )
+        self.result_cache = SearchResultCache(
+            max_entries=settings.result_cache_max_entries,
+            max_bytes=settings.result_cache_max_mb * 1024 * 1024,
+            ttl=settings.result_cache_ttl,
+            quantum=settings.result_cache_quantum,
+            check_interval=settings.result_cache_check_interval
+        )
+        self.search_flights = SingleFlight()
+        self.search_sessions = SearchSessions(
+            max_sessions=settings.search_session_max,
+            ttl=settings.search_session_ttl,
+            secret=settings.search_token_secret
+        )
     
-    def search_similar_faces(
+    async def load_backend(self):
+        """Load the search backend's index at startup"""
+        await self.backend.load()
+        logger.info(f"Search backend ready: {self.backend.get_stats()}")
+    
+    async def save_backend(self):
+        """Snapshot the search backend's index at shutdown"""
+        await self.backend.save()
+    
+    def get_stats(self) -> dict:
+        """Search backend, event shard and cache statistics"""
+        return {
+            **self.backend.get_stats(),
+            "event_shards": self.event_shards.get_stats(),
+            "embedding_cache": self.embedding_cache.get_stats(),
+            "result_cache": self.result_cache.get_stats(),
+            "coalescing": self.search_flights.get_stats(),
+            "search_sessions": self.search_sessions.get_stats()
+        }
+    
+    async def preload_event(self, event_tag: str) -> dict:
+        """Load an event's shard ahead of its searches (e.g. before race day)"""
+        return await self.event_shards.preload(event_tag)
+    
+    def on_faces_added(self, faces: List[dict]):
+        """
+        Keep in-process indexes in sync with ingest
+        
+        Args:
+            faces: Dicts with face_id, photo_id, event_tag and embedding
+        """
+        self.backend.add_faces(faces)
+        self.event_shards.add_faces(faces)
+        self.event_counts.add_faces(faces)
+        self.result_cache.invalidate(face['event_tag'] for face in faces)
+    
+    def on_photo_deleted(self, photo_id: str, event_tag: Optional[str] = None):
+        """Keep in-process indexes in sync with photo deletes"""
+        self.backend.remove_photo(photo_id)
+        self.event_shards.remove_photo(photo_id)
+        self.event_counts.invalidate([event_tag])
+        self.result_cache.invalidate([event_tag])
+    
+    def on_event_tag_changed(
         self,
-        query_embedding: List[float],
+        photo_id: str,
+        event_tag: Optional[str],
+        old_event_tag: Optional[str] = None
+    ):
+        """Keep in-process indexes in sync with event tag edits"""
+        self.backend.set_event_tag(photo_id, event_tag)
+        self.event_shards.move_photo(photo_id, event_tag)
+        self.event_counts.invalidate([event_tag, old_event_tag])
+        self.result_cache.invalidate([event_tag, old_event_tag])
+    
+    async def search_similar_faces(
+        self,
+        query_embedding: np.ndarray,
         top_k: int = 30,
         threshold: float = 0.6,
-        event_tag: Optional[str] = None
+        event_tag: Optional[str] = None,
+        mode: str = "ann",
+        oversample: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        group_by_photo: bool = False,
+        after: Optional[Tuple[float, str]] = None,
+        offset: int = 0
     ) -> List[SearchResult]:
         """
         Search for similar faces using cosine similarity
         
+        Modes:
+            ann: top_k nearest from the index, threshold applied to them
+            rerank: top_k * oversample candidates from the index, re-ranked
+                exactly in NumPy against their stored embeddings
+        
+        Searches with an event tag first pick a strategy from the event's
+        share of all faces (see _plan_filter): small events are scanned
+        exactly (from their in-memory shard when event shards are enabled),
+        large ones use a filtered ANN search that widens until the filter
+        leaves enough candidates.
+        
+        With group_by_photo only the best-matching face of each photo is
+        returned, so top_k counts photos; the grouping runs in the SQL query
+        or the index rather than on a large result set.
+        
+        Later pages of a paginated search pass the keyset cursor (after) and
+        the number of results already served (offset); see search_next_page.
+        
+        Results are cached per (quantized embedding, event tag, parameters)
+        until an ingest, delete or retag touches the event (seen within
+        result_cache_check_interval seconds when another process made it).
+        
         Args:
             query_embedding: Query face embedding vector
             top_k: Maximum number of results to return
             threshold: Minimum similarity threshold (0 to 1)
             event_tag: Optional filter by event tag
+            mode: "ann" or "rerank"
+            oversample: Candidate multiplier for rerank mode
+            ef_search: HNSW search breadth for this query
+            group_by_photo: Return the best face per photo
+            after: (similarity, face id) of the last result already served
+            offset: Number of results already served
             
         Returns:
             List of SearchResult objects sorted by similarity (descending)
         """
-        # Build query with optional event_tag filter
-        # Search across ALL faces in database, not just primary faces
-        query = """
-            SELECT 
-                p.id as photo_id,
-                p.path,
-                p.width,
-                p.height,
-                p.event_tag,
-                f.x1,
-                f.y1,
-                f.x2,
-                f.y2,
-                f.is_primary,
-                1 - (f.embedding <=> %s::vector) as similarity
-            FROM faces f
-            JOIN photos p ON f.photo_id = p.id
-            WHERE 1=1
-        """
+        if mode not in ("ann", "rerank"):
+            raise ValueError(f"Unknown search mode: {mode}")
         
-        params = [query_embedding]
-        
-        if event_tag:
-            query += " AND p.event_tag = %s"
-            params.append(event_tag)
-        
-        # Apply similarity threshold
-        query += " AND (1 - (f.embedding <=> %s::vector)) >= %s"
-        params.extend([query_embedding, threshold])
-        
-        # Order by similarity and limit
-        query += " ORDER BY f.embedding <=> %s::vector LIMIT %s"
-        params.extend([query_embedding, top_k])
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        cache_key = self.result_cache.key(
+            query_embedding,
+            event_tag,
+            top_k=top_k,
+            threshold=threshold,
+            mode=mode,
+            oversample=oversample,
+            ef_search=ef_search,
+            group_by_photo=group_by_photo,
+            after=after,
+            offset=offset
+        )
+        generation = await self.result_cache.generation(event_tag)
+        cached = self.result_cache.get(cache_key, generation)
+        if cached is not None:
+            logger.info(f"Found {len(cached)} similar faces (result cache)")
+            return cached
         
         try:
-            results = self.db.execute(query, tuple(params))
+            filter_plan = await self._plan_filter(event_tag) if event_tag is not None else None
             
-            search_results = []
-            for row in results:
-                image_url = image_store.get_image_url(row['path'])
-                search_results.append(
-                    SearchResult(
-                        photo_id=str(row['photo_id']),
-                        image_url=image_url,
-                        similarity=float(row['similarity']),
-                        event_tag=row['event_tag'],
-                        width=row['width'],
-                        height=row['height'],
-                        face_bbox={
-                            'x1': row['x1'],
-                            'y1': row['y1'],
-                            'x2': row['x2'],
-                            'y2': row['y2']
-                        },
-                        is_primary=row['is_primary']
-                    )
+            if self._use_event_shard(filter_plan):
+                source = "event_shard"
+                rows = await self._search_event_shard(
+                    query_embedding, top_k, threshold, event_tag, group_by_photo, after, offset
+                )
+            else:
+                source = self.backend.name
+                rows = await self.backend.search(
+                    query_embedding,
+                    top_k=top_k,
+                    threshold=threshold,
+                    event_tag=event_tag,
+                    mode=mode,
+                    oversample=oversample,
+                    ef_search=ef_search,
+                    filter_plan=filter_plan,
+                    group_by_photo=group_by_photo,
+                    after=after,
+                    offset=offset
                 )
             
-            logger.info(f"Found {len(search_results)} similar faces")
+            search_results = [self._row_to_result(row) for row in rows]
+            
+            logger.info(
+                f"Found {len(search_results)} similar faces "
+                f"(backend={source}, mode={mode}, group_by_photo={group_by_photo})"
+            )
+            self.result_cache.put(cache_key, generation, search_results)
             return search_results
             
         except Exception as e:
             logger.error(f"Search failed: {e}")
             raise
     
-    def search_by_image(
+    async def _plan_filter(self, event_tag: str) -> dict:
+        """
+        Choose how to run an event-filtered search
+        
+        Events up to filter_exact_max_faces faces are scanned exactly: that
+        costs one small matrix product, while a graph walk would discard
+        most candidates. Larger events use ANN with the filter applied
+        during the search.
+        
+        Returns:
+            Dict with strategy ("exact" or "ann"), event_faces and selectivity
+        """
+        event_faces, total_faces = await self.event_counts.get(event_tag)
+        selectivity = event_faces / total_faces if total_faces else 0.0
+        strategy = "exact" if event_faces <= settings.filter_exact_max_faces else "ann"
+        
+        logger.info(
+            f"Filtered search event_tag={event_tag}: {event_faces}/{total_faces} faces "
+            f"(selectivity {selectivity:.4f}) -> {strategy}"
+        )
+        return {'strategy': strategy, 'event_faces': event_faces, 'selectivity': selectivity}
+    
+    def _use_event_shard(self, filter_plan: Optional[dict]) -> bool:
+        """Whether an event-filtered search runs on the event's shard"""
+        return (
+            filter_plan is not None
+            and filter_plan['strategy'] == "exact"
+            and self.event_shards.fits(filter_plan['event_faces'])
+        )
+    
+    async def _search_event_shard(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        threshold: float,
+        event_tag: str,
+        group_by_photo: bool = False,
+        after: Optional[Tuple[float, str]] = None,
+        offset: int = 0
+    ) -> List[dict]:
+        """Exact search within one event's shard"""
+        face_ids, similarities = await self.event_shards.search(
+            query_embedding, offset + top_k, event_tag, group_by_photo
+        )
+        face_ids, similarities = threshold_hits(face_ids, similarities, threshold)
+        if after is not None:
+            face_ids, similarities = hits_after(face_ids, similarities, after)
+        rows = await fetch_face_rows(self.db, face_ids[:top_k], similarities[:top_k])
+        # Photos retagged by another process may linger in the shard
+        return [row for row in rows if row['event_tag'] == event_tag]
+    
+    def _row_to_result(self, row: dict) -> SearchResult:
+        """Convert a search row (photo + face columns, distance) to a SearchResult"""
+        return SearchResult(
+            photo_id=str(row['photo_id']),
+            face_id=str(row['face_id']),
+            image_url=image_store.get_image_url(row['path']),
+            similarity=row_similarity(row),
+            event_tag=row['event_tag'],
+            width=row['width'],
+            height=row['height'],
+            face_bbox={
+                'x1': row['x1'],
+                'y1': row['y1'],
+                'x2': row['x2'],
+                'y2': row['y2']
+            },
+            is_primary=row['is_primary']
+        )
+    
+    async def search_by_image(
         self,
         image_data: bytes,
         top_k: int = 30,
         threshold: float = 0.6,
-        event_tag: Optional[str] = None
-    ) -> tuple[List[SearchResult], float]:
+        event_tag: Optional[str] = None,
+        mode: str = "ann",
+        oversample: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        group_by_photo: bool = False
+    ) -> tuple[List[SearchResult], dict, bool, Optional[str]]:
         """
         Search for similar faces by uploading a query image
         
+        Decoding, detection and embedding run in the inference executor
+        (micro-batched with concurrent queries) so the event loop stays free
+        while the models are busy. A repeated upload of the same bytes
+        reuses the cached embedding and skips inference, and identical
+        concurrent searches (same bytes and parameters) share one run.
+        
         Args:
             image_data: Raw image bytes
             top_k: Maximum number of results
             threshold: Minimum similarity threshold
             event_tag: Optional filter by event tag
+            mode: Search mode, see search_similar_faces
+            oversample: Candidate multiplier for rerank mode
+            ef_search: HNSW search breadth for this query
+            group_by_photo: Return the best face per photo
             
         Returns:
-            Tuple of (search results, query time in ms, face detected flag)
+            Tuple of (search results, timings in ms, face detected flag,
+            next page token or None). Timings has query_time_ms,
+            queue_time_ms and inference_time_ms.
         """
-        from ..utils.image_io import load_image_from_bytes
-        
-        start_time = time.time()
-        
-        # Load image
-        image, _, _ = load_image_from_bytes(image_data)
+        image_hash = hashlib.sha1(image_data).hexdigest()
+        flight_key = (image_hash, top_k, threshold, event_tag, mode, oversample, ef_search, group_by_photo)
+        results, timings, embedding = await self.search_flights.do(
+            flight_key,
+            lambda: self._search_by_image(
+                image_data, image_hash, top_k, threshold, event_tag, mode, oversample, ef_search,
+                group_by_photo
+            )
+        )
+        if embedding is None:
+            return [], dict(timings), False, None
         
-        # Detect face and get embedding
-        embedding = face_embedder.get_embedding(image)
+        next_token = None
+        if self._has_next_page(results, top_k, 0):
+            session_id = self.search_sessions.create(
+                embedding,
+                page_size=top_k,
+                threshold=threshold,
+                event_tag=event_tag,
+                mode=mode,
+                oversample=oversample,
+                ef_search=ef_search,
+                group_by_photo=group_by_photo,
+                results=list(results),
+                exhausted=False,
+                lock=asyncio.Lock()
+            )
+            next_token = self._page_token(session_id, 0, results)
+        return list(results), dict(timings), True, next_token
+    
+    async def _search_by_image(
+        self,
+        image_data: bytes,
+        image_hash: str,
+        top_k: int,
+        threshold: float,
+        event_tag: Optional[str],
+        mode: str,
+        oversample: Optional[int],
+        ef_search: Optional[int],
+        group_by_photo: bool
+    ) -> tuple[List[SearchResult], dict, Optional[np.ndarray]]:
+        """One search_by_image run, shared by coalesced callers"""
+        embedding, queue_ms, inference_ms = await self._embed_image(image_data, image_hash)
         
-        query_time = (time.time() - start_time) * 1000  # Convert to ms
+        timings = {
+            'query_time_ms': queue_ms + inference_ms,
+            'queue_time_ms': queue_ms,
+            'inference_time_ms': inference_ms
+        }
         
         if embedding is None:
             logger.warning("No face detected in query image")
-            return [], query_time, False
+            return [], timings, None
         
         # Search similar faces
-        results = self.search_similar_faces(
-            embedding.tolist(),
+        results = await self.search_similar_faces(
+            embedding,
+            top_k=top_k,
+            threshold=threshold,
+            event_tag=event_tag,
+            mode=mode,
+            oversample=oversample,
+            ef_search=ef_search,
+            group_by_photo=group_by_photo
+        )
+        
+        return results, timings, embedding
+    
+    async def search_next_page(
+        self,
+        token: str,
+        page_size: Optional[int] = None
+    ) -> tuple[List[SearchResult], Optional[str]]:
+        """
+        Next page of a paginated search
+        
+        Pages are served from the session's pool of ranked results. When a
+        page reaches past the pool, the lookup re-runs from the stored query
+        embedding (no upload, no inference) past the pool's last result and
+        at least doubles the pool, so paging through n results costs about
+        log2(n / page_size) lookups rather than one per page. Later pages
+        therefore reflect the data as of the lookup that produced them.
+        
+        Args:
+            token: Page token from the previous page
+            page_size: Results per page (defaults to the first page's top_k)
+            
+        Returns:
+            Tuple of (search results, next page token or None)
+            
+        Raises:
+            InvalidPageToken: If the token is malformed
+            SearchSessionExpired: If the search session is gone
+        """
+        session_id, offset, after = self.search_sessions.decode_token(token)
+        session = self.search_sessions.get(session_id)
+        page_size = page_size or session['page_size']
+        # Don't page past the deepest result set the backends search
+        page_size = min(page_size, settings.search_max_results - offset)
+        if page_size <= 0:
+            return [], None
+        
+        async with session['lock']:
+            await self._extend_session(session_id, session, offset + page_size)
+        results = session['results'][offset:offset + page_size]
+        
+        next_token = None
+        if self._has_next_page(results, page_size, offset):
+            next_token = self._page_token(session_id, offset, results)
+        return results, next_token
+    
+    async def _extend_session(self, session_id: str, session: dict, depth: int):
+        """Grow a session's result pool to depth results (or until exhausted)"""
+        pool = session['results']
+        if session['exhausted'] or len(pool) >= depth:
+            return
+        
+        wanted = min(max(depth, 2 * len(pool)), settings.search_max_results) - len(pool)
+        last = pool[-1]
+        more = await self.search_similar_faces(
+            session['embedding'],
+            top_k=wanted,
+            threshold=session['threshold'],
+            event_tag=session['event_tag'],
+            mode=session['mode'],
+            oversample=session['oversample'],
+            ef_search=session['ef_search'],
+            group_by_photo=session['group_by_photo'],
+            after=(last.similarity, last.face_id),
+            offset=len(pool)
+        )
+        pool.extend(more)
+        session['exhausted'] = len(more) < wanted or len(pool) >= settings.search_max_results
+        self.search_sessions.update(session_id, session)
+    
+    async def embed_query_image(self, image_data: bytes) -> Tuple[Optional[np.ndarray], dict]:
+        """
+        Embed the largest face of a query image (cached by content hash)
+        
+        Returns:
+            Tuple of (embedding or None if no face was detected, timings in
+            ms with query_time_ms, queue_time_ms and inference_time_ms)
+        """
+        embedding, queue_ms, inference_ms = await self._embed_image(image_data)
+        timings = {
+            'query_time_ms': queue_ms + inference_ms,
+            'queue_time_ms': queue_ms,
+            'inference_time_ms': inference_ms
+        }
+        return embedding, timings
+    
+    async def iter_similar_faces(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 30,
+        first_batch: int = 10,
+        threshold: float = 0.6,
+        event_tag: Optional[str] = None,
+        mode: str = "ann",
+        oversample: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        group_by_photo: bool = False
+    ) -> AsyncIterator[List[SearchResult]]:
+        """
+        Search results in batches, best first, for streaming responses
+        
+        The first batch is a small search so it can be sent right away;
+        later batches continue from a keyset cursor (as search_next_page
+        does) and double in size, so top_k results take about
+        log2(top_k / first_batch) lookups.
+        
+        Yields:
+            Lists of SearchResult, up to top_k results in total
+        """
+        served = 0
+        batch_size = first_batch
+        after = None
+        while served < top_k:
+            batch_size = min(batch_size, top_k - served)
+            results = await self.search_similar_faces(
+                query_embedding,
+                top_k=batch_size,
+                threshold=threshold,
+                event_tag=event_tag,
+                mode=mode,
+                oversample=oversample,
+                ef_search=ef_search,
+                group_by_photo=group_by_photo,
+                after=after,
+                offset=served
+            )
+            if results:
+                yield results
+            if len(results) < batch_size:
+                break
+            served += len(results)
+            after = (results[-1].similarity, results[-1].face_id)
+            batch_size *= 2
+    
+    def _has_next_page(self, results: List[SearchResult], page_size: int, offset: int) -> bool:
+        """A full page that stops short of search_max_results may have more"""
+        return len(results) == page_size and offset + len(results) < settings.search_max_results
+    
+    def _page_token(self, session_id: str, offset: int, results: List[SearchResult]) -> str:
+        last = results[-1]
+        return self.search_sessions.encode_token(
+            session_id, offset + len(results), (last.similarity, last.face_id)
+        )
+    
+    async def search_similar_faces_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        event_tag: Optional[str] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Search several query embeddings in one pass
+        
+        The lookups run as one matrix product (in-process indexes and event
+        shards) or one SQL statement (pgvector), and the rows for all hits
+        are fetched together.
+        
+        Args:
+            query_embeddings: (q, dim) normalized query embeddings
+            top_k: Maximum number of results per query
+            threshold: Minimum similarity threshold
+            event_tag: Optional filter by event tag
+            
+        Returns:
+            Per query, SearchResult objects sorted by similarity (descending)
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        if len(query_embeddings) == 0:
+            return []
+        
+        filter_plan = await self._plan_filter(event_tag) if event_tag is not None else None
+        
+        if self._use_event_shard(filter_plan):
+            source = "event_shard"
+            hits = await self.event_shards.search_batch(query_embeddings, top_k, event_tag)
+            hits = [threshold_hits(face_ids, sims, threshold) for face_ids, sims in hits]
+            rows_by_id = await fetch_face_rows_by_id(
+                self.db, list({face_id for face_ids, _ in hits for face_id in face_ids})
+            )
+            # Photos retagged by another process may linger in the shard
+            rows_by_id = {
+                face_id: row for face_id, row in rows_by_id.items() if row['event_tag'] == event_tag
+            }
+            batch_rows = [order_hits(rows_by_id, face_ids, sims) for face_ids, sims in hits]
+        else:
+            source = self.backend.name
+            batch_rows = await self.backend.search_batch(
+                query_embeddings,
+                top_k=top_k,
+                threshold=threshold,
+                event_tag=event_tag,
+                filter_plan=filter_plan
+            )
+        
+        logger.info(f"Batch search of {len(query_embeddings)} queries (backend={source})")
+        return [[self._row_to_result(row) for row in rows] for rows in batch_rows]
+    
+    async def search_by_images(
+        self,
+        images_data: List[bytes],
+        top_k: int = 30,
+        threshold: float = 0.6,
+        event_tag: Optional[str] = None
+    ) -> tuple[List[Union[List[SearchResult], None, Exception]], dict]:
+        """
+        Search with many query images at once
+        
+        All images are embedded as batches in the inference executor, then
+        every detected face is searched in one batch lookup.
+        
+        Args:
+            images_data: List of raw image bytes
+            top_k: Maximum number of results per image
+            threshold: Minimum similarity threshold
+            event_tag: Optional filter by event tag
+            
+        Returns:
+            Tuple of (per image: results, None if no face was detected, or
+            the error decoding it; timings in ms with query_time_ms,
+            queue_time_ms, inference_time_ms and search_time_ms)
+        """
+        embeddings, queue_ms, inference_ms = await self._embed_images(images_data)
+        timings = {
+            'query_time_ms': queue_ms + inference_ms,
+            'queue_time_ms': queue_ms,
+            'inference_time_ms': inference_ms
+        }
+        
+        found = [i for i, embedding in enumerate(embeddings) if isinstance(embedding, np.ndarray)]
+        search_started = time.perf_counter()
+        batch_results = await self.search_similar_faces_batch(
+            np.stack([embeddings[i] for i in found]) if found else np.zeros((0, settings.embedding_dim)),
+            top_k=top_k,
+            threshold=threshold,
+            event_tag=event_tag
+        )
+        timings['search_time_ms'] = (time.perf_counter() - search_started) * 1000
+        
+        results: List[Union[List[SearchResult], None, Exception]] = list(embeddings)
+        for i, image_results in zip(found, batch_results):
+            results[i] = image_results
+        return results, timings
+    
+    async def search_by_image_faces(
+        self,
+        image_data: bytes,
+        max_faces: int = 10,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        event_tag: Optional[str] = None
+    ) -> tuple[List[dict], dict]:
+        """
+        Search for every face in a query image (e.g. a group photo)
+        
+        Up to max_faces faces are detected and embedded in one inference
+        call, then searched together in one batch lookup.
+        
+        Args:
+            image_data: Raw image bytes
+            max_faces: Maximum number of query faces (largest first)
+            top_k: Maximum number of results per face
+            threshold: Minimum similarity threshold
+            event_tag: Optional filter by event tag
+            
+        Returns:
+            Tuple of (per query face: dict with bbox, det_score and results;
+            timings in ms with query_time_ms, queue_time_ms,
+            inference_time_ms and search_time_ms)
+        """
+        faces, queue_ms, inference_ms = await self._embed_image_faces(image_data, max_faces)
+        timings = {
+            'query_time_ms': queue_ms + inference_ms,
+            'queue_time_ms': queue_ms,
+            'inference_time_ms': inference_ms
+        }
+        
+        search_started = time.perf_counter()
+        batch_results = await self.search_similar_faces_batch(
+            np.stack([face['embedding'] for face in faces]) if faces else np.zeros((0, settings.embedding_dim)),
             top_k=top_k,
             threshold=threshold,
             event_tag=event_tag
         )
+        timings['search_time_ms'] = (time.perf_counter() - search_started) * 1000
+        
+        groups = [
+            {'bbox': face['bbox'], 'det_score': face['det_score'], 'results': results}
+            for face, results in zip(faces, batch_results)
+        ]
+        return groups, timings
+    
+    async def search_by_face_id(self, face_id: str, **search_params) -> Optional[Tuple[dict, List[SearchResult]]]:
+        """
+        Search with the stored embedding of an indexed face (no inference)
+        
+        Args:
+            face_id: Query face
+            **search_params: See _search_by_stored_face
+            
+        Returns:
+            Tuple of (query face: face_id and photo_id; results), or None
+            if the face does not exist
+        """
+        query_face = await self.db.execute_one(
+            "SELECT id as face_id, photo_id, embedding FROM faces WHERE id = %s",
+            (face_id,)
+        )
+        if query_face is None:
+            return None
+        return await self._search_by_stored_face(query_face, **search_params)
+    
+    async def search_by_photo_id(self, photo_id: str, **search_params) -> Optional[Tuple[dict, List[SearchResult]]]:
+        """
+        Search with the stored embedding of a photo's primary face (no inference)
+        
+        Falls back to the photo's largest face if none is marked primary.
         
-        return results, query_time, True
+        Args:
+            photo_id: Query photo
+            **search_params: See _search_by_stored_face
+            
+        Returns:
+            Tuple of (query face: face_id and photo_id; results), or None
+            if the photo does not exist or has no faces
+        """
+        query_face = await self.db.execute_one(
+            """
+            SELECT id as face_id, photo_id, embedding
+            FROM faces
+            WHERE photo_id = %s
+            ORDER BY is_primary DESC, (x2 - x1) * (y2 - y1) DESC
+            LIMIT 1
+            """,
+            (photo_id,)
+        )
+        if query_face is None:
+            return None
+        return await self._search_by_stored_face(query_face, **search_params)
+    
+    async def _search_by_stored_face(
+        self,
+        query_face: dict,
+        top_k: int = 30,
+        threshold: float = 0.6,
+        event_tag: Optional[str] = None,
+        mode: str = "ann",
+        oversample: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        group_by_photo: bool = False,
+        exclude_source: bool = True
+    ) -> Tuple[dict, List[SearchResult]]:
+        """
+        One index lookup with a face embedding read from Postgres
+        
+        With exclude_source, results from the query face's own photo are
+        dropped (one extra result is searched for to keep top_k full).
+        """
+        source_photo_id = str(query_face['photo_id'])
+        results = await self.search_similar_faces(
+            from_db_embedding(query_face['embedding']),
+            top_k=top_k + 1 if exclude_source else top_k,
+            threshold=threshold,
+            event_tag=event_tag,
+            mode=mode,
+            oversample=oversample,
+            ef_search=ef_search,
+            group_by_photo=group_by_photo
+        )
+        if exclude_source:
+            results = [result for result in results if result.photo_id != source_photo_id][:top_k]
+        
+        query = {'face_id': str(query_face['face_id']), 'photo_id': source_photo_id}
+        return query, results
+    
+    async def _embed_image(
+        self, image_data: bytes, image_hash: Optional[str] = None
+    ) -> Tuple[Optional[np.ndarray], float, float]:
+        """Embedding of the largest face, from the cache or the inference scheduler"""
+        key = ('face', image_hash or hashlib.sha1(image_data).hexdigest())
+        embedding = self.embedding_cache.get(key, _NOT_CACHED)
+        if embedding is not _NOT_CACHED:
+            return embedding, 0.0, 0.0
+        
+        embedding, queue_ms, inference_ms = await inference_scheduler.submit(image_data)
+        self.embedding_cache.put(key, embedding)
+        return embedding, queue_ms, inference_ms
+    
+    async def _embed_images(
+        self, images_data: List[bytes]
+    ) -> Tuple[List[Union[np.ndarray, None, Exception]], float, float]:
+        """Embeddings for many images; only cache misses go to inference"""
+        keys = [('face', hashlib.sha1(image_data).hexdigest()) for image_data in images_data]
+        embeddings = [self.embedding_cache.get(key, _NOT_CACHED) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is _NOT_CACHED]
+        if not missing:
+            return embeddings, 0.0, 0.0
+        
+        computed, queue_ms, inference_ms = await inference_scheduler.submit_many(
+            [images_data[i] for i in missing]
+        )
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+            if not isinstance(embedding, Exception):
+                self.embedding_cache.put(keys[i], embedding)
+        return embeddings, queue_ms, inference_ms
+    
+    async def _embed_image_faces(self, image_data: bytes, max_faces: int) -> Tuple[List[dict], float, float]:
+        """Every face (up to max_faces) of an image, from the cache or the inference executor"""
+        key = ('faces', hashlib.sha1(image_data).hexdigest(), max_faces)
+        faces = self.embedding_cache.get(key, _NOT_CACHED)
+        if faces is not _NOT_CACHED:
+            return faces, 0.0, 0.0
+        
+        faces, queue_ms, inference_ms = await inference_executor.run(
+            embed_image_faces, image_data, max_faces
+        )
+        self.embedding_cache.put(key, faces)
+        return faces, queue_ms, inference_ms
 
 
 # Global instance
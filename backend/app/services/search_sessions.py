@@ -0,0 +1,108 @@
+"""Server-side search sessions for paginated results"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import math
+import secrets
+import uuid
+from typing import Tuple
+
+import numpy as np
+
+from ..utils.lru_cache import LRUCache
+
+
+class SearchSessionExpired(Exception):
+    """The search session behind a page token is gone (expired or evicted)"""
+
+
+class InvalidPageToken(ValueError):
+    """A page token that does not decode (malformed or tampered with)"""
+
+
+class SearchSessions:
+    """
+    Query embeddings and parameters of recent searches
+
+    The first page of a search stores its session here; each page returns
+    an opaque token holding the session id, the number of results served
+    and the keyset cursor (similarity and face id of the last result), so
+    the next page needs neither the upload nor inference. Tokens are
+    stateless beyond the session, so retrying a "load more" returns the
+    same page. They are HMAC-signed with secret (a random per-process key
+    when empty), so clients cannot forge offsets or cursors.
+
+    Sessions live in this process only: with several workers, "load more"
+    requests must be routed to the worker that served the first page
+    (sticky sessions), otherwise they get SearchSessionExpired.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float, secret: str = ""):
+        self._sessions = LRUCache(
+            max_entries=max_sessions,
+            max_bytes=max_sessions * 4096,
+            ttl=ttl,
+            sizeof=lambda session: session['embedding'].nbytes + 512 * len(session.get('results', ())) + 512
+        )
+        self._secret = secret.encode() if secret else secrets.token_bytes(32)
+
+    def create(self, query_embedding: np.ndarray, **params) -> str:
+        """Store a search; returns its session id"""
+        session_id = secrets.token_urlsafe(12)
+        self._sessions.put(session_id, {'embedding': query_embedding, **params})
+        return session_id
+
+    def update(self, session_id: str, session: dict):
+        """Store a session again after it grew (re-measures its size)"""
+        self._sessions.put(session_id, session)
+
+    def get(self, session_id: str) -> dict:
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise SearchSessionExpired(f"Search session {session_id} expired")
+        return session
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()[:16]
+
+    def encode_token(self, session_id: str, offset: int, after: Tuple[float, str]) -> str:
+        payload = json.dumps({'s': session_id, 'o': offset, 'a': list(after)}, separators=(',', ':')).encode()
+        return '.'.join(
+            base64.urlsafe_b64encode(part).decode().rstrip('=') for part in (payload, self._sign(payload))
+        )
+
+    def decode_token(self, token: str) -> Tuple[str, int, Tuple[float, str]]:
+        """
+        Decode and verify a page token
+
+        Returns:
+            Tuple of (session id, results served, keyset cursor)
+
+        Raises:
+            InvalidPageToken: If the token is malformed, not signed by this
+                server or holds out-of-range values
+        """
+        try:
+            encoded_payload, encoded_signature = token.split('.')
+            payload, signature = (
+                base64.urlsafe_b64decode(part + '=' * (-len(part) % 4))
+                for part in (encoded_payload, encoded_signature)
+            )
+            if not hmac.compare_digest(signature, self._sign(payload)):
+                raise ValueError("bad signature")
+
+            fields = json.loads(payload)
+            session_id, offset, (similarity, face_id) = fields['s'], fields['o'], fields['a']
+            if not isinstance(session_id, str) or type(offset) is not int or offset < 0:
+                raise ValueError("bad session id or offset")
+            similarity = float(similarity)
+            if not math.isfinite(similarity):
+                raise ValueError("non-finite similarity")
+            return session_id, offset, (similarity, str(uuid.UUID(face_id)))
+        except (binascii.Error, UnicodeDecodeError, AttributeError, KeyError, TypeError, ValueError) as e:
+            raise InvalidPageToken(f"Invalid page token: {e}")
+
+    def get_stats(self) -> dict:
+        return self._sessions.get_stats()
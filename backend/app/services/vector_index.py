@@ -0,0 +1,525 @@
+"""In-process face embedding indexes"""
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.db import from_db_embedding
+
+logger = logging.getLogger(__name__)
+
+
+def uuids_to_array(ids: Sequence) -> np.ndarray:
+    """Pack UUIDs (or UUID strings) into an (n, 2) uint64 array"""
+    packed = b''.join(uuid.UUID(str(i)).bytes for i in ids)
+    return np.frombuffer(packed, dtype='>u8').astype(np.uint64).reshape(-1, 2)
+
+
+def array_to_uuids(arr: np.ndarray) -> List[str]:
+    """Unpack an (n, 2) uint64 array into UUID strings"""
+    raw = np.ascontiguousarray(arr, dtype='>u8').tobytes()
+    return [str(uuid.UUID(bytes=raw[i:i + 16])) for i in range(0, len(raw), 16)]
+
+
+class VectorIndex:
+    """
+    Base class for in-process face embedding indexes
+
+    Keeps per-row metadata (face id, photo id, event tag, alive flag) in
+    NumPy arrays so filtering and deletes are vectorized; subclasses own the
+    vector storage and the search itself. Deleted faces are tombstoned and
+    dropped when the index is compacted.
+    """
+
+    kind = "base"
+    exact = True  # Whether search() similarities are exact cosine scores
+    trained = True  # Whether faces can be added (trained indexes override this)
+    db_columns = "f.embedding"  # faces columns the index is built from
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = Path(directory)
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._reset_metadata()
+
+    def _reset_metadata(self):
+        self.synced_at: Optional[datetime] = None  # Newest faces.created_at seen
+        self._count = 0
+        self._face_ids = np.zeros((0, 2), dtype=np.uint64)
+        self._photo_ids = np.zeros((0, 2), dtype=np.uint64)
+        self._event_codes = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._tags: List[str] = []
+        self._tag_codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return int(self._alive[:self._count].sum())
+
+    @property
+    def meta_path(self) -> Path:
+        return self.directory / f"{self.kind}_meta.json"
+
+    @property
+    def arrays_path(self) -> Path:
+        return self.directory / f"{self.kind}_ids.npz"
+
+    # --- metadata -----------------------------------------------------------
+
+    def _tag_code(self, event_tag: Optional[str]) -> int:
+        if event_tag is None:
+            return -1
+        code = self._tag_codes.get(event_tag)
+        if code is None:
+            code = len(self._tags)
+            self._tags.append(event_tag)
+            self._tag_codes[event_tag] = code
+        return code
+
+    def _ensure_capacity(self, needed: int):
+        capacity = len(self._alive)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+
+        def grow(arr: np.ndarray) -> np.ndarray:
+            grown = np.zeros((new_capacity,) + arr.shape[1:], dtype=arr.dtype)
+            grown[:self._count] = arr[:self._count]
+            return grown
+
+        self._face_ids = grow(self._face_ids)
+        self._photo_ids = grow(self._photo_ids)
+        self._event_codes = grow(self._event_codes)
+        self._alive = grow(self._alive)
+        self._grow_vectors(new_capacity)
+
+    def _rows_for_photo(self, photo_id: str) -> np.ndarray:
+        key = uuids_to_array([photo_id])[0]
+        ids = self._photo_ids[:self._count]
+        match = (ids[:, 0] == key[0]) & (ids[:, 1] == key[1]) & self._alive[:self._count]
+        return np.nonzero(match)[0]
+
+    def filter_mask(self, event_tag: Optional[str] = None) -> np.ndarray:
+        """Boolean mask of live rows, optionally restricted to one event"""
+        mask = self._alive[:self._count].copy()
+        if event_tag is not None:
+            code = self._tag_codes.get(event_tag)
+            if code is None:
+                return np.zeros(self._count, dtype=bool)
+            mask &= self._event_codes[:self._count] == code
+        return mask
+
+    def contains_faces(self, face_ids: Sequence) -> np.ndarray:
+        """Boolean array telling which of the given faces are already indexed"""
+        if not len(face_ids):
+            return np.zeros(0, dtype=bool)
+        keys = uuids_to_array(face_ids)
+        existing = self._face_ids[:self._count]
+        hits = np.isin(keys[:, 0], existing[:, 0])
+        # Confirm the (rare) high-word matches on the full id
+        for i in np.nonzero(hits)[0]:
+            hits[i] = bool(np.any(
+                (existing[:, 0] == keys[i, 0]) & (existing[:, 1] == keys[i, 1])
+            ))
+        return hits
+
+    def face_ids_for_rows(self, rows: np.ndarray) -> List[str]:
+        return array_to_uuids(self._face_ids[rows])
+
+    def count_faces(self, event_tag: Optional[str] = None) -> int:
+        """Number of live faces, optionally within one event"""
+        return int(self.filter_mask(event_tag).sum())
+
+    # --- mutations ----------------------------------------------------------
+
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        """Convert (n, dim) normalized embeddings to the stored vector format"""
+        return np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+
+    def vectors_from_rows(self, rows: List[dict]) -> np.ndarray:
+        """Stored vectors for face rows selected with db_columns (or from ingest)"""
+        return self.encode(np.stack([from_db_embedding(row['embedding']) for row in rows]))
+
+    def add(
+        self,
+        face_ids: Sequence,
+        photo_ids: Sequence,
+        event_tags: Sequence[Optional[str]],
+        embeddings: np.ndarray
+    ):
+        """
+        Add faces to the index
+
+        Args:
+            face_ids: Face UUIDs
+            photo_ids: Photo UUID of each face
+            event_tags: Event tag of each face's photo
+            embeddings: (n, dim) normalized embeddings
+        """
+        if len(face_ids):
+            self.add_encoded(face_ids, photo_ids, event_tags, self.encode(embeddings))
+
+    def add_encoded(
+        self,
+        face_ids: Sequence,
+        photo_ids: Sequence,
+        event_tags: Sequence[Optional[str]],
+        vectors: np.ndarray
+    ):
+        """Add faces whose vectors are already in the stored format (see encode)"""
+        n = len(face_ids)
+        if n == 0:
+            return
+
+        with self._lock:
+            start = self._count
+            self._ensure_capacity(start + n)
+            end = start + n
+            self._face_ids[start:end] = uuids_to_array(face_ids)
+            self._photo_ids[start:end] = uuids_to_array(photo_ids)
+            self._event_codes[start:end] = [self._tag_code(t) for t in event_tags]
+            self._alive[start:end] = True
+            self._add_vectors(start, vectors)
+            self._count = end
+
+    def remove_photo(self, photo_id: str) -> int:
+        """Tombstone every face of a photo; returns the number removed"""
+        with self._lock:
+            rows = self._rows_for_photo(photo_id)
+            self._alive[rows] = False
+            self._remove_rows(rows)
+            return len(rows)
+
+    def set_event_tag(self, photo_id: str, event_tag: Optional[str]) -> int:
+        """Move every face of a photo to another event"""
+        with self._lock:
+            rows = self._rows_for_photo(photo_id)
+            self._event_codes[rows] = self._tag_code(event_tag)
+            return len(rows)
+
+    # --- search -------------------------------------------------------------
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        event_tag: Optional[str] = None,
+        photos: Optional[int] = None,
+        **options
+    ) -> Tuple[List[str], np.ndarray]:
+        """
+        Find the k most similar faces
+
+        Args:
+            query: Normalized query embedding
+            k: Number of neighbours
+            event_tag: Only consider faces of this event
+            photos: If set, keep only the best face of each photo among the
+                k neighbours and return at most this many
+            **options: Engine-specific search options
+
+        Returns:
+            Tuple of (face ids, cosine similarities), best first
+        """
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            rows, similarities = self._search(query, k, event_tag, **options)
+            if photos is not None:
+                rows, similarities = best_per_photo(similarities, rows, self._photo_ids[rows], photos)
+            return self.face_ids_for_rows(rows), similarities
+
+    def search_batch(
+        self,
+        queries: np.ndarray,
+        k: int,
+        event_tag: Optional[str] = None,
+        **options
+    ) -> List[Tuple[List[str], np.ndarray]]:
+        """
+        Find the k most similar faces for each of several queries
+
+        Args:
+            queries: (q, dim) normalized query embeddings
+            k: Number of neighbours per query
+            event_tag: Only consider faces of this event
+            **options: Engine-specific search options
+
+        Returns:
+            Per query, a tuple of (face ids, cosine similarities), best first
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            results = self._search_batch(queries, k, event_tag, **options)
+            return [(self.face_ids_for_rows(rows), similarities) for rows, similarities in results]
+
+    # --- persistence --------------------------------------------------------
+
+    def save(self):
+        """Write the index snapshot to disk"""
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._save_vectors()
+
+            n = self._count
+            tmp_arrays = self.arrays_path.with_suffix('.tmp.npz')
+            np.savez(
+                tmp_arrays,
+                face_ids=self._face_ids[:n],
+                photo_ids=self._photo_ids[:n],
+                event_codes=self._event_codes[:n],
+                alive=self._alive[:n]
+            )
+            os.replace(tmp_arrays, self.arrays_path)
+
+            meta = {
+                'kind': self.kind,
+                'dim': self.dim,
+                'count': n,
+                'tags': self._tags,
+                'synced_at': self.synced_at.isoformat() if self.synced_at else None,
+                **self._extra_meta()
+            }
+            tmp_meta = self.meta_path.with_suffix('.tmp')
+            tmp_meta.write_text(json.dumps(meta))
+            os.replace(tmp_meta, self.meta_path)
+            logger.info(f"Saved {self.kind} index snapshot: {len(self)} faces")
+
+    def load(self) -> bool:
+        """
+        Load the index snapshot from disk
+
+        Returns:
+            True if a compatible snapshot was loaded
+        """
+        if not self.meta_path.exists() or not self.arrays_path.exists():
+            return False
+
+        with self._lock:
+            try:
+                meta = json.loads(self.meta_path.read_text())
+                if meta.get('kind') != self.kind or meta.get('dim') != self.dim:
+                    logger.warning(f"Ignoring incompatible {self.kind} index snapshot")
+                    return False
+
+                arrays = np.load(self.arrays_path)
+                self._face_ids = arrays['face_ids']
+                self._photo_ids = arrays['photo_ids']
+                self._event_codes = arrays['event_codes']
+                self._alive = arrays['alive']
+                self._count = int(meta['count'])
+                self._tags = list(meta['tags'])
+                self._tag_codes = {tag: i for i, tag in enumerate(self._tags)}
+                synced_at = meta.get('synced_at')
+                self.synced_at = datetime.fromisoformat(synced_at) if synced_at else None
+                self._load_vectors(meta)
+            except Exception as e:
+                logger.error(f"Failed to load {self.kind} index snapshot: {e}")
+                # Don't keep ids for vectors that were not loaded
+                self._reset_metadata()
+                return False
+
+        logger.info(f"Loaded {self.kind} index snapshot: {len(self)} faces")
+        return True
+
+    # --- engine hooks -------------------------------------------------------
+
+    def _grow_vectors(self, capacity: int):
+        raise NotImplementedError
+
+    def _add_vectors(self, start: int, vectors: np.ndarray):
+        raise NotImplementedError
+
+    def _remove_rows(self, rows: np.ndarray):
+        """Engine hook for deletes (metadata is already tombstoned)"""
+
+    def _search(
+        self, query: np.ndarray, k: int, event_tag: Optional[str], **options
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def _search_batch(
+        self, queries: np.ndarray, k: int, event_tag: Optional[str], **options
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Engine hook for batch search; defaults to one _search per query"""
+        return [self._search(query, k, event_tag, **options) for query in queries]
+
+    def _save_vectors(self):
+        raise NotImplementedError
+
+    def _load_vectors(self, meta: dict):
+        raise NotImplementedError
+
+    def _extra_meta(self) -> dict:
+        return {}
+
+
+def top_k_rows(similarities: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Pick the k best rows by similarity (argpartition, then sort the k)"""
+    if len(rows) == 0:
+        return rows, similarities
+    if len(rows) > k:
+        best = np.argpartition(-similarities, k - 1)[:k]
+    else:
+        best = np.arange(len(rows))
+    best = best[np.argsort(-similarities[best])]
+    return rows[best], similarities[best]
+
+
+def best_per_photo(
+    similarities: np.ndarray,
+    rows: np.ndarray,
+    photo_keys: np.ndarray,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Keep each photo's best row, then the k best of those
+
+    Args:
+        similarities: Similarity of each row
+        rows: Row numbers
+        photo_keys: Photo of each row, (n,) or (n, m) (e.g. packed UUIDs)
+        k: Number of photos
+
+    Returns:
+        Tuple of (rows, similarities), one row per photo, best first
+    """
+    if len(rows) == 0:
+        return rows, similarities
+    keys = photo_keys.reshape(len(rows), -1)
+    # Photo-major, best similarity first within each photo
+    order = np.lexsort((-similarities, *keys.T[::-1]))
+    sorted_keys = keys[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (sorted_keys[1:] != sorted_keys[:-1]).any(axis=1)
+    best = order[first]
+    return top_k_rows(similarities[best], rows[best], k)
+
+
+class FlatIndex(VectorIndex):
+    """
+    Exact search over a contiguous, memory-mapped embedding matrix
+
+    Rows live in a ``.npy`` file opened with np.memmap, so a restart maps
+    the file instead of re-reading every embedding from Postgres. A search
+    is one BLAS matrix-vector product plus an argpartition top-k.
+
+    With dtype=np.float16 the matrix takes half the memory and I/O. NumPy
+    has no BLAS kernel for float16, so rows are upcast to float32 in blocks
+    of ``block_rows`` for the product.
+    """
+
+    kind = "flat"
+    exact = True
+    block_rows = 65536
+
+    def __init__(self, directory: str, dim: int, dtype=np.float32):
+        super().__init__(directory, dim)
+        self.dtype = np.dtype(dtype)
+        self._vectors = np.zeros((0, dim), dtype=self.dtype)
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / f"{self.kind}_embeddings.npy"
+
+    def _grow_vectors(self, capacity: int):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.vectors_path.with_suffix('.tmp.npy')
+        grown = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=self.dtype, shape=(capacity, self.dim)
+        )
+        grown[:self._count] = self._vectors[:self._count]
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.vectors_path)
+        self._vectors = np.load(self.vectors_path, mmap_mode='r+')
+
+    def _add_vectors(self, start: int, embeddings: np.ndarray):
+        self._vectors[start:start + len(embeddings)] = embeddings
+
+    def vectors_for_rows(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    def _similarities(self, vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return vectors @ query
+        similarities = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), self.block_rows):
+            block = vectors[start:start + self.block_rows].astype(np.float32)
+            similarities[start:start + self.block_rows] = block @ query
+        return similarities
+
+    def _search(
+        self, query: np.ndarray, k: int, event_tag: Optional[str], **options
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if event_tag is None:
+            similarities = self._similarities(self._vectors[:self._count], query)
+            similarities[~self._alive[:self._count]] = -np.inf
+            rows = np.arange(self._count)
+        else:
+            rows = np.nonzero(self.filter_mask(event_tag))[0]
+            similarities = self._similarities(self._vectors[rows], query)
+
+        rows, similarities = top_k_rows(similarities, rows, k)
+        live = np.isfinite(similarities)
+        return rows[live], similarities[live]
+
+    def _search_batch(
+        self, queries: np.ndarray, k: int, event_tag: Optional[str], **options
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # One (rows x queries) product per block of rows, merging each
+        # query's running top-k, so the matrix is read once for the batch
+        mask = self.filter_mask(event_tag)
+        best = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        for start in range(0, self._count, self.block_rows):
+            block_rows = np.nonzero(mask[start:start + self.block_rows])[0]
+            if len(block_rows) == 0:
+                continue
+            vectors = np.asarray(self._vectors[start + block_rows], dtype=np.float32)
+            similarities = vectors @ queries.T
+            block_rows += start
+            for i, (rows, sims) in enumerate(best):
+                top_rows, top_sims = top_k_rows(similarities[:, i], block_rows, k)
+                best[i] = top_k_rows(
+                    np.concatenate([sims, top_sims]), np.concatenate([rows, top_rows]), k
+                )
+        return best
+
+    def _save_vectors(self):
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+
+    def _load_vectors(self, meta: dict):
+        self._vectors = np.load(self.vectors_path, mmap_mode='r+')
+        if self._vectors.dtype != self.dtype:
+            raise ValueError(f"Snapshot dtype {self._vectors.dtype} != {self.dtype}")
+
+    def _extra_meta(self) -> dict:
+        return {'dtype': self.dtype.name}
+
+    def compact(self, min_dead_fraction: float = 0.0):
+        """
+        Drop tombstoned rows and rewrite the matrix
+
+        Args:
+            min_dead_fraction: Skip the rewrite unless at least this fraction
+                of the rows is tombstoned
+        """
+        with self._lock:
+            keep = np.nonzero(self._alive[:self._count])[0]
+            dead = self._count - len(keep)
+            if dead == 0 or dead < min_dead_fraction * self._count:
+                return
+            vectors = np.asarray(self._vectors[keep])
+            self._face_ids = self._face_ids[keep]
+            self._photo_ids = self._photo_ids[keep]
+            self._event_codes = self._event_codes[keep]
+            self._alive = self._alive[keep]
+            self._count = len(keep)
+            self._vectors = vectors
+            self._grow_vectors(max(self._count, 1024))
+            logger.info(f"Compacted {self.kind} index to {self._count} faces")
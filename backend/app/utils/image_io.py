@@ -1,12 +1,16 @@
 import hashlib
+import io
+import zipfile
 from pathlib import Path
 from PIL import Image
 import numpy as np
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp'}
+
 
 def compute_sha1(file_path: str) -> str:
     """Compute SHA1 hash of a file"""
@@ -65,7 +69,7 @@ def get_supported_images(folder_path: str, recursive: bool = True) -> list:
     Returns:
         List of image file paths
     """
-    supported_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp'}
+    supported_extensions = SUPPORTED_EXTENSIONS
     folder = Path(folder_path)
     
     if not folder.exists():
@@ -83,3 +87,61 @@ def get_supported_images(folder_path: str, recursive: bool = True) -> list:
         ]
     
     return sorted(files)
+
+
+def read_zip_images(
+    zip_bytes: bytes,
+    max_images: int,
+    max_image_bytes: int,
+    max_total_bytes: int
+) -> List[Tuple[str, bytes]]:
+    """
+    Read the supported images from a zip archive
+    
+    Uncompressed sizes are checked against the limits before anything is
+    decompressed, so a small archive cannot expand into gigabytes (zip
+    bomb). zipfile never returns more than an entry's declared size and
+    fails the CRC check on a truncated entry, so a forged size is caught.
+    
+    Args:
+        zip_bytes: Raw zip file bytes
+        max_images: Maximum number of images to accept
+        max_image_bytes: Maximum uncompressed size of one image
+        max_total_bytes: Maximum uncompressed size of all images
+        
+    Returns:
+        List of (file name, image bytes), in archive order
+        
+    Raises:
+        ValueError: If the archive is invalid, has too many images or
+            expands beyond the size limits
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(zip_bytes))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Invalid zip archive: {e}")
+    
+    with archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and Path(info.filename).suffix.lower() in SUPPORTED_EXTENSIONS
+        ]
+        if len(entries) > max_images:
+            raise ValueError(f"Archive has {len(entries)} images, the limit is {max_images}")
+        
+        for info in entries:
+            if info.file_size > max_image_bytes:
+                raise ValueError(
+                    f"{info.filename} is {info.file_size} bytes uncompressed, "
+                    f"the limit is {max_image_bytes}"
+                )
+        total_bytes = sum(info.file_size for info in entries)
+        if total_bytes > max_total_bytes:
+            raise ValueError(
+                f"Archive images are {total_bytes} bytes uncompressed, the limit is {max_total_bytes}"
+            )
+        
+        try:
+            return [(info.filename, archive.read(info)) for info in entries]
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, RuntimeError) as e:
+            raise ValueError(f"Invalid zip archive: {e}")
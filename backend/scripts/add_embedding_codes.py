@@ -0,0 +1,71 @@
+"""
+Migration script to add packed binary embedding codes to the faces table.
+This script will:
+1. Add the faces.embedding_code BYTEA column if it does not exist
+2. Backfill it with the packed sign bits of each face embedding, in batches
+
+Run it before setting SEARCH_BACKEND=binary: only then does ingest write
+codes for new faces. The binary search backend also packs codes from the
+embedding for faces this script has not reached yet.
+
+Usage: python scripts/add_embedding_codes.py [batch_size]
+"""
+import logging
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.db import get_db, from_db_embedding
+from app.services.binary_index import binary_codes
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def add_embedding_codes(batch_size: int = 5000):
+    """Add and backfill faces.embedding_code"""
+    db = get_db()
+
+    logger.info("Adding faces.embedding_code column...")
+    with db.get_cursor() as cur:
+        cur.execute("ALTER TABLE faces ADD COLUMN IF NOT EXISTS embedding_code BYTEA")
+
+    total = 0
+    while True:
+        with db.get_cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, embedding
+                FROM faces
+                WHERE embedding_code IS NULL
+                LIMIT %s
+                """,
+                (batch_size,)
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+
+            embeddings = np.stack([from_db_embedding(row['embedding']) for row in rows])
+            codes = binary_codes(embeddings)
+            cur.executemany(
+                "UPDATE faces SET embedding_code = %s WHERE id = %s",
+                [(code.tobytes(), row['id']) for code, row in zip(codes, rows)]
+            )
+
+        total += len(rows)
+        logger.info(f"Backfilled {total} faces")
+
+    logger.info(f"✓ Done: {total} faces backfilled")
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    add_embedding_codes(batch_size)
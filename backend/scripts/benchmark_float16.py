@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark float16 embedding storage against exact float32 search.
+
+Loads face embeddings from Postgres, builds a float32 and a float16
+FlatIndex over them, and searches both with held-out faces as queries.
+Reports recall@k of the float16 results against float32, the similarity
+error, how many results cross the default threshold, memory and latency.
+
+Usage: python scripts/benchmark_float16.py [max_faces] [num_queries] [top_k]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.db import get_db, from_db_embedding
+from app.core.config import settings
+from app.services.vector_index import FlatIndex
+
+
+def load_embeddings(limit: int):
+    """Load up to limit (face id, embedding) pairs"""
+    rows = get_db().execute(
+        "SELECT id, embedding FROM faces ORDER BY random() LIMIT %s",
+        (limit,)
+    )
+    face_ids = [str(row['id']) for row in rows]
+    embeddings = np.stack([from_db_embedding(row['embedding']) for row in rows])
+    return face_ids, embeddings
+
+
+def run_queries(index: FlatIndex, queries: np.ndarray, top_k: int):
+    """Search every query; returns (results, mean ms per query)"""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(index.search(query, top_k))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return results, elapsed_ms / len(queries)
+
+
+def benchmark(max_faces: int, num_queries: int, top_k: int):
+    print(f"Loading up to {max_faces} faces...")
+    face_ids, embeddings = load_embeddings(max_faces + num_queries)
+    if len(face_ids) <= num_queries:
+        print("❌ Not enough faces in the database")
+        return False
+
+    queries = embeddings[:num_queries]
+    face_ids, embeddings = face_ids[num_queries:], embeddings[num_queries:]
+    print(f"Corpus: {len(face_ids)} faces, {num_queries} queries, top_k={top_k}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in (np.float32, np.float16):
+            index = FlatIndex(str(Path(tmp) / np.dtype(dtype).name), settings.embedding_dim, dtype=dtype)
+            index.add(face_ids, face_ids, [None] * len(face_ids), embeddings)
+            results[dtype], ms = run_queries(index, queries, top_k)
+            mb = len(face_ids) * settings.embedding_dim * np.dtype(dtype).itemsize / 1024 / 1024
+            print(f"   {np.dtype(dtype).name}: {mb:.1f} MB vectors, {ms:.2f} ms/query")
+
+    threshold = settings.default_similarity_threshold
+    recalls, errors, flips = [], [], 0
+    for (ids32, sims32), (ids16, sims16) in zip(results[np.float32], results[np.float16]):
+        recalls.append(len(set(ids32) & set(ids16)) / max(len(ids32), 1))
+        by_id = dict(zip(ids16, sims16))
+        errors.extend(abs(by_id[i] - s) for i, s in zip(ids32, sims32) if i in by_id)
+        flips += abs(int((sims32 >= threshold).sum()) - int((sims16 >= threshold).sum()))
+
+    print(f"\nRecall@{top_k} (float16 vs float32): {np.mean(recalls):.4f} (min {np.min(recalls):.4f})")
+    print(f"Similarity error: mean {np.mean(errors):.2e}, max {np.max(errors):.2e}")
+    print(f"Results crossing threshold {threshold}: {flips} over {num_queries} queries")
+    return True
+
+
+if __name__ == "__main__":
+    max_faces = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    top_k = int(sys.argv[3]) if len(sys.argv) > 3 else settings.default_top_k
+    sys.exit(0 if benchmark(max_faces, num_queries, top_k) else 1)
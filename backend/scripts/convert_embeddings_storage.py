@@ -0,0 +1,79 @@
+"""
+Migration script to switch faces.embedding between float32 and float16 storage.
+This script will:
+1. Drop the HNSW index on faces.embedding
+2. Convert the column to halfvec (float16) or vector (float32), rewriting every row
+3. Recreate the HNSW index with the matching operator class
+
+Everything runs in one transaction, so a failure leaves the table unchanged.
+Requires pgvector >= 0.7 on the server for halfvec. Set EMBEDDING_STORAGE to
+the same value before restarting the backend.
+
+Usage: python scripts/convert_embeddings_storage.py float16|float32
+"""
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.db import get_db
+from app.core.config import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+COLUMN_TYPES = {
+    'float16': ('halfvec', 'halfvec_cosine_ops'),
+    'float32': ('vector', 'vector_cosine_ops'),
+}
+
+
+def convert_embeddings(storage: str):
+    """Convert faces.embedding to the given storage type"""
+    column_type, opclass = COLUMN_TYPES[storage]
+    dim = settings.embedding_dim
+    db = get_db()
+
+    start = time.perf_counter()
+    with db.get_cursor() as cur:
+        cur.execute("SELECT pg_total_relation_size('faces') as size")
+        size_before = cur.fetchone()['size']
+
+        logger.info(f"Converting faces.embedding to {column_type}({dim})...")
+        cur.execute("DROP INDEX IF EXISTS idx_faces_embedding_hnsw")
+        cur.execute(
+            f"ALTER TABLE faces ALTER COLUMN embedding TYPE {column_type}({dim}) "
+            f"USING embedding::{column_type}({dim})"
+        )
+
+        logger.info("Rebuilding HNSW index...")
+        cur.execute(
+            f"""
+            CREATE INDEX idx_faces_embedding_hnsw
+            ON faces
+            USING hnsw (embedding {opclass})
+            WITH (m = 16, ef_construction = 64)
+            """
+        )
+
+        cur.execute("SELECT pg_total_relation_size('faces') as size")
+        size_after = cur.fetchone()['size']
+
+    logger.info(
+        f"✓ Done in {time.perf_counter() - start:.1f}s: faces table + indexes "
+        f"{size_before / 1024 / 1024:.1f} MB -> {size_after / 1024 / 1024:.1f} MB"
+    )
+    logger.info(f"Set EMBEDDING_STORAGE={storage} and restart the backend")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in COLUMN_TYPES:
+        print(__doc__)
+        sys.exit(1)
+    convert_embeddings(sys.argv[1])
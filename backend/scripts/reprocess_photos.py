@@ -13,12 +13,13 @@ from pathlib import Path
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.core.db import get_db
+from app.core.db import get_db, to_db_embedding
 from app.core.config import settings
 from app.utils.image_io import load_image
 from app.utils.bbox import normalize_bbox, select_top_n_faces
 from app.services.face_detector import face_detector
 from app.services.face_embedder import face_embedder
+from app.services.binary_index import binary_codes, stores_embedding_codes
 
 logging.basicConfig(
     level=logging.INFO,
@@ -117,19 +118,29 @@ def reprocess_all_photos():
                     # Get normalized bbox
                     x1, y1, x2, y2 = normalize_bbox(face['bbox'])
                     
-                    # Convert embedding to list for pgvector
-                    embedding_list = embedding.tolist()
+                    # Adapt embedding to the faces.embedding type (vector or halfvec)
+                    db_embedding = to_db_embedding(embedding)
                     
                     # First face is primary (largest)
                     is_primary = (face_idx == 0)
                     
-                    db.execute(
-                        """
-                        INSERT INTO faces (photo_id, x1, y1, x2, y2, embedding, is_primary)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """,
-                        (photo_id, x1, y1, x2, y2, embedding_list, is_primary)
-                    )
+                    if stores_embedding_codes():
+                        db.execute(
+                            """
+                            INSERT INTO faces (photo_id, x1, y1, x2, y2, embedding, embedding_code, is_primary)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                            """,
+                            (photo_id, x1, y1, x2, y2, db_embedding,
+                             binary_codes(embedding).tobytes(), is_primary)
+                        )
+                    else:
+                        db.execute(
+                            """
+                            INSERT INTO faces (photo_id, x1, y1, x2, y2, embedding, is_primary)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s)
+                            """,
+                            (photo_id, x1, y1, x2, y2, db_embedding, is_primary)
+                        )
                 
                 stats['total_faces_after'] += len(top_faces)
                 stats['processed'] += 1
@@ -11,7 +11,7 @@ def test_gpu():
     print("GPU Test for PhotoMatch")
     print("=" * 60)
     
-    # Test PyTorch CUDA
+    # Test PyTorch CUDA (optional, the app itself only needs ONNX Runtime)
     print("\n1. Testing PyTorch CUDA...")
     try:
         import torch
@@ -23,18 +23,22 @@ def test_gpu():
             print(f"   GPU memory: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB")
         else:
             print("   ⚠️  WARNING: CUDA not available, will use CPU")
+    except ImportError:
+        print("   ℹ️  PyTorch not installed, skipping")
     except Exception as e:
         print(f"   ❌ Error: {e}")
         return False
     
     # Test ONNX Runtime GPU
     print("\n2. Testing ONNX Runtime GPU...")
+    cuda_available = False
     try:
         import onnxruntime as ort
         print(f"   ONNX Runtime version: {ort.__version__}")
         providers = ort.get_available_providers()
         print(f"   Available providers: {providers}")
-        if 'CUDAExecutionProvider' in providers:
+        cuda_available = 'CUDAExecutionProvider' in providers
+        if cuda_available:
             print("   ✓ CUDAExecutionProvider available")
         else:
             print("   ⚠️  CUDAExecutionProvider not available")
@@ -49,11 +53,11 @@ def test_gpu():
         print("   Loading face detection model...")
         app = FaceAnalysis(
             name='buffalo_l',
-            providers=['CUDAExecutionProvider', 'CPUExecutionProvider'] if torch.cuda.is_available() else ['CPUExecutionProvider'],
+            providers=['CUDAExecutionProvider', 'CPUExecutionProvider'] if cuda_available else ['CPUExecutionProvider'],
             allowed_modules=['detection', 'recognition']
         )
         
-        ctx_id = 0 if torch.cuda.is_available() else -1
+        ctx_id = 0 if cuda_available else -1
         app.prepare(ctx_id=ctx_id, det_size=(640, 640))
         
         device_type = "GPU" if ctx_id >= 0 else "CPU"
@@ -84,7 +88,7 @@ def test_gpu():
         print(f"   - Throughput: {fps:.2f} FPS")
         print(f"   - Total time for {num_iterations} images: {elapsed_time:.2f} seconds")
         
-        if torch.cuda.is_available():
+        if cuda_available:
             print(f"\n   ✓ GPU acceleration is working!")
             print(f"   Expected performance: 15-30 FPS on GPU vs 2-5 FPS on CPU")
         else:
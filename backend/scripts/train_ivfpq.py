@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Train the IVF-PQ index offline and build its snapshot.
+
+Samples IVFPQ_TRAIN_SAMPLE embeddings from the faces table, trains the coarse
+centroids and PQ codebooks, encodes every face and writes the snapshot to
+VECTOR_INDEX_DIR. A server started with SEARCH_BACKEND=ivfpq then loads the
+snapshot and only catches up on faces ingested since.
+
+Run with the server stopped (it snapshots its own index on shutdown).
+
+Usage: python scripts/train_ivfpq.py [sample_size]
+"""
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.search_service import create_backend
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def train_ivfpq(sample_size: int):
+    """Train a fresh IVF-PQ index and index every face"""
+    backend = create_backend("ivfpq")
+    index = backend.index
+
+    start = time.perf_counter()
+    if not backend.train_from_db(sample_size):
+        return False
+    logger.info(f"Trained in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    backend.sync_from_db()
+    index.save()
+    logger.info(f"Encoded {len(index)} faces in {time.perf_counter() - start:.1f}s")
+
+    code_mb = len(index) * index.n_subvectors / 1024 / 1024
+    float_mb = len(index) * settings.embedding_dim * 4 / 1024 / 1024
+    logger.info(f"PQ codes: {code_mb:.1f} MB (float32 embeddings: {float_mb:.1f} MB)")
+    return True
+
+
+if __name__ == "__main__":
+    sample_size = int(sys.argv[1]) if len(sys.argv) > 1 else settings.ivfpq_train_sample
+    sys.exit(0 if train_ivfpq(sample_size) else 1)
@@ -0,0 +1,45 @@
+"""Shared fixtures for the backend tests"""
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from tests.helpers import make_embeddings
+
+
+@pytest.fixture(scope="session")
+def pg_conn():
+    """
+    A connection to DATABASE_URL with pgvector registered
+
+    Tests using it are skipped when no database (or no pgvector) is
+    available. They only create temporary tables.
+    """
+    import psycopg
+    from pgvector.psycopg import register_vector
+    from psycopg.rows import dict_row
+
+    try:
+        conn = psycopg.connect(settings.database_url, connect_timeout=3, row_factory=dict_row)
+    except psycopg.OperationalError as e:
+        pytest.skip(f"No database available: {e}")
+    try:
+        register_vector(conn)
+    except psycopg.ProgrammingError as e:
+        conn.close()
+        pytest.skip(f"pgvector is not installed: {e}")
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def embeddings() -> np.ndarray:
+    """2000 clustered unit vectors of dimension 64"""
+    return make_embeddings(2000, 64)
+
+
+@pytest.fixture(scope="session")
+def queries(embeddings) -> np.ndarray:
+    """Queries near (but not at) indexed vectors"""
+    rng = np.random.default_rng(1)
+    queries = embeddings[:50] + 0.1 * rng.standard_normal((50, embeddings.shape[1])).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
@@ -0,0 +1,27 @@
+"""Test data and exact reference results"""
+import uuid
+
+import numpy as np
+
+
+def make_embeddings(n: int, dim: int, clusters: int = 20, seed: int = 0) -> np.ndarray:
+    """Unit vectors around a few centers, shaped like face embeddings of a few people"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    embeddings = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def make_ids(n: int, seed: int = 0) -> list:
+    """Reproducible UUID strings"""
+    rng = np.random.default_rng(seed)
+    return [str(uuid.UUID(bytes=rng.bytes(16), version=4)) for _ in range(n)]
+
+
+def brute_force_top_k(embeddings: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    """Rows of the exact top-k by inner product"""
+    return np.argsort(-(embeddings @ query), kind="stable")[:k]
+
+
+def recall_at_k(found, expected) -> float:
+    return len(set(found) & set(expected)) / len(expected)
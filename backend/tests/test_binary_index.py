@@ -0,0 +1,105 @@
+"""BinaryIndex codes, recall after re-ranking, tombstones and snapshots"""
+import numpy as np
+import pytest
+
+from app.services.binary_index import BinaryIndex, binary_codes, hamming_distances
+from tests.helpers import brute_force_top_k, make_ids, recall_at_k
+
+
+@pytest.fixture
+def indexed(tmp_path, embeddings):
+    face_ids = make_ids(len(embeddings), seed=3)
+    photo_ids = [face_ids[i - i % 2] for i in range(len(embeddings))]
+    event_tags = ["race" if i % 10 < 3 else "party" for i in range(len(embeddings))]
+    index = BinaryIndex(str(tmp_path), embeddings.shape[1])
+    index.add(face_ids, photo_ids, event_tags, embeddings)
+    return index, face_ids, photo_ids, event_tags
+
+
+def reranked_recall(index, face_ids, embeddings, queries, k=10, oversample=20, rows=None, **options) -> float:
+    """Recall of the Hamming shortlist re-ranked exactly, as SearchService does"""
+    rows = np.arange(len(embeddings)) if rows is None else rows
+    row_of = {face_id: row for row, face_id in enumerate(face_ids)}
+    recalls = []
+    for query in queries:
+        found, _ = index.search(query, k * oversample, **options)
+        candidates = np.array([row_of[face_id] for face_id in found])
+        top = candidates[np.argsort(-(embeddings[candidates] @ query), kind="stable")[:k]]
+        expected = rows[brute_force_top_k(embeddings[rows], query, k)]
+        recalls.append(recall_at_k(top, expected))
+    return float(np.mean(recalls))
+
+
+def test_hamming_distances_match_unpacked_bits(embeddings):
+    codes = binary_codes(embeddings[:100])
+    assert codes.shape == (100, embeddings.shape[1] // 8)
+
+    bits = embeddings[:100] > 0
+    expected = (bits != bits[0]).sum(axis=1)
+    np.testing.assert_array_equal(hamming_distances(codes, codes[0]), expected)
+
+
+def test_binary_rejects_dim_not_multiple_of_8(tmp_path):
+    with pytest.raises(ValueError):
+        BinaryIndex(str(tmp_path), 60)
+
+
+def test_binary_codes_from_rows_match_embeddings(tmp_path, embeddings):
+    index = BinaryIndex(str(tmp_path), embeddings.shape[1])
+    rows = [
+        {'embedding_code': binary_codes(embeddings[0]).tobytes(), 'embedding': None},
+        {'embedding_code': None, 'embedding': embeddings[1]},
+    ]
+    np.testing.assert_array_equal(index.vectors_from_rows(rows), binary_codes(embeddings[:2]))
+
+
+def test_binary_recall_after_rerank(indexed, embeddings, queries):
+    index, face_ids, _, _ = indexed
+    assert reranked_recall(index, face_ids, embeddings, queries) >= 0.9
+
+
+def test_binary_scores_follow_hamming_distance(indexed, queries):
+    index, _, _, _ = indexed
+    _, similarities = index.search(queries[0], 50)
+    assert np.all(np.diff(similarities) <= 0)
+    assert np.all(np.abs(similarities) <= 1)
+
+
+def test_binary_event_filter(indexed, embeddings, queries):
+    index, face_ids, _, event_tags = indexed
+    found, _ = index.search(queries[0], 50, event_tag="race")
+    assert len(found) == 50
+    assert {face_ids.index(face_id) % 10 for face_id in found} <= {0, 1, 2}
+
+    rows = np.nonzero(np.array(event_tags) == "race")[0]
+    assert reranked_recall(index, face_ids, embeddings, queries, rows=rows, event_tag="race") >= 0.9
+
+
+def test_binary_tombstones(indexed, embeddings, queries):
+    index, face_ids, photo_ids, _ = indexed
+    top, _ = index.search(queries[0], 1)
+    photo = photo_ids[face_ids.index(top[0])]
+    assert index.remove_photo(photo) == 2
+    assert len(index) == len(embeddings) - 2
+
+    removed = {face_id for face_id, p in zip(face_ids, photo_ids) if p == photo}
+    found, _ = index.search(queries[0], 200)
+    assert not removed & set(found)
+
+    rows = np.nonzero(np.array([p != photo for p in photo_ids]))[0]
+    assert reranked_recall(index, face_ids, embeddings, queries, rows=rows) >= 0.9
+
+
+def test_binary_snapshot_round_trip(indexed, tmp_path, embeddings, queries):
+    index, _, photo_ids, _ = indexed
+    index.remove_photo(photo_ids[0])
+    index.save()
+
+    loaded = BinaryIndex(str(tmp_path), embeddings.shape[1])
+    assert loaded.load()
+    assert len(loaded) == len(index)
+    for query in queries[:10]:
+        assert loaded.search(query, 10)[0] == index.search(query, 10)[0]
+
+    # Codes of another width are not loaded
+    assert not BinaryIndex(str(tmp_path), embeddings.shape[1] * 2).load()
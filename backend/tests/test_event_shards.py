@@ -0,0 +1,102 @@
+"""EventShard appends, tombstones, dtype and concurrent searches; EventFaceCounts"""
+import threading
+
+import numpy as np
+
+from app.services.event_shards import EventFaceCounts, EventShard
+from tests.helpers import brute_force_top_k, make_ids
+
+
+def test_shard_appends_in_batches_match_exact_search(embeddings, queries):
+    face_ids = make_ids(len(embeddings), seed=4)
+    photo_ids = [face_ids[i - i % 2] for i in range(len(embeddings))]
+    shard = EventShard("race", embeddings.shape[1])
+    for start in range(0, len(embeddings), 300):
+        shard.add(face_ids[start:start + 300], photo_ids[start:start + 300], embeddings[start:start + 300])
+
+    assert len(shard) == len(embeddings)
+    for query in queries[:5]:
+        found, _ = shard.search(query, 10)
+        assert found == [face_ids[row] for row in brute_force_top_k(embeddings, query, 10)]
+
+
+def test_shard_skips_known_faces(embeddings):
+    face_ids = make_ids(10)
+    shard = EventShard("race", embeddings.shape[1])
+    shard.add(face_ids, face_ids, embeddings[:10])
+    shard.add(face_ids[5:] + make_ids(2, seed=5), face_ids[5:] + ["p", "p"], embeddings[5:12])
+    assert len(shard) == 12
+    assert len(shard.face_ids) == 12
+
+
+def test_shard_remove_photo_and_group_by_photo(embeddings, queries):
+    face_ids = make_ids(400, seed=6)
+    photo_ids = [face_ids[i - i % 4] for i in range(400)]
+    shard = EventShard("race", embeddings.shape[1])
+    shard.add(face_ids, photo_ids, embeddings[:400])
+
+    found, similarities = shard.search(queries[0], 20, group_by_photo=True)
+    photos = [photo_ids[face_ids.index(face_id)] for face_id in found]
+    assert len(set(photos)) == len(found) == 20
+    assert np.all(np.diff(similarities) <= 0)
+
+    assert shard.remove_photo(photos[0]) == 4
+    assert shard.remove_photo(photos[0]) == 0
+    assert shard.remove_photo("unknown") == 0
+    assert len(shard) == 396
+    found, _ = shard.search(queries[0], 50)
+    assert not {photo_ids[face_ids.index(face_id)] for face_id in found} & {photos[0]}
+
+
+def test_shard_float16_storage(embeddings, queries):
+    face_ids = make_ids(len(embeddings), seed=7)
+    shard = EventShard("race", embeddings.shape[1], dtype=np.float16)
+    shard.add(face_ids, face_ids, embeddings)
+    assert shard._embeddings.dtype == np.float16
+
+    found, similarities = shard.search(queries[0], 10)
+    expected = brute_force_top_k(embeddings, queries[0], 10)
+    assert len(set(found) & {face_ids[row] for row in expected}) >= 9
+    assert similarities.dtype == np.float32
+
+    batch = shard.search_batch(queries[:3], 10)
+    assert [hits for hits, _ in batch] == [shard.search(query, 10)[0] for query in queries[:3]]
+
+
+def test_shard_search_during_appends_sees_whole_rows(embeddings, queries):
+    face_ids = make_ids(len(embeddings), seed=8)
+    shard = EventShard("race", embeddings.shape[1])
+    errors = []
+
+    def search():
+        while len(shard.face_ids) < len(embeddings):
+            try:
+                found, similarities = shard.search(queries[0], 5)
+                rows = [face_ids.index(face_id) for face_id in found]
+                np.testing.assert_allclose(similarities, embeddings[rows] @ queries[0], atol=1e-5)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    searcher = threading.Thread(target=search)
+    searcher.start()
+    for start in range(0, len(embeddings), 10):
+        shard.add(face_ids[start:start + 10], face_ids[start:start + 10], embeddings[start:start + 10])
+    searcher.join()
+    assert not errors
+
+
+def test_face_counts_from_concurrent_ingest_threads():
+    counts = EventFaceCounts()
+    faces = [{'event_tag': "race" if i % 3 else None} for i in range(300)]
+
+    threads = [threading.Thread(target=counts.add_faces, args=(faces,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts.invalidate(["party"])
+
+    assert counts._total == 8 * 300
+    assert counts._counts == {"race": 8 * 200, None: 8 * 100}
+    assert counts._stale == {"party"}
@@ -0,0 +1,92 @@
+"""HnswIndex recall, filters, tombstones and snapshots"""
+import numpy as np
+import pytest
+
+from app.services.hnsw_index import HnswIndex
+from tests.helpers import brute_force_top_k, make_ids, recall_at_k
+
+pytest.importorskip("hnswlib")
+
+
+@pytest.fixture
+def indexed(tmp_path, embeddings):
+    face_ids = make_ids(len(embeddings), seed=1)
+    photo_ids = [face_ids[i - i % 2] for i in range(len(embeddings))]
+    event_tags = ["race" if i % 10 < 3 else "party" for i in range(len(embeddings))]
+    index = HnswIndex(str(tmp_path), embeddings.shape[1], ef_search=64)
+    index.add(face_ids, photo_ids, event_tags, embeddings)
+    return index, face_ids, photo_ids, event_tags
+
+
+def mean_recall(index, face_ids, embeddings, queries, k=10, rows=None, **options) -> float:
+    rows = np.arange(len(embeddings)) if rows is None else rows
+    recalls = []
+    for query in queries:
+        found, _ = index.search(query, k, **options)
+        expected = rows[brute_force_top_k(embeddings[rows], query, k)]
+        recalls.append(recall_at_k(found, [face_ids[row] for row in expected]))
+    return float(np.mean(recalls))
+
+
+def test_hnsw_recall(indexed, embeddings, queries):
+    index, face_ids, _, _ = indexed
+    assert mean_recall(index, face_ids, embeddings, queries) >= 0.95
+
+
+def test_hnsw_similarities_are_exact(indexed, embeddings, queries):
+    index, face_ids, _, _ = indexed
+    found, similarities = index.search(queries[0], 10)
+    rows = [face_ids.index(face_id) for face_id in found]
+    np.testing.assert_allclose(similarities, embeddings[rows] @ queries[0], atol=1e-5)
+
+
+@pytest.mark.parametrize("filter_strategy", ["exact", "ann"])
+def test_hnsw_event_filter(indexed, embeddings, queries, filter_strategy):
+    index, face_ids, _, event_tags = indexed
+    rows = np.nonzero(np.array(event_tags) == "race")[0]
+    recall = mean_recall(
+        index, face_ids, embeddings, queries, rows=rows,
+        event_tag="race", filter_strategy=filter_strategy
+    )
+    assert recall >= (1.0 if filter_strategy == "exact" else 0.9)
+
+
+def test_hnsw_tombstones(indexed, embeddings, queries):
+    index, face_ids, photo_ids, _ = indexed
+    top, _ = index.search(queries[0], 1)
+    photo = photo_ids[face_ids.index(top[0])]
+    assert index.remove_photo(photo) == 2
+    assert len(index) == len(embeddings) - 2
+
+    removed = {face_id for face_id, p in zip(face_ids, photo_ids) if p == photo}
+    found, _ = index.search(queries[0], 100)
+    assert not removed & set(found)
+
+    alive = np.array([p != photo for p in photo_ids])
+    rows = np.nonzero(alive)[0]
+    assert mean_recall(index, face_ids, embeddings, queries, rows=rows) >= 0.95
+
+
+def test_hnsw_search_with_more_results_than_faces(tmp_path, embeddings):
+    index = HnswIndex(str(tmp_path), embeddings.shape[1])
+    face_ids = make_ids(5)
+    index.add(face_ids, face_ids, [None] * 5, embeddings[:5])
+    found, _ = index.search(embeddings[0], 10)
+    assert sorted(found) == sorted(face_ids)
+
+
+def test_hnsw_snapshot_round_trip(indexed, tmp_path, embeddings, queries):
+    index, face_ids, photo_ids, _ = indexed
+    index.remove_photo(photo_ids[0])
+    index.save()
+
+    loaded = HnswIndex(str(tmp_path), embeddings.shape[1], ef_search=64)
+    assert loaded.load()
+    assert len(loaded) == len(index)
+    for query in queries[:10]:
+        assert loaded.search(query, 10)[0] == index.search(query, 10)[0]
+
+    # Still accepts faces after a load
+    new_ids = make_ids(3, seed=9)
+    loaded.add(new_ids, new_ids, [None] * 3, embeddings[:3])
+    assert loaded.search(embeddings[1], 2)[0][0] in {new_ids[1], face_ids[1]}
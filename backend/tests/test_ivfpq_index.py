@@ -0,0 +1,126 @@
+"""IvfPqIndex training, recall after re-ranking, tombstones and snapshots"""
+import numpy as np
+import pytest
+
+from app.services.ivfpq_index import IvfPqIndex, assign_nearest, kmeans
+from tests.helpers import brute_force_top_k, make_ids, recall_at_k
+
+
+def make_index(directory, dim, **kwargs) -> IvfPqIndex:
+    options = {'n_lists': 16, 'n_subvectors': 16, 'nprobe': 4, **kwargs}
+    return IvfPqIndex(str(directory), dim, **options)
+
+
+@pytest.fixture
+def indexed(tmp_path, embeddings):
+    index = make_index(tmp_path, embeddings.shape[1])
+    index.train(embeddings, iterations=10)
+
+    face_ids = make_ids(len(embeddings), seed=2)
+    photo_ids = [face_ids[i - i % 2] for i in range(len(embeddings))]
+    event_tags = ["race" if i % 10 < 3 else "party" for i in range(len(embeddings))]
+    index.add(face_ids, photo_ids, event_tags, embeddings)
+    return index, face_ids, photo_ids, event_tags
+
+
+def reranked_recall(index, face_ids, embeddings, queries, k=10, oversample=10, rows=None, **options) -> float:
+    """Recall of the ADC shortlist re-ranked exactly, as SearchService does"""
+    rows = np.arange(len(embeddings)) if rows is None else rows
+    row_of = {face_id: row for row, face_id in enumerate(face_ids)}
+    recalls = []
+    for query in queries:
+        found, _ = index.search(query, k * oversample, **options)
+        candidates = np.array([row_of[face_id] for face_id in found])
+        top = candidates[np.argsort(-(embeddings[candidates] @ query), kind="stable")[:k]]
+        expected = rows[brute_force_top_k(embeddings[rows], query, k)]
+        recalls.append(recall_at_k(top, expected))
+    return float(np.mean(recalls))
+
+
+def test_kmeans_recovers_separated_clusters():
+    rng = np.random.default_rng(0)
+    centers = 10 * rng.standard_normal((4, 8)).astype(np.float32)
+    labels = rng.integers(0, 4, 400)
+    data = centers[labels] + 0.1 * rng.standard_normal((400, 8)).astype(np.float32)
+
+    centroids = kmeans(data, 4, iterations=10)
+    assignments = assign_nearest(data, centroids)
+    # Same partition as the true labels, up to renumbering
+    for label in range(4):
+        assert len(np.unique(assignments[labels == label])) == 1
+    np.testing.assert_allclose(
+        np.sort(centroids, axis=0), np.sort(centers, axis=0), atol=0.1
+    )
+
+
+def test_ivfpq_train_requires_enough_vectors(tmp_path, embeddings):
+    index = make_index(tmp_path, embeddings.shape[1], n_lists=512)
+    with pytest.raises(ValueError):
+        index.train(embeddings[:300])
+    assert not index.trained
+
+
+def test_ivfpq_add_requires_training(tmp_path, embeddings):
+    index = make_index(tmp_path, embeddings.shape[1])
+    face_ids = make_ids(3)
+    with pytest.raises(RuntimeError):
+        index.add(face_ids, face_ids, [None] * 3, embeddings[:3])
+
+
+def test_ivfpq_recall_after_rerank(indexed, embeddings, queries):
+    index, face_ids, _, _ = indexed
+    assert reranked_recall(index, face_ids, embeddings, queries) >= 0.9
+
+
+def test_ivfpq_more_probes_find_more(indexed, embeddings, queries):
+    index, face_ids, _, _ = indexed
+    narrow = reranked_recall(index, face_ids, embeddings, queries, nprobe=1)
+    full = reranked_recall(index, face_ids, embeddings, queries, nprobe=index.n_lists)
+    assert full >= narrow
+    assert full >= 0.95
+
+
+@pytest.mark.parametrize("filter_strategy", ["exact", "ann"])
+def test_ivfpq_event_filter(indexed, embeddings, queries, filter_strategy):
+    index, face_ids, _, event_tags = indexed
+    rows = np.nonzero(np.array(event_tags) == "race")[0]
+    found, _ = index.search(queries[0], 50, event_tag="race", filter_strategy=filter_strategy)
+    assert len(found) == 50
+    assert {face_ids.index(face_id) % 10 for face_id in found} <= {0, 1, 2}
+
+    recall = reranked_recall(
+        index, face_ids, embeddings, queries, rows=rows,
+        event_tag="race", filter_strategy=filter_strategy
+    )
+    assert recall >= 0.85
+
+
+def test_ivfpq_tombstones(indexed, embeddings, queries):
+    index, face_ids, photo_ids, _ = indexed
+    top, _ = index.search(queries[0], 1, nprobe=index.n_lists)
+    photo = photo_ids[face_ids.index(top[0])]
+    assert index.remove_photo(photo) == 2
+    assert len(index) == len(embeddings) - 2
+
+    removed = {face_id for face_id, p in zip(face_ids, photo_ids) if p == photo}
+    found, _ = index.search(queries[0], 200, nprobe=index.n_lists)
+    assert not removed & set(found)
+
+    rows = np.nonzero(np.array([p != photo for p in photo_ids]))[0]
+    assert reranked_recall(index, face_ids, embeddings, queries, rows=rows) >= 0.9
+
+
+def test_ivfpq_snapshot_round_trip(indexed, tmp_path, embeddings, queries):
+    index, face_ids, photo_ids, _ = indexed
+    index.remove_photo(photo_ids[0])
+    index.save()
+
+    loaded = make_index(tmp_path, embeddings.shape[1])
+    assert loaded.load()
+    assert loaded.trained
+    assert len(loaded) == len(index)
+    for query in queries[:10]:
+        assert loaded.search(query, 10)[0] == index.search(query, 10)[0]
+
+    # Codes trained with other settings are not loaded
+    assert not make_index(tmp_path, embeddings.shape[1], n_lists=32).load()
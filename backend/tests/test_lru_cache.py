@@ -0,0 +1,92 @@
+"""LRUCache expiry and entry/byte bounds"""
+import pytest
+
+from app.utils import lru_cache
+from app.utils.lru_cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(lru_cache, "time", clock)
+    return clock
+
+
+def test_lru_cache_evicts_least_recently_used_entry():
+    cache = LRUCache(max_entries=2, max_bytes=1000, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_lru_cache_evicts_over_max_bytes():
+    cache = LRUCache(max_entries=10, max_bytes=100, ttl=60, sizeof=len)
+    cache.put("a", "x" * 40)
+    cache.put("b", "x" * 40)
+    cache.put("c", "x" * 40)
+
+    assert len(cache) == 2
+    assert cache.get("a") is None
+    assert cache.get_stats()['memory_mb'] == 80 / 1024 / 1024
+
+    # Replacing a value releases the old size
+    cache.put("b", "x")
+    cache.put("d", "x" * 50)
+    assert len(cache) == 3
+
+
+def test_lru_cache_skips_values_larger_than_max_bytes():
+    cache = LRUCache(max_entries=10, max_bytes=100, ttl=60, sizeof=len)
+    cache.put("a", "x" * 10)
+    cache.put("big", "x" * 101)
+    assert cache.get("big") is None
+    assert cache.get("a") == "x" * 10
+
+
+def test_lru_cache_expires_entries_after_ttl(clock):
+    cache = LRUCache(max_entries=10, max_bytes=1000, ttl=60, sizeof=lambda value: 10)
+    cache.put("a", 1)
+    clock.now += 30
+    cache.put("b", 2)
+
+    clock.now += 31
+    assert cache.get("a", "miss") == "miss"
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+    assert cache.get_stats()['memory_mb'] == 10 / 1024 / 1024
+
+    # A get does not extend the entry's life
+    clock.now += 30
+    assert cache.get("b") is None
+
+
+def test_lru_cache_disabled_and_stats():
+    disabled = LRUCache(max_entries=0, max_bytes=1000, ttl=60)
+    disabled.put("a", 1)
+    assert not disabled.enabled
+    assert disabled.get("a") is None
+
+    cache = LRUCache(max_entries=10, max_bytes=1000, ttl=60)
+    cache.put("a", None)
+    assert cache.get("a", "miss") is None  # None is a cached value, not a miss
+    assert cache.get("b", "miss") == "miss"
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get_stats()['memory_mb'] == 0
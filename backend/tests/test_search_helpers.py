@@ -0,0 +1,93 @@
+"""Re-ranking, grouping and cursor helpers of the search service"""
+import numpy as np
+
+from app.services.search_service import (
+    best_row_per_photo,
+    hits_after,
+    rerank_rows,
+    rows_after,
+    threshold_hits,
+)
+from tests.helpers import brute_force_top_k
+
+
+def make_rows(embeddings: np.ndarray, query: np.ndarray) -> list:
+    """Candidate rows as the pgvector backend returns them, with a noisy distance"""
+    rng = np.random.default_rng(0)
+    noisy = 1 - embeddings @ query + rng.normal(0, 0.05, len(embeddings))
+    return [
+        {
+            'face_id': f"00000000-0000-0000-0000-{i:012d}",
+            'photo_id': f"photo-{i // 3}",
+            'embedding': embedding,
+            'distance': float(distance)
+        }
+        for i, (embedding, distance) in enumerate(zip(embeddings, noisy))
+    ]
+
+
+def test_rerank_rows_restores_exact_order(embeddings, queries):
+    query = queries[0]
+    candidates = embeddings[:300]
+    reranked = rerank_rows(make_rows(candidates, query), query, 10, threshold=-1.0)
+
+    expected = brute_force_top_k(candidates, query, 10)
+    assert [int(row['face_id'][-12:]) for row in reranked] == list(expected)
+    np.testing.assert_allclose(
+        [1 - row['distance'] for row in reranked], candidates[expected] @ query, rtol=1e-5
+    )
+
+
+def test_rerank_rows_applies_threshold(embeddings, queries):
+    query = queries[0]
+    reranked = rerank_rows(make_rows(embeddings[:300], query), query, 300, threshold=0.5)
+    assert reranked
+    assert all(1 - row['distance'] >= 0.5 for row in reranked)
+    assert rerank_rows([], query, 10, 0.5) == []
+
+
+def test_best_row_per_photo_keeps_first_row_of_each_photo():
+    rows = [
+        {'face_id': 'a', 'photo_id': 'p1'},
+        {'face_id': 'b', 'photo_id': 'p2'},
+        {'face_id': 'c', 'photo_id': 'p1'},
+        {'face_id': 'd', 'photo_id': 'p3'},
+    ]
+    assert [row['face_id'] for row in best_row_per_photo(rows, 10)] == ['a', 'b', 'd']
+    assert [row['face_id'] for row in best_row_per_photo(rows, 2)] == ['a', 'b']
+
+
+def test_cursor_pages_cover_every_hit_once():
+    rng = np.random.default_rng(0)
+    # Rounded similarities so ties across page boundaries are common
+    similarities = np.round(rng.random(100), 1).astype(np.float32)
+    face_ids = [f"face-{i:03d}" for i in range(100)]
+    ordered, _ = hits_after(face_ids, similarities, (2.0, ""))
+
+    pages, after = [], (2.0, "")
+    while True:
+        page_ids, page_sims = hits_after(face_ids, similarities, after)
+        page_ids, page_sims = page_ids[:7], page_sims[:7]
+        if not page_ids:
+            break
+        pages.extend(page_ids)
+        after = (1 - (1 - float(page_sims[-1])), page_ids[-1])
+    assert pages == ordered
+    assert len(set(pages)) == 100
+
+
+def test_rows_after_matches_hits_after():
+    rng = np.random.default_rng(1)
+    similarities = np.round(rng.random(50), 1)
+    face_ids = [f"face-{i:03d}" for i in range(50)]
+    rows = [{'face_id': f, 'distance': 1 - s} for f, s in zip(face_ids, similarities)]
+    after = (float(1 - (1 - similarities[10])), face_ids[10])
+
+    expected, _ = hits_after(face_ids, similarities, after)
+    assert [row['face_id'] for row in rows_after(rows, after)] == expected
+
+
+def test_threshold_hits():
+    face_ids, similarities = threshold_hits(['a', 'b', 'c'], np.array([0.9, 0.4, 0.6]), 0.6)
+    assert face_ids == ['a', 'c']
+    assert list(similarities) == [0.9, 0.6]
@@ -0,0 +1,137 @@
+"""The pgvector search query must be servable by the HNSW index"""
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.core.db import to_db_embedding
+from app.services.search_service import PgVectorBackend
+
+COLUMN_TYPES = {
+    'float16': ('halfvec', 'halfvec_cosine_ops'),
+    'float32': ('vector', 'vector_cosine_ops'),
+}
+HNSW_INDEX = "test_faces_embedding_hnsw"
+FACES = 20000
+PHOTOS = 5000
+
+
+@pytest.fixture(scope="module")
+def search_tables(pg_conn):
+    """
+    Temporary photos and faces tables (they shadow the real ones for this
+    connection) filled with random faces, indexed and analyzed like the
+    production tables
+    """
+    column_type, opclass = COLUMN_TYPES[settings.embedding_storage]
+    dim = settings.embedding_dim
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((FACES, dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE photos (
+                id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+                path text NOT NULL,
+                width int,
+                height int,
+                event_tag text,
+                created_at timestamptz DEFAULT now()
+            )
+            """
+        )
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE faces (
+                id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+                photo_id uuid NOT NULL REFERENCES photos(id),
+                x1 int, y1 int, x2 int, y2 int,
+                embedding {column_type}({dim}) NOT NULL,
+                is_primary boolean DEFAULT false,
+                created_at timestamptz DEFAULT now()
+            )
+            """
+        )
+        # Nine in ten photos belong to one large event
+        cur.execute(
+            """
+            INSERT INTO photos (path, width, height, event_tag)
+            SELECT 'photo_' || i || '.jpg', 1024, 768,
+                   CASE WHEN i %% 10 = 0 THEN 'small-event' ELSE 'large-event' END
+            FROM generate_series(1, %s) AS i
+            """,
+            (PHOTOS,)
+        )
+        cur.execute("SELECT id FROM photos ORDER BY path")
+        photo_ids = [row['id'] for row in cur.fetchall()]
+        with cur.copy(
+            "COPY faces (photo_id, x1, y1, x2, y2, embedding) FROM STDIN WITH (FORMAT BINARY)"
+        ) as copy:
+            copy.set_types(['uuid', 'int4', 'int4', 'int4', 'int4', column_type])
+            for i, embedding in enumerate(embeddings):
+                copy.write_row((photo_ids[i % PHOTOS], 0, 0, 100, 100, to_db_embedding(embedding)))
+        cur.execute("CREATE INDEX ON photos (event_tag)")
+        cur.execute(f"CREATE INDEX {HNSW_INDEX} ON faces USING hnsw (embedding {opclass})")
+        cur.execute("ANALYZE photos")
+        cur.execute("ANALYZE faces")
+    pg_conn.commit()
+    return embeddings
+
+
+def find_index_scans(plan: dict) -> list:
+    """Index names of every index scan in a JSON plan"""
+    scans = [plan['Index Name']] if 'Index Name' in plan else []
+    for child in plan.get('Plans', []):
+        scans.extend(find_index_scans(child))
+    return scans
+
+
+def find_nodes(plan: dict, node_type: str) -> list:
+    """Every node of a type in a JSON plan, outermost first"""
+    nodes = [plan] if plan['Node Type'] == node_type else []
+    for child in plan.get('Plans', []):
+        nodes.extend(find_nodes(child, node_type))
+    return nodes
+
+
+def explain(pg_conn, embeddings, event_tag=None, group_by_photo=False, after=None, exact=False) -> dict:
+    """EXPLAIN build_search_query's SQL with the parameters the backend binds"""
+    params = {
+        'embedding': to_db_embedding(embeddings[0]),
+        'limit': settings.default_top_k * (settings.photo_group_oversample if group_by_photo else 1),
+        'max_distance': 1 - settings.default_similarity_threshold,
+        'event_tag': event_tag,
+        'photos': settings.default_top_k if group_by_photo else None,
+        'after_similarity': after[0] if after else None,
+        'after_face_id': after[1] if after else None
+    }
+    query = PgVectorBackend().build_search_query(
+        event_tag, group_by_photo=group_by_photo, after=after is not None
+    )
+    with pg_conn.cursor() as cur:
+        if exact:
+            cur.execute("SET LOCAL enable_indexscan = off")
+        cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        plan = cur.fetchone()['QUERY PLAN']
+    pg_conn.rollback()
+    return plan[0]['Plan']
+
+
+@pytest.mark.parametrize("event_tag", [None, "large-event"])
+@pytest.mark.parametrize("group_by_photo", [False, True])
+@pytest.mark.parametrize("after", [None, (0.5, "00000000-0000-0000-0000-000000000000")])
+def test_search_query_uses_hnsw_index(pg_conn, search_tables, event_tag, group_by_photo, after):
+    plan = explain(pg_conn, search_tables, event_tag, group_by_photo, after)
+    assert HNSW_INDEX in find_index_scans(plan), plan
+
+
+@pytest.mark.parametrize("event_tag", [None, "large-event"])
+def test_exact_grouped_search_is_bounded(pg_conn, search_tables, event_tag):
+    plan = explain(pg_conn, search_tables, event_tag, group_by_photo=True, exact=True)
+    assert HNSW_INDEX not in find_index_scans(plan), plan
+    # DISTINCT ON sees at most limit candidates, not every face
+    limits = find_nodes(plan, "Limit")
+    assert len(limits) == 2, plan
+    pool = settings.default_top_k * settings.photo_group_oversample
+    assert limits[1]['Plan Rows'] <= pool, plan
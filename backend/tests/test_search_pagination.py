@@ -0,0 +1,84 @@
+"""search_next_page serving pages from the session's result pool"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models.schemas import SearchResult
+from app.services.search_service import SearchService, is_after
+from tests.helpers import make_ids
+
+
+def ranked_results(n: int) -> list:
+    face_ids = make_ids(n, seed=11)
+    return [
+        SearchResult(
+            photo_id=face_id, face_id=face_id, image_url=f"/images/{i}.jpg",
+            similarity=round(0.99 - i * 0.0005, 6), width=100, height=100
+        )
+        for i, face_id in enumerate(face_ids)
+    ]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """A SearchService whose lookups read a fixed ranking and are recorded"""
+    service = SearchService()
+    ranking = ranked_results(300)
+    lookups = []
+
+    async def search_by_image_stub(image_data, image_hash, top_k, *args):
+        return ranking[:top_k], {'query_time_ms': 0.0}, np.ones(4, dtype=np.float32)
+
+    async def search_similar_faces_stub(query_embedding, top_k=30, after=None, offset=0, **params):
+        lookups.append((offset, top_k))
+        remaining = [r for r in ranking if after is None or is_after(r.similarity, r.face_id, after)]
+        return remaining[:top_k]
+
+    monkeypatch.setattr(service, "_search_by_image", search_by_image_stub)
+    monkeypatch.setattr(service, "search_similar_faces", search_similar_faces_stub)
+    return service, ranking, lookups
+
+
+def page_through(service, page_size: int) -> list:
+    async def main():
+        results, _, _, token = await service.search_by_image(b"image", top_k=page_size)
+        served = list(results)
+        while token:
+            results, token = await service.search_next_page(token)
+            served.extend(results)
+        return served
+
+    return asyncio.run(main())
+
+
+def test_pages_cover_the_ranking_once(service):
+    service, ranking, lookups = service
+    served = page_through(service, 10)
+    assert [r.face_id for r in served] == [r.face_id for r in ranking]
+    # The pool doubles: 10 -> 20 -> 40 -> ... instead of one lookup per page
+    assert [offset for offset, _ in lookups] == [10, 20, 40, 80, 160]
+
+
+def test_retried_page_token_returns_the_same_page(service):
+    service, ranking, lookups = service
+
+    async def main():
+        _, _, _, token = await service.search_by_image(b"image", top_k=10)
+        first, next_token = await service.search_next_page(token)
+        again, again_token = await service.search_next_page(token)
+        return first, again, next_token, again_token
+
+    first, again, next_token, again_token = asyncio.run(main())
+    assert first == again == ranking[10:20]
+    assert next_token == again_token
+    assert len(lookups) == 1
+
+
+def test_pagination_stops_at_search_max_results(service, monkeypatch):
+    service, ranking, lookups = service
+    monkeypatch.setattr(settings, "search_max_results", 55)
+    served = page_through(service, 10)
+    assert [r.face_id for r in served] == [r.face_id for r in ranking[:55]]
+    assert sum(top_k for _, top_k in lookups) == 45
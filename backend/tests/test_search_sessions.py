@@ -0,0 +1,84 @@
+"""Search sessions and signed page tokens"""
+import base64
+import json
+
+import numpy as np
+import pytest
+
+from app.services.search_sessions import InvalidPageToken, SearchSessionExpired, SearchSessions
+
+FACE_ID = "6f1c2a4e-8d3b-4f0a-9c71-2b5e8d9a0c13"
+
+
+@pytest.fixture
+def sessions():
+    return SearchSessions(max_sessions=10, ttl=60, secret="test-secret")
+
+
+def test_token_round_trip(sessions):
+    token = sessions.encode_token("abc", 30, (0.8123456789, FACE_ID))
+    assert sessions.decode_token(token) == ("abc", 30, (0.8123456789, FACE_ID))
+    # URL-safe without padding
+    assert "=" not in token and "+" not in token and "/" not in token
+
+
+def test_token_from_another_secret_is_rejected(sessions):
+    token = SearchSessions(max_sessions=10, ttl=60, secret="other").encode_token("abc", 30, (0.8, FACE_ID))
+    with pytest.raises(InvalidPageToken):
+        sessions.decode_token(token)
+
+    # The default secret is random per instance (i.e. per process)
+    assert SearchSessions(10, 60)._secret != SearchSessions(10, 60)._secret
+
+
+def test_tampered_token_is_rejected(sessions):
+    token = sessions.encode_token("abc", 30, (0.8, FACE_ID))
+    encoded_payload, signature = token.split(".")
+    payload = json.loads(base64.urlsafe_b64decode(encoded_payload + "=" * (-len(encoded_payload) % 4)))
+    payload['o'] = 0
+    forged = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+    for bad in [forged + "." + signature, encoded_payload + "." + signature[::-1], encoded_payload]:
+        with pytest.raises(InvalidPageToken):
+            sessions.decode_token(bad)
+
+
+@pytest.mark.parametrize("offset, after", [
+    (-1, (0.8, FACE_ID)),
+    (1.5, (0.8, FACE_ID)),
+    ("3", (0.8, FACE_ID)),
+    (3, (float("nan"), FACE_ID)),
+    (3, (float("inf"), FACE_ID)),
+    (3, ("high", FACE_ID)),
+    (3, (0.8, "not-a-uuid")),
+    (3, (0.8, 42)),
+])
+def test_signed_token_with_invalid_values_is_rejected(sessions, offset, after):
+    with pytest.raises(InvalidPageToken):
+        sessions.decode_token(sessions.encode_token("abc", offset, after))
+
+
+@pytest.mark.parametrize("payload", [b"[]", b"{}", b'{"s":"abc","o":1}', b'{"s":"abc","o":1,"a":[0.8]}', b"\xff"])
+def test_signed_malformed_payload_is_rejected(sessions, payload):
+    token = ".".join(
+        base64.urlsafe_b64encode(part).decode().rstrip("=") for part in (payload, sessions._sign(payload))
+    )
+    with pytest.raises(InvalidPageToken):
+        sessions.decode_token(token)
+
+
+@pytest.mark.parametrize("token", ["", ".", "a.b.c", "!!!.???", "é.é"])
+def test_garbage_token_is_rejected(sessions, token):
+    with pytest.raises(InvalidPageToken):
+        sessions.decode_token(token)
+
+
+def test_sessions_store_and_expire(sessions):
+    embedding = np.ones(4, dtype=np.float32)
+    session_id = sessions.create(embedding, page_size=10, threshold=0.5)
+    session = sessions.get(session_id)
+    assert session['page_size'] == 10
+    assert session['embedding'] is embedding
+
+    with pytest.raises(SearchSessionExpired):
+        sessions.get("unknown")
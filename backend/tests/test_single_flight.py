@@ -0,0 +1,80 @@
+"""SingleFlight coalescing of concurrent calls"""
+import asyncio
+
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_with_one_key_run_once():
+    async def main():
+        flights = SingleFlight()
+        runs = []
+        release = asyncio.Event()
+
+        async def fetch(value):
+            runs.append(value)
+            await release.wait()
+            return value
+
+        callers = [asyncio.ensure_future(flights.do("a", lambda i=i: fetch(i))) for i in range(5)]
+        other = asyncio.ensure_future(flights.do("b", lambda: fetch("b")))
+        await asyncio.sleep(0)
+        assert flights.get_stats() == {'in_flight': 2, 'calls': 2, 'coalesced': 4}
+
+        release.set()
+        assert await asyncio.gather(*callers) == [0] * 5
+        assert await other == "b"
+        assert runs == [0, "b"]
+
+        # The key is released once the call finishes
+        assert flights.get_stats()['in_flight'] == 0
+        assert await flights.do("a", lambda: fetch(7)) == 7
+
+    asyncio.run(main())
+
+
+def test_exception_is_shared_and_key_released():
+    async def main():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise RuntimeError("db down")
+
+        callers = [asyncio.ensure_future(flights.do("a", fail)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flights.get_stats()['calls'] == 1
+
+        async def ok():
+            return "ok"
+
+        assert await flights.do("a", ok) == "ok"
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_does_not_cancel_the_call():
+    async def main():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return 42
+
+        first = asyncio.ensure_future(flights.do("a", fetch))
+        second = asyncio.ensure_future(flights.do("a", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        release.set()
+        assert await second == 42
+
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""FlatIndex and the top-k helpers shared by the in-process indexes"""
+import numpy as np
+import pytest
+
+from app.services.vector_index import FlatIndex, best_per_photo, top_k_rows
+from tests.helpers import brute_force_top_k, make_ids
+
+
+@pytest.fixture
+def indexed(tmp_path, embeddings):
+    """A FlatIndex over the shared embeddings, 4 faces per photo, two events"""
+    n = len(embeddings)
+    face_ids = make_ids(n, seed=1)
+    photo_ids = make_ids(n // 4, seed=2)
+    face_photos = [photo_ids[i // 4] for i in range(n)]
+    event_tags = ["race" if i % 8 < 4 else "party" for i in range(n)]
+    index = FlatIndex(str(tmp_path), embeddings.shape[1])
+    index.add(face_ids, face_photos, event_tags, embeddings)
+    return index, face_ids, face_photos, event_tags
+
+
+def test_top_k_rows_matches_sort():
+    rng = np.random.default_rng(0)
+    similarities = rng.random(500).astype(np.float32)
+    rows = np.arange(500) + 1000
+    top_rows, top_sims = top_k_rows(similarities, rows, 10)
+    expected = np.argsort(-similarities)[:10]
+    assert list(top_rows) == list(rows[expected])
+    assert np.all(np.diff(top_sims) <= 0)
+
+
+def test_top_k_rows_with_fewer_rows_than_k():
+    rows, sims = top_k_rows(np.array([0.2, 0.9], dtype=np.float32), np.array([5, 6]), 10)
+    assert list(rows) == [6, 5]
+    assert len(top_k_rows(np.zeros(0), np.zeros(0, dtype=np.int64), 3)[0]) == 0
+
+
+def test_best_per_photo_matches_brute_force():
+    rng = np.random.default_rng(0)
+    similarities = rng.random(300).astype(np.float32)
+    rows = np.arange(300)
+    photos = rng.integers(0, 40, 300)
+
+    best_rows, best_sims = best_per_photo(similarities, rows, photos, 15)
+
+    best_of_photo = {}
+    for row, photo in zip(rows, photos):
+        if photo not in best_of_photo or similarities[row] > similarities[best_of_photo[photo]]:
+            best_of_photo[photo] = row
+    expected = sorted(best_of_photo.values(), key=lambda row: -similarities[row])[:15]
+    assert list(best_rows) == expected
+    assert len({photos[row] for row in best_rows}) == 15
+
+
+def test_best_per_photo_with_packed_uuid_keys():
+    keys = np.array([[1, 2], [1, 2], [1, 3], [2, 2]], dtype=np.uint64)
+    similarities = np.array([0.5, 0.9, 0.7, 0.1], dtype=np.float32)
+    rows, sims = best_per_photo(similarities, np.arange(4), keys, 10)
+    assert list(rows) == [1, 2, 3]
+
+
+def test_flat_search_is_exact(indexed, embeddings, queries):
+    index, face_ids, _, _ = indexed
+    for query in queries:
+        found, similarities = index.search(query, 10)
+        expected = brute_force_top_k(embeddings, query, 10)
+        assert found == [face_ids[row] for row in expected]
+        np.testing.assert_allclose(similarities, embeddings[expected] @ query, rtol=1e-5)
+
+
+def test_flat_float16_recall(tmp_path, embeddings, queries):
+    index = FlatIndex(str(tmp_path), embeddings.shape[1], dtype=np.float16)
+    face_ids = make_ids(len(embeddings))
+    index.add(face_ids, face_ids, [None] * len(embeddings), embeddings)
+    hits = 0
+    for query in queries:
+        found, _ = index.search(query, 10)
+        expected = brute_force_top_k(embeddings, query, 10)
+        hits += len(set(found) & {face_ids[row] for row in expected})
+    assert hits / (10 * len(queries)) >= 0.95
+
+
+def test_flat_event_filter(indexed, embeddings, queries):
+    index, face_ids, _, event_tags = indexed
+    race = np.array([tag == "race" for tag in event_tags])
+    rows = np.nonzero(race)[0]
+    for query in queries[:10]:
+        found, _ = index.search(query, 10, event_tag="race")
+        expected = rows[brute_force_top_k(embeddings[rows], query, 10)]
+        assert found == [face_ids[row] for row in expected]
+    assert index.search(queries[0], 10, event_tag="unknown")[0] == []
+
+
+def test_flat_tombstones_and_retags(indexed, embeddings, queries):
+    index, face_ids, face_photos, _ = indexed
+    top, _ = index.search(queries[0], 1)
+    photo = face_photos[face_ids.index(top[0])]
+
+    assert index.remove_photo(photo) == 4
+    assert len(index) == len(embeddings) - 4
+    found, _ = index.search(queries[0], 50)
+    assert not {face_ids[i] for i, p in enumerate(face_photos) if p == photo} & set(found)
+
+    other = face_photos[0] if face_photos[0] != photo else face_photos[4]
+    assert index.set_event_tag(other, "moved") == 4
+    assert index.count_faces("moved") == 4
+
+
+def test_flat_compact_drops_tombstones(indexed, tmp_path, queries):
+    index, face_ids, face_photos, _ = indexed
+    before = [index.search(query, 10) for query in queries[:5]]
+    for photo in face_photos[:40:4]:
+        index.remove_photo(photo)
+
+    index.compact(min_dead_fraction=0.5)
+    assert index._count == len(face_ids)  # below the threshold: not rewritten
+
+    index.compact()
+    assert index._count == len(index) == len(face_ids) - 40
+    assert not index.contains_faces(face_ids[:40]).any()
+    for query, (expected, _) in zip(queries[:5], before):
+        kept = [face_id for face_id in expected if face_id not in face_ids[:40]]
+        assert index.search(query, 10)[0][:len(kept)] == kept
+
+    index.save()
+    loaded = FlatIndex(str(tmp_path), index.dim)
+    assert loaded.load()
+    assert loaded.search(queries[0], 10)[0] == index.search(queries[0], 10)[0]
+
+
+def test_flat_search_batch_matches_search(indexed, queries):
+    index, _, _, _ = indexed
+    index.block_rows = 256  # several blocks to merge
+    for query, (found, similarities) in zip(queries, index.search_batch(queries, 10, event_tag="party")):
+        expected, expected_similarities = index.search(query, 10, event_tag="party")
+        assert found == expected
+        np.testing.assert_allclose(similarities, expected_similarities, rtol=1e-5)
+
+
+def test_flat_grouped_search_returns_one_face_per_photo(indexed, queries):
+    index, face_ids, face_photos, _ = indexed
+    found, similarities = index.search(queries[0], 200, photos=20)
+    photos = [face_photos[face_ids.index(face_id)] for face_id in found]
+    assert len(found) == 20
+    assert len(set(photos)) == 20
+    assert np.all(np.diff(similarities) <= 0)
+
+
+def test_flat_snapshot_round_trip(indexed, tmp_path, queries):
+    index, face_ids, face_photos, _ = indexed
+    index.remove_photo(face_photos[0])
+    index.synced_at = None
+    index.save()
+
+    loaded = FlatIndex(str(tmp_path), index.dim)
+    assert loaded.load()
+    assert len(loaded) == len(index)
+    for query in queries[:5]:
+        assert loaded.search(query, 10)[0] == index.search(query, 10)[0]
+    assert loaded.contains_faces(face_ids[:3]).all()
+
+
+def test_flat_snapshot_rejects_other_dtype(indexed, tmp_path):
+    index, _, _, _ = indexed
+    index.save()
+    assert not FlatIndex(str(tmp_path), index.dim, dtype=np.float16).load()